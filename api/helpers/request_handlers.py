@@ -1,18 +1,23 @@
 import logging
 import os
 from typing import Dict, Any
-from pydub import AudioSegment
-from pydub.silence import detect_silence
 from audio_utils.remix import handle_remix
-from audio_utils.separator import separate_audio
+from audio_utils.codecs import (
+    OUTPUT_FORMAT, AUDITION_FORMAT, AUDITION_BITRATE, sources, extension, audition_name, submit_encode,
+    submit_audition,
+)
+from audio_utils.stem_store import submit_transcode
+from audio_utils.separator import submit_separation, separate_range, load_stems
+from audio_utils.artifacts import artifacts
+from audio_utils.activity import stem_activity, is_silent
+from audio_utils.peaks import has_peaks, write_peaks
 from llm_backend.interpreter import parse_feedback, apply_feedback_to_instructions, describe_feedback_changes, \
     describe_audio_edit, generate_clarification_response
 from llm_backend.session_manager import get_file_from_db
 from api.helpers.constants import (
-    SESSION_TASK_SEPARATION, SESSION_TASK_REMIX,
+    SESSION_TASK_SEPARATION, SESSION_TASK_REMIX, SAMPLE_RATE, SILENCE_THRESHOLD, MIN_SILENCE_LENGTH,
+    SEPARATED_FILES_DIR,
 )
-import uuid
-import torchaudio
 from api.helpers.session_state import session_active_task, session_last_instructions
 
 logger = logging.getLogger(__name__)
@@ -40,6 +45,31 @@ def handle_feedback_request(user_message: str, session_id: str,
     return result
 
 
+def _section_entry(file_key: str, stem_name: str, array, start: float, session_id: str) -> Dict[str, Any]:
+    """Encode the section of a stem (and its listening encode) and describe it for the response."""
+    begin = int(start * SAMPLE_RATE)
+    name = f"{file_key}_{stem_name}_{begin}_{begin + array.shape[-1]}"
+    file_name = f"{name}.{extension(OUTPUT_FORMAT)}"
+    audition_file = audition_name(file_name)
+    encodes = [
+        submit_encode(os.path.join(SEPARATED_FILES_DIR, file_name), array, SAMPLE_RATE),
+        submit_audition(audition_file and os.path.join(SEPARATED_FILES_DIR, audition_file), array, SAMPLE_RATE),
+    ]
+    if not has_peaks(name):
+        write_peaks(name, array, SAMPLE_RATE)
+    for encode in encodes:
+        if encode is None:
+            continue
+        report = encode.result()
+        artifacts.track(report["path"], session_id)
+        logger.info(f"Encoded {report['path']}: {report['bytes']} bytes in {report['seconds']:.2f}s")
+    file_url = f"/downloads/{file_name}"
+    audition_url = audition_file and f"/downloads/{audition_file}"
+    return {"name": stem_name, "audition_url": audition_url, "file_url": file_url,
+            "sources": sources(audition_url, file_url), "format": OUTPUT_FORMAT,
+            "peaks_url": f"/peaks/{name}", "start": start, "end": start + array.shape[-1] / SAMPLE_RATE}
+
+
 def handle_separation_request(intent: Dict, session_id: str) -> Dict[str, Any]:
     """Handle audio separation request."""
     logger.info(f"Processing separation request for session {session_id}")
@@ -63,29 +93,65 @@ def handle_separation_request(intent: Dict, session_id: str) -> Dict[str, Any]:
     if invalid_stems:
         reply = f"Note: The following stems are not supported and will be ignored: {', '.join(invalid_stems)}.\n"
 
-    if audio_path and selected_stems:
-        outputs = separate_audio(audio_path, selected_stems)
-        for stem_name, stem_tensor in outputs.items():
-            if stem_tensor.ndim == 3:
-                stem_tensor = stem_tensor[0]
-            elif stem_tensor.ndim == 1:
-                stem_tensor = stem_tensor.unsqueeze(0)
-
-            uid = uuid.uuid4().hex[:6]
-            base = os.path.splitext(os.path.basename(audio_path))[0]
-            output_name = f"{base}_{stem_name}_{uid}.wav"
-            output_path = f"separated/{output_name}"
-            torchaudio.save(output_path, stem_tensor, 44100)
-
-            audio = AudioSegment.from_file(output_path, format="wav")
-            silent_ranges = detect_silence(audio, min_silence_len=1000, silence_thresh=-40)
-            is_fully_silent = sum(end - start for start, end in silent_ranges) >= len(audio)
-
-            if is_fully_silent:
+    start, end = intent.get("start"), intent.get("end")
+    if audio_path and selected_stems and (start is not None or end is not None):
+        start = max(0.0, float(start or 0.0))
+        end = float(end) if end is not None else float("inf")
+        if end <= start:
+            return {"reply": "The end of the section should come after its start."}
+        # Only the requested section (plus some context) goes through the model when the
+        # full stems are not known yet
+        file_key, stem_arrays = separate_range(audio_path, start, end)
+        for stem_name in selected_stems:
+            array = stem_arrays[stem_name]
+            levels = stem_activity(f"{file_key}@{start}:{end}", stem_name, array, SAMPLE_RATE)
+            if is_silent(levels, threshold_db=SILENCE_THRESHOLD, min_silence_ms=MIN_SILENCE_LENGTH):
+                silent_stems.append(stem_name)
+                continue
+            separated.append(_section_entry(file_key, stem_name, array, start, session_id))
+    elif audio_path and selected_stems:
+        # Stems come from the separation cache shared with remixes, and are kept in the stem
+        # store. A track seen for the first time is separated in the background. Silence is
+        # decided on the arrays (windowed RMS over the stem), silent stems are not listed.
+        # Download files are only encoded when they are fetched
+        file_key, job = submit_separation(audio_path)
+        if not job.done():
+            # The track is still being separated: the stems can be played as they get
+            # separated, silence checks, waveforms and downloads come with a later request
+            for stem_name in selected_stems:
+                live_url = f"/stems/{file_key}/{stem_name}/live"
+                separated.append({"name": stem_name, "live": True, "live_url": live_url,
+                                  "sources": [{"url": live_url, "type": "audio/wav"}],
+                                  "status_url": f"/separation/status/{file_key}"})
+            reply += describe_audio_edit("separation", extracted_stems=selected_stems)
+            reply += " The stems are still being separated, playback starts with the part that is ready."
+            session_active_task[session_id] = SESSION_TASK_SEPARATION
+            return {"reply": reply, "stems": separated}
+
+        _, stem_arrays = load_stems(audio_path, file_key)
+        for stem_name in selected_stems:
+            # A silent stem stays in the stem store (see `_separate_into`), but it is never
+            # encoded, auditioned or given a waveform
+            levels = stem_activity(file_key, stem_name, stem_arrays[stem_name], SAMPLE_RATE)
+            if is_silent(levels, threshold_db=SILENCE_THRESHOLD, min_silence_ms=MIN_SILENCE_LENGTH):
                 silent_stems.append(stem_name)
-            else:
-                url = f"/downloads/{output_name}"
-                separated.append({"name": stem_name, "file_url": url})
+                continue
+
+            url = f"/stems/{file_key}/{stem_name}?format={OUTPUT_FORMAT}"
+            # The small listening encode is made right away on the encoder pool, it is what
+            # the chat plays, the full quality file is encoded when it is downloaded
+            audition_url = None
+            if AUDITION_FORMAT is not None:
+                audition_url = f"/stems/{file_key}/{stem_name}?format={AUDITION_FORMAT}"
+                if AUDITION_BITRATE:
+                    audition_url += f"&bitrate={AUDITION_BITRATE}"
+                submit_transcode(file_key, stem_name, AUDITION_FORMAT, bitrate=AUDITION_BITRATE)
+            peaks_id = f"{file_key}_{stem_name}"
+            if not has_peaks(peaks_id):
+                write_peaks(peaks_id, stem_arrays[stem_name], SAMPLE_RATE)
+            separated.append({"name": stem_name, "audition_url": audition_url, "file_url": url,
+                              "sources": sources(audition_url, url), "format": OUTPUT_FORMAT,
+                              "peaks_url": f"/peaks/{peaks_id}"})
 
     if separated:
         stem_names = [s["name"] for s in separated]
@@ -1,13 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import logging
 import os
 from typing import Dict
 import uvicorn
 import openai
 from dotenv import load_dotenv
-from api.helpers.constants import IntentType, SESSION_TASK_REMIX, DEFAULT_VOLUMES
+from api.helpers.constants import (
+    IntentType, SESSION_TASK_REMIX, DEFAULT_VOLUMES, SEPARATED_FILES_DIR, DOWNLOADS_MOUNT_PATH,
+)
 from api.helpers.request_handlers import (
     handle_separation_request,
     handle_remix_request,
@@ -19,13 +22,20 @@ from api.helpers.validators import validate_chat_request
 from api.helpers.response_builders import build_chat_response
 from api.helpers.session_state import session_last_instructions
 from api.upload import router as upload_router
+from api.stream import router as stream_router
+from api.stems import router as stems_router
+from api.peaks import router as peaks_router
+from audio_utils.preview import render_status
+from audio_utils.artifacts import artifacts, GC_INTERVAL_SECONDS
+from audio_utils.landmarks import landmark_index
+from audio_utils.codecs import audition_name, sources
 from models.chat_request import ChatRequest
 from models.reset_request import ResetRequest
 
 from llm_backend.interpreter import classify_prompt, parse_feedback
 from llm_backend.session_manager import (
     get_or_create_session, save_message, get_history,
-    get_session, reset_session
+    get_session, reset_session, get_file_owners, delete_files_by_path
 )
 from db_core.session import get_user_sessions, get_session_and_verify_user
 
@@ -38,6 +48,9 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(debug=True)
 app.include_router(upload_router)
+app.include_router(stream_router)
+app.include_router(stems_router)
+app.include_router(peaks_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,6 +62,41 @@ app.add_middleware(
 app.mount("/downloads", StaticFiles(directory="separated"), name="downloads")
 
 
+async def collect_artifacts():
+    """Keep separated/ under its disk budget, evicting the least recently used files."""
+    while True:
+        try:
+            removed = await asyncio.to_thread(artifacts.collect)
+            if removed:
+                logger.info(f"Artifact collection removed {len(removed)} files: {artifacts.stats()}")
+        except Exception as e:
+            logger.error(f"Artifact collection failed: {e}")
+        await asyncio.sleep(GC_INTERVAL_SECONDS)
+
+
+@app.on_event("startup")
+async def start_artifact_collection():
+    # File rows follow the files evicted from disk, and tell who owns the files already there
+    artifacts.on_evict = delete_files_by_path
+    missing = []
+    for path, owner in get_file_owners():
+        if os.path.exists(path):
+            artifacts.track(path, owner)
+        else:
+            missing.append(path)
+    delete_files_by_path(missing)
+    asyncio.create_task(collect_artifacts())
+
+
+@app.middleware("http")
+async def touch_downloads(request: Request, call_next):
+    """Downloads count as uses of their file for the disk budget."""
+    prefix = DOWNLOADS_MOUNT_PATH + "/"
+    if request.url.path.startswith(prefix):
+        artifacts.touch(os.path.join(SEPARATED_FILES_DIR, request.url.path[len(prefix):]))
+    return await call_next(request)
+
+
 @app.post("/chat")
 async def chat(request: ChatRequest):
     """Process user chat messages for audio separation and remixing."""
@@ -72,17 +120,19 @@ async def chat(request: ChatRequest):
             intent = classify_prompt(user_message)
             logger.debug(f"Intent classified: {intent}")
 
+        # Handlers separate, render and encode: they run on worker threads, so the event
+        # loop keeps serving live stems and status polls in the meantime
         if is_feedback_request:
             last_instructions = session_last_instructions.get(session_id, {"volumes": DEFAULT_VOLUMES})
-            result = handle_feedback_request(user_message, session_id, last_instructions)
+            result = await asyncio.to_thread(handle_feedback_request, user_message, session_id, last_instructions)
             has_remix_output = "remix" in result
         else:
             if intent["type"] == IntentType.SEPARATION.value:
-                result = handle_separation_request(intent, session_id)
+                result = await asyncio.to_thread(handle_separation_request, intent, session_id)
             elif intent["type"] == IntentType.REMIX.value:
-                result = handle_remix_request(intent, session_id)
+                result = await asyncio.to_thread(handle_remix_request, intent, session_id)
             elif intent["type"] == IntentType.CLARIFICATION.value:
-                result = handle_clarification_request(intent, user_message, session_id)
+                result = await asyncio.to_thread(handle_clarification_request, intent, user_message, session_id)
             else:
                 result = {"reply": "I'm not sure how to help with that. Could you try rephrasing your request?"}
             
@@ -108,20 +158,51 @@ async def chat(request: ChatRequest):
         )
 
 
+@app.get("/remix/status/{remix_name}")
+async def remix_status(remix_name: str):
+    """Progress of a full-length remix render started after its preview."""
+    status = render_status(remix_name)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown remix render")
+    if status["ready"]:
+        audition = audition_name(remix_name)
+        status["audition_url"] = audition and f"/downloads/{audition}"
+        status["file_url"] = f"/downloads/{remix_name}"
+        status["sources"] = sources(status["audition_url"], status["file_url"])
+        status["peaks_url"] = f"/peaks/{os.path.splitext(remix_name)[0]}"
+    return status
+
+
+@app.get("/artifacts/metrics")
+async def artifact_metrics():
+    """Disk usage of separated/ and garbage collection counters."""
+    return artifacts.stats()
+
+
+@app.get("/landmarks/metrics")
+async def landmark_metrics():
+    """Size of the landmark index and lookup counters."""
+    return landmark_index.stats()
+
+
 @app.post("/reset")
 async def reset(request: ResetRequest):
     """Reset a user session."""
     try:
-        session_exists = get_session_and_verify_user(request.session_id, request.user_id)
+        from db_core.config import get_session
+        with get_session() as db:
+            session_exists = get_session_and_verify_user(db, request.session_id, request.user_id)
         if not session_exists:
             raise HTTPException(status_code=404, detail="Session not found")
         
+        # Files only this session used go with it, File rows are dropped by reset_session
+        removed = artifacts.release_session(request.session_id)
         reset_session(request.session_id)
         
         session_active_task.pop(request.session_id, None)
         session_last_instructions.pop(request.session_id, None)
         
-        logger.info(f"Reset session {request.session_id} for user {request.user_id}")
+        logger.info(f"Reset session {request.session_id} for user {request.user_id}, removed {len(removed)} files")
         return {"message": "Session reset successfully"}
         
     except Exception as e:
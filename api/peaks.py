@@ -0,0 +1,22 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from audio_utils.peaks import peaks_file
+router = APIRouter()
+
+# A waveform never changes once written: stems are keyed by content, remixes by a fresh name
+PEAKS_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/peaks/{peaks_id}")
+def get_peaks(peaks_id: str, width: int = 1000):
+    """
+    Min/max peaks of a stem or remix for drawing its waveform `width` pixels wide,
+    from the zoom level closest to one peak per pixel.
+    """
+    try:
+        path = peaks_file(peaks_id, max(1, width))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Waveform not found")
+
+    return FileResponse(path, media_type="application/json", headers={"Cache-Control": PEAKS_CACHE_CONTROL})
@@ -0,0 +1,63 @@
+import re
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from api.helpers.constants import VALID_STEMS, SAMPLE_RATE
+from audio_utils.codecs import OUTPUT_FORMAT, media_type
+from audio_utils.stem_store import transcode, stem_progress, live_stem
+from audio_utils.streaming import wav_header
+router = APIRouter()
+
+
+def _check_stem(file_key: str, stem: str):
+    if not re.fullmatch(r"[0-9a-f]{32}", file_key) or stem not in VALID_STEMS:
+        raise HTTPException(status_code=404, detail="Stem not found")
+
+
+@router.get("/stems/{file_key}/{stem}")
+def download_stem(file_key: str, stem: str, format: str = OUTPUT_FORMAT, sr: int = SAMPLE_RATE,
+                  bitrate: Optional[int] = None):
+    """
+    Download a separated stem, encoded from the stem store on first request and kept
+    on disk while it is fetched often enough to fit in the disk budget.
+    """
+    _check_stem(file_key, stem)
+    try:
+        path = transcode(file_key, stem, format, sr=sr, bitrate=bitrate, source_sr=SAMPLE_RATE)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Stem not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return FileResponse(path, media_type=media_type(format), filename=f"{stem}.{path.rsplit('.', 1)[-1]}")
+
+
+@router.get("/stems/{file_key}/{stem}/live")
+def play_stem(file_key: str, stem: str):
+    """
+    Play a stem while it is being separated: a WAV file of the full length, sent with
+    chunked transfer, made of the separated part first and the rest as it is separated.
+    """
+    _check_stem(file_key, stem)
+    progress = stem_progress(file_key, stem)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Stem not found")
+
+    def wav():
+        yield wav_header(2, SAMPLE_RATE, progress[1])
+        for block in live_stem(file_key, stem):
+            yield block.T.astype("<i2").tobytes()
+
+    return StreamingResponse(wav(), media_type="audio/wav")
+
+
+@router.get("/separation/status/{file_key}")
+def separation_status(file_key: str):
+    """How much of each stem of a file is separated, in seconds."""
+    if not re.fullmatch(r"[0-9a-f]{32}", file_key):
+        raise HTTPException(status_code=404, detail="Unknown separation")
+    progress = {stem: stem_progress(file_key, stem) for stem in VALID_STEMS}
+    if any(value is None for value in progress.values()):
+        raise HTTPException(status_code=404, detail="Unknown separation")
+    ready, length = min(progress.values())
+    return {"ready": ready >= length, "seconds_ready": ready / SAMPLE_RATE, "seconds_total": length / SAMPLE_RATE}
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from api.helpers.constants import DEFAULT_VOLUMES, SAMPLE_RATE
+from api.helpers.session_state import session_last_instructions
+from audio_utils.activity import stem_activity, mute_inaudible
+from audio_utils.separator import load_stems
+from audio_utils.streaming import stream_wav
+from llm_backend.session_manager import get_file_from_db
+router = APIRouter()
+
+@router.get("/remix/stream/{session_id}")
+def stream_remix(session_id: str, start: float = 0.0):
+    """
+    Play the current remix of a session while it renders: a WAV file sent with chunked
+    transfer, rendered block by block from `start` seconds (seeking restarts the stream).
+    """
+    audio_path = get_file_from_db(session_id)
+    if not audio_path:
+        raise HTTPException(status_code=404, detail="No audio file found for remixing.")
+
+    instructions = session_last_instructions.get(session_id, {"volumes": DEFAULT_VOLUMES})
+    file_key, stem_arrays = load_stems(audio_path)
+    stem_keys = {name: f"{file_key}:{name}" for name in stem_arrays}
+    levels = {name: stem_activity(file_key, name, array, SAMPLE_RATE) for name, array in stem_arrays.items()}
+    instructions = mute_inaudible(instructions, levels)
+    start_sample = int(max(0.0, start) * SAMPLE_RATE)
+
+    return StreamingResponse(
+        stream_wav(stem_arrays, instructions, SAMPLE_RATE, start=start_sample, stem_keys=stem_keys),
+        media_type="audio/wav",
+    )
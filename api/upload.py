@@ -1,7 +1,10 @@
 from fastapi import UploadFile, Form, APIRouter
 from pydub import AudioSegment
+import asyncio
 import os, uuid, shutil
 from llm_backend.session_manager import save_file_to_db
+from audio_utils.artifacts import artifacts
+from audio_utils.separator import index_upload
 from db_core.session import ensure_session_exists
 from db_core.config import get_session
 router = APIRouter()
@@ -18,16 +21,21 @@ async def upload(file: UploadFile, session_id: str = Form(...), user_id: str = F
     audio = AudioSegment.from_file(original_path)
     converted_path = original_path.rsplit(".", 1)[0] + "_converted.wav"
     audio.export(converted_path, format="wav")
+    # Another encoding of a song already uploaded shares its stems
+    file_key = await asyncio.to_thread(index_upload, converted_path)
 
     with get_session() as db:
         ensure_session_exists(db, session_id, user_id)
 
     save_file_to_db(session_id, file_type="uploaded",  path=converted_path, stem=None)
+    artifacts.track(original_path, session_id)
+    artifacts.track(converted_path, session_id)
     print(f"stored file path: {converted_path} for session: {session_id} by user: {user_id}")
 
     return {
         "message": "File uploaded and converted to WAV",
         "session_id": session_id,
         "user_id": user_id,
-        "converted_path": converted_path
+        "converted_path": converted_path,
+        "file_key": file_key,
     }
\ No newline at end of file
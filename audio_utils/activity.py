@@ -0,0 +1,80 @@
+import numpy as np
+from audio_utils.cache import ArrayCache
+
+# Resolution (ms) of the stem activity maps
+ACTIVITY_HOP_MS = 10
+# Stems whose level never reaches this (dBFS, over any 1 s window) are left out of remixes
+INAUDIBLE_DB = -70.0
+
+# Frame levels of separated stems, keyed by (file content key, stem name)
+activity_maps = ArrayCache(max_bytes=64 << 20)
+
+
+def frame_levels_db(array: np.ndarray, sr: int, hop_ms: float = ACTIVITY_HOP_MS) -> np.ndarray:
+    """
+    RMS level (dBFS) of consecutive `hop_ms` frames of a (channels, samples) float array,
+    over all channels. A trailing partial frame is measured on its own samples.
+
+    Returns:
+        float32 array with one level per frame
+    """
+    array = np.asarray(array, dtype=np.float32)
+    if array.ndim == 1:
+        array = array[None]
+    hop = max(1, int(sr * hop_ms / 1000))
+    length = array.shape[-1]
+    frames = -(-length // hop)
+    padded = np.zeros((array.shape[0], frames * hop), dtype=np.float32)
+    padded[:, :length] = array
+    power = np.square(padded).reshape(array.shape[0], frames, hop).sum(axis=(0, 2))
+    counts = np.full(frames, array.shape[0] * hop, dtype=np.float64)
+    if length % hop:
+        counts[-1] = array.shape[0] * (length % hop)
+    return (10 * np.log10(np.maximum(power / np.maximum(counts, 1), 1e-20))).astype(np.float32)
+
+
+def window_levels_db(levels_db: np.ndarray, window_frames: int) -> np.ndarray:
+    """
+    RMS level (dBFS) of every window of `window_frames` consecutive frames, from frame
+    levels. When there are fewer frames than a window, the whole signal is one window.
+    """
+    power = 10 ** (levels_db.astype(np.float64) / 10)
+    window_frames = max(1, min(window_frames, len(power)))
+    cumulative = np.concatenate([[0.0], np.cumsum(power)])
+    window = (cumulative[window_frames:] - cumulative[:-window_frames]) / window_frames
+    return 10 * np.log10(np.maximum(window, 1e-20))
+
+
+def is_silent(levels_db: np.ndarray, threshold_db: float = -40.0, min_silence_ms: float = 1000,
+              hop_ms: float = ACTIVITY_HOP_MS) -> bool:
+    """
+    Whether every `min_silence_ms` window is quieter than `threshold_db`, the same
+    decision as checking that pydub's `detect_silence` covers the whole stem.
+    """
+    if len(levels_db) == 0:
+        return True
+    window = window_levels_db(levels_db, int(round(min_silence_ms / hop_ms)))
+    return bool(np.all(window < threshold_db))
+
+
+def stem_activity(key: str, name: str, array: np.ndarray, sr: int) -> np.ndarray:
+    """Frame levels of a separated stem, computed once per (file content key, stem)."""
+    levels = activity_maps.get((key, name))
+    if levels is None:
+        levels = activity_maps.put((key, name), frame_levels_db(array, sr))
+    return levels
+
+
+def mute_inaudible(instructions: dict, levels: dict[str, np.ndarray],
+                   threshold_db: float = INAUDIBLE_DB) -> dict:
+    """
+    Copy of the remix instructions with the stems that are inaudible throughout muted,
+    so the remix planner drops them instead of running their effect chains.
+    """
+    silent = [name for name, stem_levels in levels.items()
+              if is_silent(stem_levels, threshold_db=threshold_db)]
+    if not silent:
+        return instructions
+    volumes = dict(instructions.get("volumes") or {})
+    volumes.update({name: 0.0 for name in silent})
+    return {**instructions, "volumes": volumes}
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+# Everything the app writes: uploads and their converted copies, the stem store, encoded
+# stems, remixes and their previews
+ARTIFACTS_ROOT = "separated"
+# Total size of ARTIFACTS_ROOT kept on disk, the least recently used files go first
+DISK_BUDGET_BYTES = int(os.getenv("DISK_BUDGET_BYTES", 20 << 30))
+# Seconds between two garbage collection runs
+GC_INTERVAL_SECONDS = float(os.getenv("GC_INTERVAL_SECONDS", 300))
+# Files used this recently are never collected, so a file being written or sent survives
+MIN_AGE_SECONDS = 60.0
+
+
+class ArtifactManager:
+    """
+    Files under a directory with their owner sessions, last access time and size,
+    kept under a disk budget.
+
+    The last access time of a file is its modification time, so it survives restarts,
+    and files nobody registered (written before a restart) are still collected. Files
+    can be shared by sessions (the same upload) or by none (content-addressed stems).
+    """
+
+    def __init__(self, root: str, budget: int, on_evict: Optional[Callable[[list[str]], None]] = None):
+        self.root = root
+        self.budget = budget
+        # Called with the paths removed by a run, to drop what refers to them (File rows)
+        self.on_evict = on_evict
+        self._owners: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+        self.metrics = {
+            "runs": 0,
+            "files": 0,
+            "bytes": 0,
+            "evicted_files": 0,
+            "evicted_bytes": 0,
+            "released_files": 0,
+            "last_run_seconds": 0.0,
+        }
+
+    def _path(self, path: str) -> Optional[str]:
+        path = os.path.normpath(path)
+        root = os.path.normpath(self.root)
+        if os.path.commonpath([os.path.abspath(path), os.path.abspath(root)]) != os.path.abspath(root):
+            return None
+        return path
+
+    def track(self, path: str, session_id: Optional[str] = None) -> None:
+        """Register a file written for `session_id` (or for no session in particular)."""
+        path = self._path(path)
+        if path is None:
+            return
+        with self._lock:
+            owners = self._owners.setdefault(path, set())
+            if session_id is not None:
+                owners.add(session_id)
+        self.touch(path)
+
+    def touch(self, path: str) -> None:
+        """Mark a file as just used."""
+        path = self._path(path)
+        if path is None:
+            return
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def owners(self, path: str) -> set[str]:
+        with self._lock:
+            return set(self._owners.get(os.path.normpath(path), ()))
+
+    def _scan(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                # Files still being written are renamed into place when complete
+                if ".tmp" in name:
+                    continue
+                path = os.path.normpath(os.path.join(directory, name))
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _remove(self, paths: list[str]) -> list[str]:
+        removed = []
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            removed.append(path)
+            with self._lock:
+                self._owners.pop(path, None)
+            # Emptied directories (stem store entries) go too
+            directory = os.path.dirname(path)
+            while directory and os.path.normpath(directory) != os.path.normpath(self.root):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+        if removed and self.on_evict is not None:
+            self.on_evict(removed)
+        return removed
+
+    def collect(self, budget: Optional[int] = None, now: Optional[float] = None) -> list[str]:
+        """
+        Remove the least recently used files until the directory fits in `budget` bytes
+        (the manager's budget by default). Files used within MIN_AGE_SECONDS are kept.
+
+        Returns:
+            The removed paths
+        """
+        begin = time.perf_counter()
+        budget = self.budget if budget is None else budget
+        now = time.time() if now is None else now
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+
+        evict, freed = [], 0
+        for mtime, size, path in entries:
+            if total - freed <= budget:
+                break
+            if now - mtime < MIN_AGE_SECONDS:
+                break
+            evict.append(path)
+            freed += size
+        removed = self._remove(evict)
+
+        self.metrics["runs"] += 1
+        self.metrics["files"] = len(entries) - len(removed)
+        self.metrics["bytes"] = total - freed
+        self.metrics["evicted_files"] += len(removed)
+        self.metrics["evicted_bytes"] += freed
+        self.metrics["last_run_seconds"] = time.perf_counter() - begin
+        return removed
+
+    def release_session(self, session_id: str) -> list[str]:
+        """Remove the files of a session that no other session uses."""
+        with self._lock:
+            owned = [path for path, owners in self._owners.items() if session_id in owners]
+            orphaned = []
+            for path in owned:
+                self._owners[path].discard(session_id)
+                if not self._owners[path]:
+                    orphaned.append(path)
+        removed = self._remove(orphaned)
+        self.metrics["released_files"] += len(removed)
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            tracked = len(self._owners)
+        return {**self.metrics, "tracked": tracked, "budget": self.budget}
+
+
+# Shared by the upload, separation and remix paths, collected in the background by the app
+artifacts = ArtifactManager(ARTIFACTS_ROOT, DISK_BUDGET_BYTES)
@@ -0,0 +1,160 @@
+import io
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+import numpy as np
+import librosa
+import soundfile as sf
+
+try:
+    import lameenc
+except ImportError:
+    lameenc = None
+
+FORMATS = {
+    # format: (file extension, lossless, media type)
+    "wav": ("wav", True, "audio/wav"),
+    "flac": ("flac", True, "audio/flac"),
+    "mp3": ("mp3", False, "audio/mpeg"),
+    "opus": ("opus", False, "audio/ogg"),
+}
+
+MP3_BITRATE = 320
+# libsndfile's Opus encoder only runs at 8, 12, 16, 24 or 48 kHz
+OPUS_SAMPLE_RATE = 48000
+# libsndfile maps the compression level (0-1) onto the Opus bitrate, 0.85 is about 96 kbps in stereo
+OPUS_COMPRESSION_LEVEL = 0.85
+
+# Encoders spend their time in libsndfile and LAME, outside of the GIL
+ENCODE_WORKERS = min(4, os.cpu_count() or 1)
+_pool = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode")
+
+
+def available_formats() -> list[str]:
+    """Formats that can be encoded with the libraries installed."""
+    formats = ["wav", "flac"]
+    if lameenc is not None:
+        formats.append("mp3")
+    if "OPUS" in sf.available_subtypes("OGG"):
+        formats.append("opus")
+    return formats
+
+
+def output_format(fmt: str) -> str:
+    """Check that a configured format can be encoded with the libraries installed."""
+    if fmt not in available_formats():
+        raise ValueError(f"Unsupported output format: {fmt} (available: {', '.join(available_formats())})")
+    return fmt
+
+
+# Delivery format of stems and remixes written to separated/, checked at startup rather
+# than on the first remix
+OUTPUT_FORMAT = output_format(os.getenv("OUTPUT_FORMAT", "flac"))
+# Small encodes for listening in the chat, starting fast on slow connections. The files
+# in OUTPUT_FORMAT are kept for downloads. None when no lossy encoder is installed: outputs
+# are then only played from their full quality file
+AUDITION_FORMAT = next((fmt for fmt in ("mp3", "opus") if fmt in available_formats()), None)
+AUDITION_BITRATE = 64 if AUDITION_FORMAT == "mp3" else None
+
+
+def extension(fmt: str) -> str:
+    return FORMATS[fmt][0]
+
+
+def media_type(fmt: str) -> str:
+    return FORMATS[fmt][2]
+
+
+def audition_name(name: str) -> Optional[str]:
+    """File name of the listening encode of an output file, None without AUDITION_FORMAT."""
+    if AUDITION_FORMAT is None:
+        return None
+    return f"{os.path.splitext(name)[0]}_audition.{extension(AUDITION_FORMAT)}"
+
+
+def sources(audition_url: Optional[str], file_url: str, fmt: str = OUTPUT_FORMAT) -> list[dict]:
+    """Playback sources of an output, the listening encode (if any) first and the full quality file second."""
+    listed = []
+    if audition_url is not None:
+        listed.append({"url": audition_url, "type": media_type(AUDITION_FORMAT)})
+    listed.append({"url": file_url, "type": media_type(fmt)})
+    return listed
+
+
+def _to_i16(array: np.ndarray) -> np.ndarray:
+    return (np.clip(array, -1.0, 1.0) * 32767).round().astype("<i2")
+
+
+def encode(array: np.ndarray, sr: int, fmt: str = OUTPUT_FORMAT, bitrate: Optional[int] = None) -> bytes:
+    """
+    Encode a (channels, samples) float array.
+
+    Args:
+        array: float array with shape (channels, samples)
+        sr: Sample rate in Hz
+        fmt: One of `available_formats()`
+        bitrate: kbps, for MP3 only (MP3_BITRATE by default)
+
+    Returns:
+        The encoded file
+    """
+    if fmt not in available_formats():
+        raise ValueError(f"Unsupported output format: {fmt}")
+    if fmt == "mp3":
+        encoder = lameenc.Encoder()
+        encoder.set_bit_rate(bitrate or MP3_BITRATE)
+        encoder.set_in_sample_rate(sr)
+        encoder.set_channels(array.shape[0])
+        encoder.set_quality(2)
+        encoder.silence()
+        data = encoder.encode(np.ascontiguousarray(_to_i16(array).T).tobytes())
+        return bytes(data + encoder.flush())
+
+    buffer = io.BytesIO()
+    if fmt == "opus":
+        resampled = librosa.resample(np.asarray(array, dtype=np.float32), orig_sr=sr, target_sr=OPUS_SAMPLE_RATE)
+        sf.write(buffer, np.clip(resampled, -1.0, 1.0).T, OPUS_SAMPLE_RATE, format="OGG", subtype="OPUS",
+                 compression_level=OPUS_COMPRESSION_LEVEL)
+    else:
+        sf.write(buffer, _to_i16(array).T, sr, format=fmt.upper(), subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def encode_to_file(path: str, array: np.ndarray, sr: int, fmt: str = OUTPUT_FORMAT,
+                   bitrate: Optional[int] = None) -> dict:
+    """
+    Encode an array to `path` and report on it.
+
+    Returns:
+        Report with the path, format, encoded size ("bytes"), compression ratio against
+        16-bit PCM ("ratio"), encoding time ("seconds") and speed in seconds of audio
+        per second ("realtime")
+    """
+    begin = time.perf_counter()
+    data = encode(array, sr, fmt, bitrate)
+    with open(path, "wb") as f:
+        f.write(data)
+    elapsed = time.perf_counter() - begin
+    pcm_bytes = array.shape[0] * array.shape[-1] * 2
+    return {
+        "path": path,
+        "format": fmt,
+        "bytes": len(data),
+        "ratio": pcm_bytes / max(len(data), 1),
+        "seconds": elapsed,
+        "realtime": array.shape[-1] / sr / max(elapsed, 1e-9),
+    }
+
+
+def submit_encode(path: str, array: np.ndarray, sr: int, fmt: str = OUTPUT_FORMAT,
+                  bitrate: Optional[int] = None) -> Future:
+    """Encode in the background on the shared encoder pool, the future gives the `encode_to_file` report."""
+    return _pool.submit(encode_to_file, path, array, sr, fmt, bitrate)
+
+
+def submit_audition(path: Optional[str], array: np.ndarray, sr: int) -> Optional[Future]:
+    """Listening encode of an output on the encoder pool, None without AUDITION_FORMAT."""
+    if path is None or AUDITION_FORMAT is None:
+        return None
+    return submit_encode(path, array, sr, AUDITION_FORMAT, AUDITION_BITRATE)
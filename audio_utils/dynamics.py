@@ -0,0 +1,165 @@
+from typing import Callable, Iterable, Iterator, Optional
+import numpy as np
+
+# Detector resolution (samples): levels and gains are computed once per block
+# and linearly interpolated in between
+BLOCK_SIZE = 64
+
+
+def static_gain_db(level_db: np.ndarray, threshold: float, ratio: float, knee: float = 0.0) -> np.ndarray:
+    """
+    Gain (dB, <= 0) applied by a compressor to a signal at `level_db`, with a soft knee
+    of width `knee` dB centered on `threshold`.
+    """
+    level_db = np.asarray(level_db, dtype=np.float64)
+    over = level_db - threshold
+    slope = 1.0 / ratio - 1.0
+    gain = np.where(over > 0, slope * over, 0.0)
+    if knee > 0:
+        in_knee = np.abs(over) <= knee / 2
+        gain = np.where(in_knee, slope * (over + knee / 2) ** 2 / (2 * knee), gain)
+    return gain
+
+
+def _block_levels_db(array: np.ndarray, block_size: int) -> np.ndarray:
+    # Stereo linked peak detector: the loudest channel drives the gain of both
+    length = array.shape[-1]
+    blocks = -(-length // block_size)
+    padded = np.zeros((array.shape[0], blocks * block_size), dtype=np.float32)
+    padded[:, :length] = np.abs(array)
+    peaks = padded.reshape(array.shape[0], blocks, block_size).max(axis=(0, 2))
+    return 20 * np.log10(np.maximum(peaks, 1e-10))
+
+
+def _smooth(target_db: np.ndarray, attack_coef: float, release_coef: float,
+            state: float = 0.0) -> np.ndarray:
+    # One-pole smoothing of the gain, with a faster coefficient while the gain goes down
+    out = np.empty_like(target_db)
+    for i, target in enumerate(target_db.tolist()):
+        coef = attack_coef if target < state else release_coef
+        state = target + coef * (state - target)
+        out[i] = state
+    return out
+
+
+def _interpolate_gain(block_gain: np.ndarray, length: int, block_size: int,
+                      previous: Optional[float] = None) -> np.ndarray:
+    # Each block boundary takes the smaller gain of its two neighbours, so every sample
+    # gets at most the gain computed for its own block. `previous` is the gain of the
+    # block before the first one, when processing a stream
+    edges = np.minimum(np.concatenate([block_gain[:1], block_gain]),
+                       np.concatenate([block_gain, block_gain[-1:]]))
+    if previous is not None:
+        edges[0] = min(edges[0], previous)
+    positions = (np.arange(length) + 0.5) / block_size
+    return np.interp(positions, np.arange(len(edges)), edges).astype(np.float32)
+
+
+def compress(array: np.ndarray, sr: int, threshold: float = -20.0, ratio: float = 4.0,
+             attack: float = 20.0, release: float = 250.0, knee: float = 6.0,
+             makeup_db: float = 0.0, block_size: int = BLOCK_SIZE) -> np.ndarray:
+    """
+    Feed-forward compressor.
+
+    Args:
+        array: float array with shape (channels, samples)
+        sr: Sample rate in Hz
+        threshold: Threshold in dBFS
+        ratio: Compression ratio above the threshold
+        attack: Attack time in ms
+        release: Release time in ms
+        knee: Soft knee width in dB
+        makeup_db: Gain added after compression, in dB
+        block_size: Detector resolution in samples
+
+    Returns:
+        Compressed float32 array with shape (channels, samples)
+    """
+    if array.shape[-1] == 0:
+        return array.astype(np.float32, copy=False)
+    block_rate = sr / block_size
+    attack_coef = np.exp(-1.0 / (block_rate * attack / 1000)) if attack > 0 else 0.0
+    release_coef = np.exp(-1.0 / (block_rate * release / 1000)) if release > 0 else 0.0
+
+    target = static_gain_db(_block_levels_db(array, block_size), threshold, ratio, knee)
+    gain_db = _smooth(target, attack_coef, release_coef) + makeup_db
+    gain = _interpolate_gain(10 ** (gain_db / 20), array.shape[-1], block_size)
+    return (array * gain).astype(np.float32, copy=False)
+
+
+def limit(array: np.ndarray, sr: int, ceiling_db: float = -0.3, release: float = 50.0,
+          block_size: int = BLOCK_SIZE) -> np.ndarray:
+    """
+    Bus peak limiter: the output never exceeds `ceiling_db`. Gain reduction is instant
+    (the detector looks one block ahead) and recovers with a `release` time constant in ms.
+    """
+    if array.shape[-1] == 0:
+        return array.astype(np.float32, copy=False)
+    ceiling = 10 ** (ceiling_db / 20)
+    levels = _block_levels_db(array, block_size)
+    target = np.minimum(0.0, ceiling_db - levels)
+    if not np.any(target < 0):
+        return array.astype(np.float32, copy=False)
+    release_coef = np.exp(-1.0 / (sr / block_size * release / 1000))
+    gain_db = _smooth(target, 0.0, release_coef)
+    gain = _interpolate_gain(10 ** (gain_db / 20), array.shape[-1], block_size)
+    out = (array * gain).astype(np.float32, copy=False)
+    # Guard against float rounding right at the ceiling
+    np.clip(out, -ceiling, ceiling, out=out)
+    return out
+
+
+def _gain_stream(blocks: Iterable[np.ndarray], target_db: Callable[[np.ndarray], np.ndarray],
+                 attack_coef: float, release_coef: float, makeup_db: float,
+                 block_size: int) -> Iterator[np.ndarray]:
+    # Block-by-block version of the gain computer. The last detector block of each chunk
+    # is held back until the next chunk gives the gain of the block after it, so the
+    # output is the same as processing the whole signal at once, one detector block late.
+    # Chunks must be multiples of `block_size`, except the last one
+    state = 0.0
+    previous = None
+    held, held_gain = None, None
+    for chunk in blocks:
+        if chunk.shape[-1] == 0:
+            continue
+        smoothed = _smooth(target_db(_block_levels_db(chunk, block_size)), attack_coef, release_coef, state)
+        state = float(smoothed[-1])
+        gain = 10 ** ((smoothed + makeup_db) / 20)
+        if held is not None:
+            chunk = np.concatenate([held, chunk], axis=-1)
+            gain = np.concatenate([[held_gain], gain])
+        split = (len(gain) - 1) * block_size
+        if split > 0:
+            envelope = _interpolate_gain(gain, split + block_size, block_size, previous)[:split]
+            yield (chunk[:, :split] * envelope).astype(np.float32, copy=False)
+            previous = gain[-2]
+        held, held_gain = chunk[:, split:], gain[-1]
+    if held is not None:
+        envelope = _interpolate_gain(np.array([held_gain]), held.shape[-1], block_size, previous)
+        yield (held * envelope).astype(np.float32, copy=False)
+
+
+def compress_blocks(blocks: Iterable[np.ndarray], sr: int, threshold: float = -20.0, ratio: float = 4.0,
+                    attack: float = 20.0, release: float = 250.0, knee: float = 6.0,
+                    makeup_db: float = 0.0, block_size: int = BLOCK_SIZE) -> Iterator[np.ndarray]:
+    """
+    Streaming `compress`: takes (channels, samples) chunks, multiples of `block_size`
+    except for the last one, and yields the compressed signal in chunks. Concatenated,
+    the output is the same as compressing the whole signal.
+    """
+    block_rate = sr / block_size
+    attack_coef = np.exp(-1.0 / (block_rate * attack / 1000)) if attack > 0 else 0.0
+    release_coef = np.exp(-1.0 / (block_rate * release / 1000)) if release > 0 else 0.0
+    return _gain_stream(blocks, lambda levels: static_gain_db(levels, threshold, ratio, knee),
+                        attack_coef, release_coef, makeup_db, block_size)
+
+
+def limit_blocks(blocks: Iterable[np.ndarray], sr: int, ceiling_db: float = -0.3, release: float = 50.0,
+                 block_size: int = BLOCK_SIZE) -> Iterator[np.ndarray]:
+    """Streaming `limit`, with the same chunking rules as `compress_blocks`."""
+    ceiling = 10 ** (ceiling_db / 20)
+    release_coef = np.exp(-1.0 / (sr / block_size * release / 1000))
+    for out in _gain_stream(blocks, lambda levels: np.minimum(0.0, ceiling_db - levels),
+                            0.0, release_coef, 0.0, block_size):
+        np.clip(out, -ceiling, ceiling, out=out)
+        yield out
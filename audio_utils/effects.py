@@ -0,0 +1,72 @@
+import subprocess
+import numpy as np
+from pydub.utils import which
+from audio_utils.filters import DEFAULT_Q, biquad_coefficients, filter_sos, apply_sos
+from audio_utils.reverb import apply_reverb_batch
+from audio_utils.dynamics import compress
+from audio_utils.pitch import pitch_shift
+
+
+def _run_ffmpeg_filter(array: np.ndarray, sr: int, af: str) -> np.ndarray:
+    """
+    Run an ffmpeg audio filter on a float array, streaming raw float32 samples
+    through stdin/stdout instead of round-tripping temp WAV files.
+
+    Args:
+        array: float array with shape (channels, samples)
+        sr: Sample rate in Hz
+        af: ffmpeg audio filter graph, e.g. "lowpass=f=5000"
+
+    Returns:
+        Filtered float32 array with shape (channels, samples)
+    """
+    channels = array.shape[0]
+    raw_format = ["-f", "f32le", "-ar", str(sr), "-ac", str(channels)]
+    cmd = [
+        which("ffmpeg") or "ffmpeg", "-hide_banner", "-loglevel", "error",
+        *raw_format, "-i", "pipe:0",
+        "-af", af,
+        *raw_format, "pipe:1",
+    ]
+    interleaved = np.ascontiguousarray(array.T, dtype="<f4")
+    result = subprocess.run(cmd, input=interleaved.tobytes(), check=True, capture_output=True)
+    out = np.frombuffer(result.stdout, dtype="<f4").reshape(-1, channels)
+    return out.T.copy()
+
+
+def apply_gain(array: np.ndarray, gain: float) -> np.ndarray:
+    return (array * np.float32(gain)).astype(np.float32, copy=False)
+
+
+def apply_reverb(array: np.ndarray, sr: int, reverberance: float = 0.5) -> np.ndarray:
+    return apply_reverb_batch([array], sr, reverberance)[0]
+
+
+def change_pitch(array: np.ndarray, sr: int, n_steps: float) -> np.ndarray:
+    return pitch_shift(array, sr, n_steps)
+
+
+def apply_eq(array: np.ndarray, sr: int, frequency: float, width: float, gain_db: float) -> np.ndarray:
+    """Peaking EQ with quality factor `width`, same response as ffmpeg's `equalizer` with t=q."""
+    return apply_sos(array, biquad_coefficients("peaking", frequency, width, gain_db, sr))
+
+
+def apply_filter(array: np.ndarray, sr: int, filter_type: str = "lowpass", cutoff: float = 5000,
+                 q: float = DEFAULT_Q, gain_db: float = 0.0) -> np.ndarray:
+    if filter_type not in ("lowpass", "highpass", "lowshelf", "highshelf"):
+        raise ValueError("Unsupported filter type.")
+    return apply_sos(array, biquad_coefficients(filter_type, cutoff, q, gain_db, sr))
+
+
+def apply_bandpass(array: np.ndarray, sr: int, low_cutoff: float, high_cutoff: float) -> np.ndarray:
+    """Highpass at `low_cutoff` then lowpass at `high_cutoff`, run as a single cascade."""
+    sos = filter_sos(biquad_coefficients("highpass", low_cutoff, DEFAULT_Q, 0.0, sr),
+                     biquad_coefficients("lowpass", high_cutoff, DEFAULT_Q, 0.0, sr))
+    return apply_sos(array, sos)
+
+
+def apply_compression(array: np.ndarray, sr: int, threshold: float = -20, ratio: float = 3,
+                      attack: float = 20, release: float = 250, knee: float = 6.0,
+                      makeup_db: float = 0.0) -> np.ndarray:
+    return compress(array, sr, threshold=threshold, ratio=ratio, attack=attack, release=release,
+                    knee=knee, makeup_db=makeup_db)
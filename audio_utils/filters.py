@@ -0,0 +1,84 @@
+from functools import lru_cache
+from typing import Iterable, Iterator
+import numpy as np
+from scipy.signal import sosfilt
+
+# Default Q of ffmpeg's 2-pole lowpass/highpass filters (Butterworth)
+DEFAULT_Q = 0.707
+
+FILTER_TYPES = ("peaking", "lowpass", "highpass", "bandpass", "lowshelf", "highshelf")
+
+
+@lru_cache(maxsize=256)
+def biquad_coefficients(filter_type: str, frequency: float, q: float = DEFAULT_Q,
+                        gain_db: float = 0.0, sr: int = 44100) -> np.ndarray:
+    """
+    Second-order section for one biquad, following the RBJ Audio EQ Cookbook
+    formulas also used by ffmpeg's `equalizer`, `lowpass`, `highpass` and shelf filters.
+
+    Args:
+        filter_type: One of FILTER_TYPES
+        frequency: Center (peaking, bandpass, shelves) or cutoff frequency in Hz
+        q: Quality factor
+        gain_db: Gain in dB, only used by peaking and shelf filters
+        sr: Sample rate in Hz
+
+    Returns:
+        Read-only array with shape (1, 6): [b0, b1, b2, 1, a1, a2]
+    """
+    if filter_type not in FILTER_TYPES:
+        raise ValueError(f"Unsupported filter type: {filter_type}")
+    frequency = min(max(frequency, 1.0), 0.499 * sr)
+    w0 = 2 * np.pi * frequency / sr
+    cos_w0, sin_w0 = np.cos(w0), np.sin(w0)
+    alpha = sin_w0 / (2 * q)
+    a = 10 ** (gain_db / 40)
+
+    if filter_type == "peaking":
+        b = [1 + alpha * a, -2 * cos_w0, 1 - alpha * a]
+        den = [1 + alpha / a, -2 * cos_w0, 1 - alpha / a]
+    elif filter_type == "lowpass":
+        b = [(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2]
+        den = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    elif filter_type == "highpass":
+        b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+        den = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    elif filter_type == "bandpass":
+        # Constant 0 dB peak gain
+        b = [alpha, 0.0, -alpha]
+        den = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    else:
+        sqrt_a = 2 * np.sqrt(a) * alpha
+        sign = 1 if filter_type == "lowshelf" else -1
+        b = [a * ((a + 1) - sign * (a - 1) * cos_w0 + sqrt_a),
+             sign * 2 * a * ((a - 1) - sign * (a + 1) * cos_w0),
+             a * ((a + 1) - sign * (a - 1) * cos_w0 - sqrt_a)]
+        den = [(a + 1) + sign * (a - 1) * cos_w0 + sqrt_a,
+               -sign * 2 * ((a - 1) + sign * (a + 1) * cos_w0),
+               (a + 1) + sign * (a - 1) * cos_w0 - sqrt_a]
+
+    sos = np.array([b + den], dtype=np.float64) / den[0]
+    sos.setflags(write=False)
+    return sos
+
+
+def filter_sos(*sections: np.ndarray) -> np.ndarray:
+    """Stack biquad sections into a single cascade, applied in one pass."""
+    return np.concatenate(sections, axis=0)
+
+
+def apply_sos(array: np.ndarray, sos: np.ndarray) -> np.ndarray:
+    """Run a second-order-section cascade over every channel of a (channels, samples) array."""
+    # sosfilt needs a writeable coefficient buffer, cached sections are read-only
+    return sosfilt(np.array(sos), array, axis=-1).astype(np.float32, copy=False)
+
+
+def sos_blocks(blocks: Iterable[np.ndarray], sos: np.ndarray) -> Iterator[np.ndarray]:
+    """Streaming `apply_sos`: the filter state is carried from one (channels, samples) chunk to the next."""
+    sos = np.array(sos)
+    zi = None
+    for chunk in blocks:
+        if zi is None:
+            zi = np.zeros((sos.shape[0], chunk.shape[0], 2))
+        out, zi = sosfilt(sos, chunk, axis=-1, zi=zi)
+        yield out.astype(np.float32, copy=False)
@@ -0,0 +1,144 @@
+from typing import Optional
+import numpy as np
+from scipy.signal import correlate, correlation_lags
+
+# Resolution (samples) of the coarse loudness envelope used to align two mixes
+FINGERPRINT_HOP = 1024
+# Two envelopes are taken for the same material above this normalized correlation. Frames
+# straddle the true offset, so even identical audio scores below 1; the block comparison
+# after alignment decides what is actually reused
+MIN_ALIGNMENT_SCORE = 0.8
+# Shortest overlap (s) worth aligning
+MIN_OVERLAP_SECONDS = 10.0
+# Blocks (samples) compared once two mixes are aligned
+MATCH_BLOCK = 4096
+# A block matches when the difference between the mixes is this far (dB) below the block
+# level, or below SILENCE_DB
+MATCH_DB = -40.0
+SILENCE_DB = -70.0
+# Excerpt (samples) of the mixes cross-correlated to find the exact offset
+REFINE_LENGTH = 1 << 15
+
+
+def envelope(mix: np.ndarray, hop: int = FINGERPRINT_HOP) -> np.ndarray:
+    """Log energy of consecutive `hop` samples of a (channels, samples) mix, over its channels."""
+    mono = np.asarray(mix, dtype=np.float32).reshape(-1, mix.shape[-1]).mean(axis=0)
+    frames = len(mono) // hop
+    energy = np.square(mono[:frames * hop].reshape(frames, hop), dtype=np.float32).mean(axis=1)
+    return np.log10(energy + 1e-10).astype(np.float32)
+
+
+def align(new_env: np.ndarray, old_env: np.ndarray, min_overlap: int) -> tuple[int, float]:
+    """
+    Offset of `new_env` against `old_env` with the highest normalized cross-correlation,
+    among those where they overlap by at least `min_overlap` frames.
+
+    Returns:
+        The lag in frames (new frame i lines up with old frame i - lag) and its score
+    """
+    a = new_env.astype(np.float64) - new_env.mean()
+    b = old_env.astype(np.float64) - old_env.mean()
+    corr = correlate(a, b, mode="full", method="fft")
+    lags = correlation_lags(len(a), len(b), mode="full")
+    # Energy of each envelope over the overlap at every lag
+    a_energy = np.concatenate([[0.0], np.cumsum(a * a)])
+    b_energy = np.concatenate([[0.0], np.cumsum(b * b)])
+    a_start, a_end = np.maximum(0, lags), np.minimum(len(a), len(b) + lags)
+    b_start, b_end = a_start - lags, a_end - lags
+    overlap = a_end - a_start
+    norm = np.sqrt((a_energy[a_end] - a_energy[a_start]) * (b_energy[b_end] - b_energy[b_start]))
+    score = np.where((overlap >= min_overlap) & (norm > 0), corr / np.maximum(norm, 1e-12), -1.0)
+    best = int(np.argmax(score))
+    return int(lags[best]), float(score[best])
+
+
+def refine(new_mono: np.ndarray, old_mono: np.ndarray, lag: int, radius: int) -> int:
+    """Exact lag (samples) within `radius` of a coarse one, by cross-correlating an excerpt of the overlap."""
+    start = max(0, lag) + radius
+    end = min(len(new_mono), len(old_mono) + lag) - radius
+    if end - start < 1:
+        return lag
+    middle = (start + end) // 2
+    excerpt_start = max(start, middle - REFINE_LENGTH // 2)
+    excerpt = new_mono[excerpt_start:min(end, excerpt_start + REFINE_LENGTH)]
+    old_start = excerpt_start - lag - radius
+    reference = old_mono[old_start:old_start + len(excerpt) + 2 * radius]
+    corr = correlate(reference, excerpt, mode="valid", method="fft")
+    # corr[k] lines the excerpt up with old samples from old_start + k
+    return excerpt_start - (old_start + int(np.argmax(corr)))
+
+
+def matching_blocks(new_mix: np.ndarray, old_mix: np.ndarray, lag: int,
+                    block: int = MATCH_BLOCK) -> list[tuple[int, int]]:
+    """
+    Ranges (in samples of the new mix) where it is the same audio as the old mix shifted
+    by `lag`, compared block by block.
+    """
+    start, end = max(0, lag), min(new_mix.shape[-1], old_mix.shape[-1] + lag)
+    regions: list[tuple[int, int]] = []
+    for block_start in range(start, end, block):
+        block_end = min(block_start + block, end)
+        new = np.asarray(new_mix[:, block_start:block_end], dtype=np.float32)
+        old = np.asarray(old_mix[:, block_start - lag:block_end - lag], dtype=np.float32)
+        level = 10 * np.log10(np.mean(np.square(new)) + 1e-20)
+        error = 10 * np.log10(np.mean(np.square(new - old)) + 1e-20)
+        if error > SILENCE_DB and error - level > MATCH_DB:
+            continue
+        if regions and regions[-1][1] == block_start:
+            regions[-1] = (regions[-1][0], block_end)
+        else:
+            regions.append((block_start, block_end))
+    return regions
+
+
+def find_alignment(new_mix: np.ndarray, old_mix: np.ndarray, sr: int,
+                   old_env: Optional[np.ndarray] = None) -> Optional[tuple[int, list[tuple[int, int]]]]:
+    """
+    Align a new mix against one separated before (trimmed, extended or edited versions of
+    the same song): coarse envelopes first, then the exact sample offset.
+
+    Returns:
+        The lag in samples (new sample t is old sample t - lag) and the matching ranges of
+        the new mix, or None if the mixes do not share material
+    """
+    new_env = envelope(new_mix)
+    old_env = envelope(old_mix) if old_env is None else old_env
+    min_overlap = int(MIN_OVERLAP_SECONDS * sr / FINGERPRINT_HOP)
+    if min(len(new_env), len(old_env)) < min_overlap:
+        return None
+    lag, score = align(new_env, old_env, min_overlap)
+    if score < MIN_ALIGNMENT_SCORE:
+        return None
+    lag = refine(new_mix.mean(axis=0), np.asarray(old_mix, dtype=np.float32).mean(axis=0),
+                 lag * FINGERPRINT_HOP, FINGERPRINT_HOP)
+    regions = matching_blocks(new_mix, old_mix, lag)
+    return (lag, regions) if regions else None
+
+
+def reuse_sections(length: int, regions: list[tuple[int, int]], margin: int,
+                   min_length: int) -> tuple[list[tuple[int, int, int, int]], list[tuple[int, int]]]:
+    """
+    Split a new mix into parts taken from earlier stems and parts to separate.
+
+    The stems of a matching region were computed with the old track around it, so its
+    edges next to new material are left to the model: matching regions shrink by `margin`
+    there (not at the ends of the track), and are only kept from `min_length` samples.
+
+    Returns:
+        Reused parts as (window_start, start, end, window_end), valid from start to end
+        with the old stems available over the whole window, and the ranges to separate
+    """
+    reused = []
+    for region_start, region_end in regions:
+        start = region_start + (margin if region_start > 0 else 0)
+        end = region_end - (margin if region_end < length else 0)
+        if end - start >= min_length:
+            reused.append((region_start, start, end, region_end))
+    novel, cursor = [], 0
+    for _, start, end, _ in reused:
+        if start > cursor:
+            novel.append((cursor, start))
+        cursor = end
+    if cursor < length:
+        novel.append((cursor, length))
+    return reused, novel
@@ -0,0 +1,359 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from math import gcd
+from typing import Optional
+import numpy as np
+from scipy.ndimage import maximum_filter
+from scipy.signal import resample_poly
+
+# Spectral-peak landmarks: pairs of prominent spectrogram peaks, hashed by their two
+# frequencies and the time between them, survive lossy re-encodes of the same recording
+LANDMARK_SR = 11025
+LANDMARK_FFT = 1024
+LANDMARK_HOP = 256
+# A peak is the largest magnitude over this many bins and frames around it
+PEAK_NEIGHBORHOOD = (31, 15)
+# Strongest peaks kept per second of audio, and peaks ignored this far (dB) below the loudest
+# or below PEAK_FLOOR_DB (spectrum magnitude, about -90 dBFS), where there is only silence
+PEAKS_PER_SECOND = 30
+PEAK_RANGE_DB = 60.0
+PEAK_FLOOR_DB = -40.0
+# Each peak pairs with up to FAN_OUT later peaks, at most TARGET_FRAMES frames later and
+# TARGET_BINS bins away
+FAN_OUT = 5
+TARGET_FRAMES = 63
+TARGET_BINS = 96
+# A match needs this many landmarks agreeing on one offset, and this share of the landmarks
+# of the query
+MIN_LANDMARK_MATCHES = 20
+MIN_MATCH_RATIO = 0.1
+# Re-encodes pad or trim a few milliseconds (encoder delay), longer differences are edits
+DURATION_TOLERANCE_SECONDS = 0.1
+
+# One index file for all uploads, rewritten when a track is added. It lives outside of
+# separated/: the disk budget collector would drop it (and every alias) as least recently used
+INDEX_PATH = os.getenv("LANDMARK_INDEX_PATH", os.path.join("index", "landmarks.npz"))
+# Tracks added between two rewrites of the index file, each saved to a shard file meanwhile
+MERGE_TRACKS = int(os.getenv("LANDMARK_MERGE_TRACKS", 32))
+# Merges run one at a time, off the upload requests
+_merges = ThreadPoolExecutor(max_workers=1, thread_name_prefix="landmark-merge")
+
+
+def landmarks(mix: np.ndarray, sr: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Landmark hashes of a (channels, samples) or mono mix.
+
+    Returns:
+        uint32 hashes and the frame (at LANDMARK_HOP / LANDMARK_SR) of their first peak
+    """
+    mono = np.asarray(mix, dtype=np.float32)
+    if mono.ndim > 1:
+        mono = mono.reshape(-1, mono.shape[-1]).mean(axis=0)
+    divisor = gcd(LANDMARK_SR, sr)
+    mono = resample_poly(mono, LANDMARK_SR // divisor, sr // divisor).astype(np.float32)
+    frames = 1 + (len(mono) - LANDMARK_FFT) // LANDMARK_HOP
+    if frames < 2:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32)
+
+    windows = np.lib.stride_tricks.sliding_window_view(mono, LANDMARK_FFT)[::LANDMARK_HOP][:frames]
+    spectrum = np.abs(np.fft.rfft(windows * np.hanning(LANDMARK_FFT).astype(np.float32), axis=1)).T
+    # Bins 1 to 511: no DC, and a frequency fits 9 bits
+    db = 20 * np.log10(spectrum[1:512] + 1e-10)
+    is_peak = (db == maximum_filter(db, size=PEAK_NEIGHBORHOOD, mode="constant", cval=-np.inf))
+    is_peak &= db > max(db.max() - PEAK_RANGE_DB, PEAK_FLOOR_DB)
+    bins, times = np.nonzero(is_peak)
+    strength = db[bins, times]
+    keep = int(PEAKS_PER_SECOND * len(mono) / LANDMARK_SR) + 1
+    if len(bins) > keep:
+        strongest = np.argpartition(strength, -keep)[-keep:]
+        bins, times = bins[strongest], times[strongest]
+    order = np.lexsort((bins, times))
+    bins, times = bins[order] + 1, times[order]
+
+    hashes, anchors = [], []
+    ends = np.searchsorted(times, times + TARGET_FRAMES, side="right")
+    for i in range(len(times)):
+        targets = np.arange(i + 1, ends[i])
+        targets = targets[(times[targets] > times[i]) & (np.abs(bins[targets] - bins[i]) <= TARGET_BINS)][:FAN_OUT]
+        if len(targets):
+            dt = (times[targets] - times[i]).astype(np.uint32)
+            hashes.append((np.uint32(bins[i]) << 15) | (bins[targets].astype(np.uint32) << 6) | dt)
+            anchors.append(np.full(len(targets), times[i], dtype=np.int32))
+    if not hashes:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32)
+    return np.concatenate(hashes).astype(np.uint32), np.concatenate(anchors)
+
+
+class LandmarkIndex:
+    """
+    Landmarks of the uploaded tracks by content key, to recognize the same recording
+    uploaded again in another encoding. Keys recognized that way are aliases of the key
+    first indexed for the recording, whose stems they share.
+
+    Entries are kept as flat arrays sorted by hash, looked up with binary search. Tracks
+    added since the last merge are kept as one sorted segment each and saved as one small
+    shard file each, next to the index file. Past MERGE_TRACKS of them, they are merged
+    into the main arrays and file in the background.
+    """
+
+    def __init__(self, path: Optional[str] = None, merge_tracks: int = MERGE_TRACKS):
+        self.path = path
+        self.merge_tracks = merge_tracks
+        self._lock = threading.Lock()
+        self.keys: list[str] = []
+        self.lengths: list[float] = []
+        self.aliases: dict[str, str] = {}
+        self._hashes = np.zeros(0, dtype=np.uint32)
+        self._tracks = np.zeros(0, dtype=np.int32)
+        self._times = np.zeros(0, dtype=np.int32)
+        # (hashes, tracks, times) of the tracks added since the last merge, by track
+        self._recent: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._shards: list[str] = []
+        self._merging = False
+        # One merge at a time, each one takes the recent tracks it merges off the list
+        self._merge_lock = threading.Lock()
+        self.metrics = {"lookups": 0, "matches": 0, "merges": 0, "last_lookup_seconds": 0.0}
+        if path is not None:
+            self._load()
+
+    @property
+    def shard_dir(self) -> str:
+        return f"{os.path.splitext(self.path)[0]}.shards"
+
+    def _load(self) -> None:
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                self.keys = [str(key) for key in data["keys"]]
+                self.lengths = [float(length) for length in data["lengths"]]
+                self.aliases = dict(zip((str(a) for a in data["alias_keys"]),
+                                        (str(k) for k in data["alias_targets"])))
+                self._hashes, self._tracks, self._times = data["hashes"], data["tracks"], data["times"]
+        if not os.path.isdir(self.shard_dir):
+            return
+        for name in sorted(os.listdir(self.shard_dir)):
+            if not name.endswith(".npz") or ".tmp" in name:
+                continue
+            shard = os.path.join(self.shard_dir, name)
+            with np.load(shard) as data:
+                for key, length in zip(data["keys"], data["lengths"]):
+                    # Shards merged into the main file are removed right after it is written
+                    if str(key) not in self.keys:
+                        self._append(str(key), data["hashes"], data["times"], float(length))
+                for alias, target in zip(data["alias_keys"], data["alias_targets"]):
+                    self.aliases[str(alias)] = str(target)
+            self._shards.append(shard)
+        if len(self._recent) >= self.merge_tracks:
+            self._merging = True
+            _merges.submit(self._merge)
+
+    def _write_shard(self, keys: list[str], lengths: list[float], hashes: np.ndarray, times: np.ndarray,
+                     aliases: dict[str, str]) -> None:
+        if self.path is None:
+            return
+        os.makedirs(self.shard_dir, exist_ok=True)
+        shard = os.path.join(self.shard_dir, f"{time.time_ns():020d}_{uuid.uuid4().hex[:8]}.npz")
+        tmp_path = f"{shard}.tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys, dtype=str), lengths=np.array(lengths),
+                 alias_keys=np.array(list(aliases), dtype=str),
+                 alias_targets=np.array(list(aliases.values()), dtype=str),
+                 hashes=hashes.astype(np.uint32), times=times.astype(np.int32))
+        os.replace(tmp_path, shard)
+        with self._lock:
+            self._shards.append(shard)
+
+    def save(self) -> None:
+        """Merge the recent tracks into the main arrays and rewrite the index file."""
+        with self._merge_lock:
+            self._save()
+
+    def _save(self) -> None:
+        with self._lock:
+            recent, shards = len(self._recent), list(self._shards)
+            segments = [(self._hashes, self._tracks, self._times)] + self._recent[:recent]
+        all_hashes = np.concatenate([segment[0] for segment in segments])
+        order = np.argsort(all_hashes, kind="stable")
+        hashes = all_hashes[order]
+        tracks = np.concatenate([segment[1] for segment in segments])[order]
+        times = np.concatenate([segment[2] for segment in segments])[order]
+        with self._lock:
+            self._hashes, self._tracks, self._times = hashes, tracks, times
+            self._recent = self._recent[recent:]
+            merged = len(self.keys) - len(self._recent)
+            keys, lengths, aliases = self.keys[:merged], self.lengths[:merged], dict(self.aliases)
+        self.metrics["merges"] += 1
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{uuid.uuid4().hex[:8]}.tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys, dtype=str), lengths=np.array(lengths),
+                 alias_keys=np.array(list(aliases), dtype=str),
+                 alias_targets=np.array(list(aliases.values()), dtype=str),
+                 hashes=hashes, tracks=tracks, times=times)
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._shards = [shard for shard in self._shards if shard not in shards]
+        for shard in shards:
+            try:
+                os.remove(shard)
+            except FileNotFoundError:
+                pass
+
+    def _merge(self) -> None:
+        try:
+            self.save()
+        finally:
+            with self._lock:
+                self._merging = False
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.aliases or key in self.keys
+
+    def resolve(self, key: str) -> str:
+        """Key whose stems serve `key`: the first upload of the same recording, or itself."""
+        return self.aliases.get(key, key)
+
+    def _append(self, key: str, hashes: np.ndarray, times: np.ndarray, length: float) -> None:
+        order = np.argsort(hashes, kind="stable")
+        track = len(self.keys)
+        self.keys.append(key)
+        self.lengths.append(length)
+        self._recent.append((hashes.astype(np.uint32)[order], np.full(len(hashes), track, dtype=np.int32),
+                             times.astype(np.int32)[order]))
+
+    def add(self, key: str, hashes: np.ndarray, times: np.ndarray, length: float) -> None:
+        """Index the landmarks of a track of `length` seconds."""
+        with self._lock:
+            self._append(key, hashes, times, length)
+            merge = len(self._recent) >= self.merge_tracks and not self._merging
+            self._merging = self._merging or merge
+        self._write_shard([key], [length], hashes, times, {})
+        if merge:
+            _merges.submit(self._merge)
+
+    def alias(self, key: str, target: str) -> None:
+        with self._lock:
+            self.aliases[key] = self.resolve(target)
+            aliases = {key: self.aliases[key]}
+        self._write_shard([], [], np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32), aliases)
+
+    def _shared(self, hashes: np.ndarray, times: np.ndarray) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        """Track and offset (indexed minus query frame) of the indexed landmarks sharing a query hash."""
+        with self._lock:
+            segments = [(self._hashes, self._tracks, self._times)] + list(self._recent)
+            keys = list(self.keys)
+        tracks, offsets = [], []
+        for segment_hashes, segment_tracks, segment_times in segments:
+            first = np.searchsorted(segment_hashes, hashes, side="left")
+            last = np.searchsorted(segment_hashes, hashes, side="right")
+            counts = last - first
+            # Every (query landmark, indexed landmark) pair with the same hash
+            query_index = np.repeat(np.arange(len(hashes)), counts)
+            entry = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            tracks.append(segment_tracks[entry])
+            offsets.append(segment_times[entry] - times[query_index])
+        return np.concatenate(tracks), np.concatenate(offsets), keys
+
+    @staticmethod
+    def _votes(tracks: np.ndarray, offsets: np.ndarray) -> tuple[np.ndarray, int, int]:
+        """
+        Votes by (track, offset) at index `track * span + offset - lowest + 1`, the
+        neighbouring offsets count too since encoder delays move peaks by a fraction of a frame.
+
+        Returns:
+            The votes, span and lowest offset
+        """
+        span = int(offsets.max() - offsets.min()) + 3
+        votes = np.bincount(tracks.astype(np.int64) * span + (offsets - offsets.min() + 1))
+        votes = votes + np.concatenate([[0], votes[:-1]]) + np.concatenate([votes[1:], [0]])
+        return votes, span, int(offsets.min())
+
+    def query(self, hashes: np.ndarray, times: np.ndarray) -> Optional[tuple[str, int, float, int]]:
+        """
+        Indexed track sharing the most landmarks with a query at one time offset.
+
+        Returns:
+            Its key, the number of agreeing landmarks, their share of the query landmarks
+            and the offset in frames (indexed frame minus query frame), or None if no
+            track reaches MIN_LANDMARK_MATCHES and MIN_MATCH_RATIO
+        """
+        begin = time.perf_counter()
+        tracks, offsets, keys = self._shared(hashes, times)
+        self.metrics["lookups"] += 1
+        result = None
+        if len(tracks):
+            votes, span, lowest = self._votes(tracks, offsets)
+            best = int(np.argmax(votes))
+            matches, ratio = int(votes[best]), votes[best] / len(hashes)
+            if matches >= MIN_LANDMARK_MATCHES and ratio >= MIN_MATCH_RATIO:
+                track, offset = divmod(best, span)
+                result = keys[track], matches, float(ratio), int(offset + lowest - 1)
+        self.metrics["last_lookup_seconds"] = time.perf_counter() - begin
+        return result
+
+    def similar(self, key: str, mix: np.ndarray, sr: int, limit: int) -> list[str]:
+        """
+        Other indexed tracks sharing at least MIN_LANDMARK_MATCHES landmarks with a track
+        at one offset, whatever their durations, the most shared first: the candidates for
+        a trimmed or extended re-upload. The landmarks of `key` come from the index, or
+        from `mix` when it is not indexed.
+        """
+        with self._lock:
+            track = self.keys.index(key) if key in self.keys else None
+            segments = [(self._hashes, self._tracks, self._times)] + list(self._recent)
+        if track is None:
+            hashes, times = landmarks(mix, sr)
+        else:
+            own = [(segment_hashes[segment_tracks == track], segment_times[segment_tracks == track])
+                   for segment_hashes, segment_tracks, segment_times in segments]
+            hashes = np.concatenate([landmark[0] for landmark in own])
+            times = np.concatenate([landmark[1] for landmark in own])
+        tracks, offsets, keys = self._shared(hashes, times)
+        if not len(tracks):
+            return []
+        votes, span, _ = self._votes(tracks, offsets)
+        by_track = np.zeros(len(keys) * span, dtype=votes.dtype)
+        by_track[:len(votes)] = votes
+        best = by_track.reshape(len(keys), span).max(axis=1)
+        order = np.argsort(-best, kind="stable")
+        found = [keys[i] for i in order if best[i] >= MIN_LANDMARK_MATCHES and keys[i] != key]
+        return found[:limit]
+
+    def match(self, key: str, mix: np.ndarray, sr: int) -> str:
+        """
+        Resolve an upload to the key of a recording already indexed with the same duration
+        and content, or index it under its own key.
+
+        Returns:
+            The key whose stems serve the upload
+        """
+        if key in self:
+            return self.resolve(key)
+        hashes, times = landmarks(mix, sr)
+        length = mix.shape[-1] / sr
+        found = self.query(hashes, times) if len(hashes) else None
+        tolerance = DURATION_TOLERANCE_SECONDS * LANDMARK_SR / LANDMARK_HOP
+        if found is not None:
+            target, _, _, offset = found
+            if (abs(self.lengths[self.keys.index(target)] - length) <= DURATION_TOLERANCE_SECONDS
+                    and abs(offset) <= tolerance):
+                self.alias(key, target)
+                self.metrics["matches"] += 1
+                return self.resolve(key)
+        self.add(key, hashes, times, length)
+        return key
+
+    def stats(self) -> dict:
+        with self._lock:
+            segments = [(self._hashes, self._tracks, self._times)] + list(self._recent)
+            tracks, aliases, recent = len(self.keys), len(self.aliases), len(self._recent)
+        entries = sum(len(segment[0]) for segment in segments)
+        size = sum(array.nbytes for segment in segments for array in segment)
+        return {**self.metrics, "tracks": tracks, "aliases": aliases, "recent": recent, "entries": entries,
+                "bytes": size}
+
+
+# Queried by the upload path, separation and remixes then use the resolved keys
+landmark_index = LandmarkIndex(INDEX_PATH)
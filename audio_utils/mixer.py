@@ -0,0 +1,240 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+import numpy as np
+import soundfile as sf
+from audio_utils.effects import (
+    apply_gain, apply_reverb, change_pitch, apply_eq, apply_filter, apply_bandpass,
+    apply_compression,
+)
+from audio_utils.reverb import apply_reverb_batch
+from audio_utils.dynamics import limit
+from audio_utils.cache import ArrayCache, content_hash
+from audio_utils.planner import COMPRESSION_PRESETS, plan_stem, split_output_gain, run_stages
+
+# Ceiling (dBFS) of the bus limiter applied to the final mix
+HEADROOM_DB = -0.3
+
+# Rendered stems, keyed by (stem content, length, sample rate, planned stages)
+RENDER_CACHE_BYTES = int(os.getenv("RENDER_CACHE_BYTES", 1 << 30))
+render_cache = ArrayCache(max_bytes=RENDER_CACHE_BYTES)
+
+# Stem chains run on a shared, bounded thread pool: the heavy stages (FFTs, IIR filters,
+# resampling) run in NumPy/SciPy code that releases the GIL. Enough workers for the stems
+# of two remixes, further work queues up instead of oversubscribing the host
+RENDER_WORKERS = min(8, os.cpu_count() or 1)
+_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+
+
+def _stem_volume(name: str, instructions: dict) -> float:
+    return (instructions.get("volumes") or {}).get(name, 1.0)
+
+
+def _stem_gain(array: np.ndarray, name: str, instructions: dict) -> np.ndarray:
+    return apply_gain(array, _stem_volume(name, instructions))
+
+
+def chain_key(name: str, instructions: dict) -> str:
+    """
+    Canonical form of the stages that determine the cached render of one stem.
+    A volume applied at mix-down is not part of it.
+    """
+    stages = plan_stem(name, instructions)
+    return repr(None if stages is None else split_output_gain(stages)[0])
+
+
+def _stem_reverb(name: str, instructions: dict) -> float:
+    return (instructions.get("reverb") or {}).get(name, 0) or 0.0
+
+
+def render_stem(array: np.ndarray, name: str, instructions: dict, sr: int) -> np.ndarray:
+    """
+    Apply the gain and effects requested for one stem, in the fixed order gain, reverb,
+    pitch shift, EQ, filter, compression. This is the reference chain: remixes go
+    through `plan_stem`, which renders the same audio with fewer stages.
+
+    Args:
+        array: float array with shape (channels, samples)
+        name: Stem name, used to look up its settings in `instructions`
+        instructions: Remix instructions as produced by the interpreter
+        sr: Sample rate in Hz
+
+    Returns:
+        Processed float32 array with shape (channels, samples)
+    """
+    audio = _stem_gain(array, name, instructions)
+    reverberance = _stem_reverb(name, instructions)
+    if reverberance > 0:
+        audio = apply_reverb(audio, sr, reverberance=reverberance)
+    return _render_after_reverb(audio, name, instructions, sr)
+
+
+def _render_after_reverb(audio: np.ndarray, name: str, instructions: dict, sr: int) -> np.ndarray:
+    pitch_instr = instructions.get("pitch_shift") or {}
+    if name in pitch_instr:
+        audio = change_pitch(audio, sr, n_steps=pitch_instr[name])
+
+    eq_instr = instructions.get("eq") or {}
+    if name in eq_instr:
+        eq = eq_instr[name]
+        if all(k in eq for k in ("frequency", "width", "gain_db")):
+            audio = apply_eq(audio, sr, frequency=eq["frequency"], width=eq["width"], gain_db=eq["gain_db"])
+
+    filter_instr = instructions.get("filter") or {}
+    if name in filter_instr:
+        f = filter_instr[name]
+        if f["type"] == "lowpass" and "cutoff" in f:
+            audio = apply_filter(audio, sr, "lowpass", cutoff=f["cutoff"])
+        elif f["type"] == "highpass" and "cutoff" in f:
+            audio = apply_filter(audio, sr, "highpass", cutoff=f["cutoff"])
+        elif f["type"] == "bandpass" and "low_cutoff" in f and "high_cutoff" in f:
+            audio = apply_bandpass(audio, sr, f["low_cutoff"], f["high_cutoff"])
+
+    comp_instr = instructions.get("compression") or {}
+    if comp_instr.get(name) in COMPRESSION_PRESETS:
+        threshold, ratio = COMPRESSION_PRESETS[comp_instr[name]]
+        audio = apply_compression(audio, sr, threshold=threshold, ratio=ratio)
+
+    return audio
+
+
+def mix_stems(stems: Iterable[np.ndarray]) -> np.ndarray:
+    """
+    Sum the processed stems into a single float32 bus, trimmed to the shortest stem.
+    Stems are consumed one at a time, so a generator keeps a single rendered stem
+    in memory besides the bus. No clipping happens here, see `limit`.
+    """
+    mix = None
+    for stem in stems:
+        if mix is None:
+            mix = np.array(stem, dtype=np.float32)
+        else:
+            length = min(mix.shape[1], stem.shape[1])
+            mix = mix[:, :length]
+            mix += stem[:, :length]
+    if mix is None:
+        raise ValueError("No stems to mix.")
+    return mix
+
+
+def _timed_reverb_batch(arrays: list[np.ndarray], sr: int, reverberance: float):
+    begin = time.perf_counter()
+    out = apply_reverb_batch(arrays, sr, reverberance)
+    return out, time.perf_counter() - begin
+
+
+def _render_planned(source: Callable[[], tuple[np.ndarray, list[tuple]]], sr: int,
+                    key: tuple, timings: dict) -> np.ndarray:
+    audio, stages = source()
+    return render_cache.put(key, run_stages(audio, stages, sr, timings=timings))
+
+
+def _render_stems(stem_arrays: dict[str, np.ndarray], instructions: dict, sr: int,
+                  stem_keys: dict[str, str], stats: dict) -> Iterator[np.ndarray]:
+    """
+    Yield the rendered stems in `stem_arrays` order, following their plans and taking
+    unchanged ones from `render_cache`. Muted stems are skipped.
+
+    Stem chains are independent and run concurrently on `_pool`. Stems whose plan
+    starts with the same reverb first go through the reverb engine together, in a
+    single batched FFT pass submitted ahead of the stem tasks: the pool runs tasks in
+    submission order, so a stem task waiting on its batch never blocks it.
+    """
+    min_len = min(arr.shape[1] for arr in stem_arrays.values())
+    plans, keys = {}, {}
+    for name in stem_arrays:
+        stages = plan_stem(name, instructions)
+        if stages is None:
+            stats["muted"].append(name)
+            continue
+        plans[name] = split_output_gain(stages)
+        keys[name] = (stem_keys[name], min_len, sr, repr(plans[name][0]))
+
+    cached = {name: render_cache.get(keys[name]) for name in plans}
+    groups: dict[float, list[str]] = {}
+    for name, (stages, _) in plans.items():
+        if cached[name] is None and stages and stages[0][0] == "reverb":
+            groups.setdefault(stages[0][1], []).append(name)
+
+    sources = {}
+    for reverberance, names in groups.items():
+        trimmed = [stem_arrays[name][:, :min_len] for name in names]
+        batch = _pool.submit(_timed_reverb_batch, trimmed, sr, reverberance)
+        for index, name in enumerate(names):
+            def source(batch=batch, index=index, name=name):
+                outputs, elapsed = batch.result()
+                stats["timings"][name]["reverb"] = elapsed
+                return outputs[index], plans[name][0][1:]
+            sources[name] = source
+
+    futures = {}
+    for name, (stages, _) in plans.items():
+        if cached[name] is not None:
+            stats["cached"].append(name)
+            continue
+        stats["rendered"].append(name)
+        stats["timings"][name] = {}
+        source = sources.get(name, lambda name=name: (stem_arrays[name][:, :min_len], plans[name][0]))
+        futures[name] = _pool.submit(_render_planned, source, sr, keys[name], stats["timings"][name])
+
+    for name, (_, gain) in plans.items():
+        audio = cached[name] if name not in futures else futures[name].result()
+        yield audio if gain == 1.0 else apply_gain(audio, gain)
+
+
+def render_remix(stem_arrays: dict[str, np.ndarray], instructions: dict, sr: int,
+                 stem_keys: Optional[dict[str, str]] = None,
+                 stats: Optional[dict] = None) -> np.ndarray:
+    """
+    Render every stem with its effect chain, sum them and run the bus limiter.
+
+    Each stem is rendered from its `plan_stem` plan, and cached per (stem content,
+    stages): a re-render only recomputes the stems whose plan changed, and a volume
+    change on a stem without compression is just a new mix-down. Stems are rendered
+    in parallel and summed in a fixed order, so the mix does not depend on scheduling.
+
+    Args:
+        stem_arrays: float arrays with shape (channels, samples), by stem name
+        instructions: Remix instructions as produced by the interpreter
+        sr: Sample rate in Hz
+        stem_keys: Content keys of the stems, hashed from `stem_arrays` when not given
+        stats: If given, filled with the stem names taken from the cache ("cached"),
+            the ones rendered ("rendered") and the muted ones ("muted"), and with
+            "timings": seconds per stage kind for each rendered stem, plus the wall
+            time of the stem rendering and mix-down ("stems"), of the global reverb
+            and of the limiter
+
+    Returns:
+        The limited float32 mix with shape (channels, samples)
+    """
+    if stem_keys is None:
+        stem_keys = {name: content_hash(array) for name, array in stem_arrays.items()}
+    if stats is None:
+        stats = {}
+    stats["cached"], stats["rendered"], stats["muted"], stats["timings"] = [], [], [], {}
+    if all(plan_stem(name, instructions) is None for name in stem_arrays):
+        channels = max(arr.shape[0] for arr in stem_arrays.values())
+        return np.zeros((channels, min(arr.shape[1] for arr in stem_arrays.values())), dtype=np.float32)
+
+    timings = stats["timings"]
+    begin = time.perf_counter()
+    mix = mix_stems(_render_stems(stem_arrays, instructions, sr, stem_keys, stats))
+    timings["stems"] = time.perf_counter() - begin
+
+    global_reverb = instructions.get("global_reverb", 0.0)
+    if global_reverb > 0:
+        begin = time.perf_counter()
+        mix = apply_reverb(mix, sr, reverberance=global_reverb)
+        timings["global_reverb"] = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    mix = limit(mix, sr, ceiling_db=HEADROOM_DB)
+    timings["limiter"] = time.perf_counter() - begin
+    return mix
+
+
+def export_wav(path: str, mix: np.ndarray, sr: int) -> str:
+    """Encode the final float mix once, as 16-bit PCM WAV."""
+    sf.write(path, np.clip(mix, -1.0, 1.0).T, sr, subtype="PCM_16")
+    return path
@@ -0,0 +1,114 @@
+import json
+import os
+import re
+import uuid
+from typing import Optional
+import numpy as np
+from audio_utils.artifacts import artifacts
+
+# Waveform overviews of stems and remixes, one directory per waveform
+PEAKS_DIR = os.path.join("separated", "peaks")
+# Zoom levels, in samples per peak. Each level is computed from the one before it
+PEAK_LEVELS = (256, 1024, 4096, 16384)
+# Peaks are stored as 8-bit integers, plenty for drawing
+PEAK_SCALE = 127
+
+_PEAKS_ID = re.compile(r"[A-Za-z0-9_\-]+")
+
+
+def peak_pyramid(array: np.ndarray, levels: tuple[int, ...] = PEAK_LEVELS) -> dict[int, tuple[np.ndarray, np.ndarray]]:
+    """
+    Minimum and maximum of every `level` consecutive samples of a (channels, samples)
+    array, over all channels, for each zoom level. A trailing partial span gets a peak
+    of its own.
+
+    Returns:
+        (minimums, maximums) float32 arrays by samples per peak
+    """
+    array = np.asarray(array, dtype=np.float32)
+    if array.ndim == 1:
+        array = array[None]
+    if array.shape[-1] == 0:
+        empty = np.zeros(0, dtype=np.float32)
+        return {level: (empty, empty) for level in levels}
+    pyramid = {}
+    lows, highs, step = array.min(axis=0), array.max(axis=0), 1
+    for level in sorted(levels):
+        factor = level // step
+        if level % step:
+            raise ValueError(f"Peak level {level} is not a multiple of {step}")
+        count = -(-len(lows) // factor)
+        # Edge padding repeats the last value, which never changes a minimum or maximum
+        lows = np.pad(lows, (0, count * factor - len(lows)), mode="edge").reshape(count, factor).min(axis=1)
+        highs = np.pad(highs, (0, count * factor - len(highs)), mode="edge").reshape(count, factor).max(axis=1)
+        pyramid[level] = (lows, highs)
+        step = level
+    return pyramid
+
+
+def _quantize(values: np.ndarray) -> list[int]:
+    return (np.clip(values, -1.0, 1.0) * PEAK_SCALE).round().astype(np.int8).tolist()
+
+
+def peaks_dir(peaks_id: str) -> str:
+    if not _PEAKS_ID.fullmatch(peaks_id):
+        raise ValueError(f"Invalid waveform id: {peaks_id}")
+    return os.path.join(PEAKS_DIR, peaks_id)
+
+
+def has_peaks(peaks_id: str) -> bool:
+    return os.path.exists(os.path.join(peaks_dir(peaks_id), "index.json"))
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def write_peaks(peaks_id: str, array: np.ndarray, sr: int, session_id: Optional[str] = None) -> str:
+    """
+    Store the peak pyramid of a stem or remix under `peaks_id`: an index with the length
+    and levels, and one file per level with interleaved min/max pairs scaled to 8 bits.
+
+    Returns:
+        The directory of the waveform
+    """
+    directory = peaks_dir(peaks_id)
+    os.makedirs(directory, exist_ok=True)
+    length = int(np.shape(array)[-1])
+    for level, (lows, highs) in peak_pyramid(array).items():
+        data = np.empty(2 * len(lows), dtype=np.float32)
+        data[0::2], data[1::2] = lows, highs
+        path = os.path.join(directory, f"{level}.json")
+        _write_json(path, {"sample_rate": sr, "samples_per_peak": level, "length": length,
+                           "bits": 8, "data": _quantize(data)})
+        artifacts.track(path, session_id)
+    # The index goes last, a waveform is only served once all its levels are there
+    index_path = os.path.join(directory, "index.json")
+    _write_json(index_path, {"sample_rate": sr, "length": length, "levels": list(PEAK_LEVELS)})
+    artifacts.track(index_path, session_id)
+    return directory
+
+
+def pick_level(length: int, width: int, levels: tuple[int, ...] = PEAK_LEVELS) -> int:
+    """Coarsest level giving at least `width` peaks over `length` samples, else the finest."""
+    for level in sorted(levels, reverse=True):
+        if -(-length // level) >= width:
+            return level
+    return min(levels)
+
+
+def peaks_file(peaks_id: str, width: int) -> str:
+    """Path of the level of a stored waveform best suited to drawing it `width` pixels wide."""
+    directory = peaks_dir(peaks_id)
+    try:
+        with open(os.path.join(directory, "index.json")) as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No waveform {peaks_id}")
+    path = os.path.join(directory, f"{pick_level(index['length'], width, tuple(index['levels']))}.json")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No waveform {peaks_id}")
+    return path
@@ -0,0 +1,93 @@
+import os
+from typing import Optional
+import numpy as np
+import librosa
+from audio_utils.cache import ArrayCache, content_hash
+
+N_FFT = 2048
+HOP_LENGTH = N_FFT // 4
+
+# STFT analyses (magnitudes and phases) are ~5x the stem size, the default holds the
+# analysis of one 5-minute stem
+PITCH_ANALYSIS_CACHE_BYTES = int(os.getenv("PITCH_ANALYSIS_CACHE_BYTES", 640 << 20))
+analysis_cache = ArrayCache(max_bytes=PITCH_ANALYSIS_CACHE_BYTES)
+# Pitch-shifted stems, keyed by (content hash, semitones), about 100 MB per 5-minute stem
+PITCH_RESULT_CACHE_BYTES = int(os.getenv("PITCH_RESULT_CACHE_BYTES", 256 << 20))
+result_cache = ArrayCache(max_bytes=PITCH_RESULT_CACHE_BYTES)
+
+
+def _polar(stft: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Magnitudes, phases and mid channel phases, padded with two silent frames
+    padded = np.pad(stft, [(0, 0), (0, 0), (0, 2)])
+    return (np.abs(padded).astype(np.float32), np.angle(padded).astype(np.float32),
+            np.angle(padded.sum(axis=0)).astype(np.float32))
+
+
+def _analysis(array: np.ndarray, key: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    analysis = analysis_cache.get(key)
+    if analysis is None:
+        stft = librosa.stft(array, n_fft=N_FFT, hop_length=HOP_LENGTH)
+        analysis = analysis_cache.put(key, _polar(stft))
+    return analysis
+
+
+def _stretch(analysis: tuple[np.ndarray, np.ndarray, np.ndarray], rate: float,
+             hop_length: int) -> np.ndarray:
+    magnitude, phase, mid_phase = analysis
+    n_fft = 2 * (magnitude.shape[-2] - 1)
+    time_steps = np.arange(0, magnitude.shape[-1] - 2, rate)
+    phi_advance = 2 * np.pi * hop_length * np.arange(magnitude.shape[-2]) / n_fft
+
+    index = time_steps.astype(int)
+    alpha = (time_steps - index).astype(np.float32)
+    out_magnitude = (1 - alpha) * magnitude[..., index] + alpha * magnitude[..., index + 1]
+
+    delta = mid_phase[:, index + 1] - mid_phase[:, index] - phi_advance[:, None]
+    delta -= 2 * np.pi * np.round(delta / (2 * np.pi))
+    increments = phi_advance[:, None] + delta
+    # Exclusive cumulative sum: the first output frame uses the phase of the first input frame.
+    # Accumulated in float64 and wrapped, the sum grows by up to pi * hop_length per frame
+    accumulated = np.mod(mid_phase[:, :1] + np.cumsum(increments, axis=-1) - increments, 2 * np.pi)
+    out_phase = accumulated.astype(np.float32) + (phase[..., index] - mid_phase[:, index])
+
+    out = np.empty(out_magnitude.shape, dtype=np.complex64)
+    out.real = out_magnitude * np.cos(out_phase)
+    out.imag = out_magnitude * np.sin(out_phase)
+    return out
+
+
+def phase_vocoder(stft: np.ndarray, rate: float, hop_length: int = HOP_LENGTH) -> np.ndarray:
+    """
+    Time-stretch a (channels, freqs, frames) STFT by `rate`.
+
+    Phases are accumulated on the mid (sum) channel and every channel keeps its phase
+    offset to the mid at each frame, so inter-channel phase differences, and with them
+    the stereo image, survive the stretch.
+    """
+    return _stretch(_polar(stft), rate, hop_length)
+
+
+def pitch_shift(array: np.ndarray, sr: int, n_steps: float, key: Optional[str] = None) -> np.ndarray:
+    """
+    Stereo-preserving pitch shift of a (channels, samples) float array by `n_steps` semitones,
+    as a phase vocoder time-stretch followed by resampling.
+
+    The STFT analysis of the input is cached by content, and so is the result per
+    (content, semitones): moving the same stem to another pitch skips the analysis,
+    and coming back to an earlier value is free. `key` can be passed when the content
+    hash of `array` is already known.
+    """
+    if n_steps == 0:
+        return array
+    key = key or content_hash(array)
+    cached = result_cache.get((key, float(n_steps)))
+    if cached is not None:
+        return cached
+
+    length = array.shape[-1]
+    rate = 2.0 ** (-n_steps / 12)
+    stretched = _stretch(_analysis(array, key), rate, HOP_LENGTH)
+    y = librosa.istft(stretched, hop_length=HOP_LENGTH, n_fft=N_FFT, length=int(round(length / rate)))
+    y = librosa.resample(y, orig_sr=float(sr) / rate, target_sr=sr)
+    y = librosa.util.fix_length(y, size=length, axis=-1).astype(np.float32)
+    return result_cache.put((key, float(n_steps)), y)
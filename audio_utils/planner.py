@@ -0,0 +1,141 @@
+import time
+from typing import Optional
+import numpy as np
+from audio_utils.filters import DEFAULT_Q, biquad_coefficients, filter_sos, apply_sos
+from audio_utils.reverb import apply_reverb_batch
+from audio_utils.dynamics import compress
+from audio_utils.pitch import pitch_shift
+
+# Compression presets exposed to the LLM: level -> (threshold dB, ratio)
+COMPRESSION_PRESETS = {
+    "low": (-30, 2),
+    "medium": (-20, 4),
+    "high": (-10, 8),
+}
+
+# Rough relative cost of each stage kind per sample, used to order commuting stages
+STAGE_COSTS = {"gain": 1, "sos": 4, "compress": 8, "reverb": 40, "pitch": 100}
+
+# Linear time-invariant stages commute with each other
+_LTI = ("gain", "sos", "reverb")
+
+
+def _sections(name: str, instructions: dict) -> list[tuple]:
+    # Biquads of the EQ then the filter of a stem, as (type, frequency, q, gain_db)
+    sections = []
+    eq = (instructions.get("eq") or {}).get(name) or {}
+    if all(k in eq for k in ("frequency", "width", "gain_db")) and eq["gain_db"] != 0:
+        sections.append(("peaking", float(eq["frequency"]), float(eq["width"]), float(eq["gain_db"])))
+
+    f = (instructions.get("filter") or {}).get(name) or {}
+    if f.get("type") in ("lowpass", "highpass") and "cutoff" in f:
+        sections.append((f["type"], float(f["cutoff"]), DEFAULT_Q, 0.0))
+    elif f.get("type") == "bandpass" and "low_cutoff" in f and "high_cutoff" in f:
+        sections.append(("highpass", float(f["low_cutoff"]), DEFAULT_Q, 0.0))
+        sections.append(("lowpass", float(f["high_cutoff"]), DEFAULT_Q, 0.0))
+    return sections
+
+
+def _order_by_cost(stages: list[tuple]) -> list[tuple]:
+    # Within each run of commuting (LTI) stages the most expensive goes first, so it
+    # sees the unprocessed stem: reverb can then be batched across stems and cached
+    # results keyed by stem content stay valid when a cheaper stage changes
+    ordered, run = [], []
+    for stage in stages + [None]:
+        if stage is not None and stage[0] in _LTI:
+            run.append(stage)
+            continue
+        ordered += sorted(run, key=lambda s: -STAGE_COSTS[s[0]])
+        run = []
+        if stage is not None:
+            ordered.append(stage)
+    return ordered
+
+
+def plan_stem(name: str, instructions: dict) -> Optional[list[tuple]]:
+    """
+    Compile the remix instructions of one stem into a minimal list of stages.
+
+    Identity effects (zero reverb, zero pitch shift, 0 dB EQ, unknown presets) are
+    dropped, the EQ and filter biquads are fused into one cascade and the volume is
+    moved past every linear stage: it is folded into the cascade in front of a
+    compressor, and otherwise left as a trailing ("gain", volume) stage that the mixer
+    applies at mix-down. The output matches the fixed chain gain, reverb, pitch shift,
+    EQ, filter, compression.
+
+    Stages are tuples of plain values, so a plan can be used as a cache key:
+    ("gain", volume), ("reverb", reverberance), ("pitch", semitones),
+    ("sos", sections, gain) and ("compress", threshold, ratio).
+
+    Returns:
+        The stages in processing order, or None when the stem is muted
+    """
+    volume = float((instructions.get("volumes") or {}).get(name, 1.0))
+    if volume == 0:
+        return None
+
+    stages = []
+    reverberance = (instructions.get("reverb") or {}).get(name, 0) or 0.0
+    if reverberance > 0:
+        stages.append(("reverb", float(reverberance)))
+    n_steps = (instructions.get("pitch_shift") or {}).get(name, 0) or 0
+    if n_steps != 0:
+        stages.append(("pitch", float(n_steps)))
+    sections = _sections(name, instructions)
+    if sections:
+        stages.append(("sos", tuple(sections), 1.0))
+    stages = _order_by_cost(stages)
+
+    preset = (instructions.get("compression") or {}).get(name)
+    if preset not in COMPRESSION_PRESETS:
+        return stages + [("gain", volume)] if volume != 1.0 else stages
+
+    if volume != 1.0:
+        if stages and stages[-1][0] == "sos":
+            stages[-1] = ("sos", stages[-1][1], volume)
+        else:
+            stages.append(("gain", volume))
+    return stages + [("compress", *COMPRESSION_PRESETS[preset])]
+
+
+def split_output_gain(stages: list[tuple]) -> tuple[list[tuple], float]:
+    """Split a plan into its processing stages and the gain left for the mix-down."""
+    if stages and stages[-1][0] == "gain":
+        return stages[:-1], stages[-1][1]
+    return stages, 1.0
+
+
+def stage_sos(stage: tuple, sr: int) -> np.ndarray:
+    """Coefficients of a ("sos", sections, gain) stage, with the gain folded into the first biquad."""
+    _, sections, gain = stage
+    sos = filter_sos(*(biquad_coefficients(t, f, q, g, sr) for t, f, q, g in sections))
+    if gain != 1.0:
+        sos = sos.copy()
+        sos[0, :3] *= gain
+    return sos
+
+
+def run_stages(audio: np.ndarray, stages: list[tuple], sr: int,
+               timings: Optional[dict] = None) -> np.ndarray:
+    """
+    Run the stages of a plan on a float array with shape (channels, samples).
+    If `timings` is given, the seconds spent in each stage kind are added to it.
+    """
+    for stage in stages:
+        kind = stage[0]
+        begin = time.perf_counter()
+        if kind == "gain":
+            audio = (audio * np.float32(stage[1])).astype(np.float32, copy=False)
+        elif kind == "reverb":
+            audio = apply_reverb_batch([audio], sr, stage[1])[0]
+        elif kind == "pitch":
+            audio = pitch_shift(audio, sr, stage[1])
+        elif kind == "sos":
+            audio = apply_sos(audio, stage_sos(stage, sr))
+        elif kind == "compress":
+            audio = compress(audio, sr, threshold=stage[1], ratio=stage[2])
+        else:
+            raise ValueError(f"Unknown stage: {kind}")
+        if timings is not None:
+            timings[kind] = timings.get(kind, 0.0) + time.perf_counter() - begin
+    return audio
@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+import numpy as np
+from audio_utils.cache import content_hash
+from audio_utils.mixer import render_remix
+
+# Length (s) of the excerpt rendered for a quick preview
+PREVIEW_SECONDS = 20.0
+# Extra audio (s) rendered before the excerpt and dropped, so reverb tails and the
+# compressor and limiter gains coming into the excerpt match the full render
+PREROLL_SECONDS = 2.0
+# Resolution (s) of the loudness scan used to place the excerpt
+SCAN_SECONDS = 0.5
+
+# Full-length renders running after their preview was returned, by output name
+render_jobs: "OrderedDict[str, Future]" = OrderedDict()
+MAX_RENDER_JOBS = 256
+_render_jobs_lock = threading.Lock()
+# Full renders are started one at a time, each one fans out on the mixer's stem pool
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="full-render")
+
+
+def loudest_window(stem_arrays: dict[str, np.ndarray], sr: int,
+                   duration: float = PREVIEW_SECONDS) -> tuple[int, int]:
+    """
+    Find the `duration` long section of the track with the most energy, scanning the
+    sum of the stems. The window only depends on the stems, so successive previews of
+    the same track cover the same section.
+
+    Returns:
+        Start and end of the section, in samples
+    """
+    length = min(arr.shape[1] for arr in stem_arrays.values())
+    window = min(int(duration * sr), length)
+    hop = max(1, int(SCAN_SECONDS * sr))
+    blocks = length // hop
+    if window >= length or blocks == 0:
+        return 0, length
+
+    energy = np.zeros(blocks, dtype=np.float64)
+    for array in stem_arrays.values():
+        mono = array[:, :blocks * hop].mean(axis=0, dtype=np.float32)
+        energy += np.square(mono.reshape(blocks, hop), dtype=np.float32).sum(axis=1)
+    mix_energy = np.concatenate([[0.0], np.cumsum(energy)])
+    width = max(1, window // hop)
+    best = int(np.argmax(mix_energy[width:] - mix_energy[:-width]))
+    start = min(best * hop, length - window)
+    return start, start + window
+
+
+def render_preview(stem_arrays: dict[str, np.ndarray], instructions: dict, sr: int,
+                   duration: float = PREVIEW_SECONDS,
+                   stem_keys: Optional[dict[str, str]] = None,
+                   stats: Optional[dict] = None) -> tuple[np.ndarray, int]:
+    """
+    Render the remix of the loudest `duration` seconds of the track only.
+
+    The excerpt is rendered with `PREROLL_SECONDS` of lead-in that is then dropped.
+    Rendered excerpts are cached in the mixer's render cache under their own keys (the
+    stem keys and the excerpt bounds), so the preview of a feedback turn only re-renders
+    the stems whose effect chain changed. They do not serve the full render, which
+    renders every stem it has not cached at full length itself; both read the same
+    separated stems and impulse responses.
+
+    Returns:
+        The limited float32 excerpt with shape (channels, samples), and its start in samples
+    """
+    start, end = loudest_window(stem_arrays, sr, duration)
+    render_start = max(0, start - int(PREROLL_SECONDS * sr))
+    if stem_keys is None:
+        stem_keys = {name: content_hash(array) for name, array in stem_arrays.items()}
+    excerpt = {name: array[:, render_start:end] for name, array in stem_arrays.items()}
+    keys = {name: f"{stem_keys[name]}@{render_start}:{end}" for name in stem_arrays}
+    mix = render_remix(excerpt, instructions, sr, stem_keys=keys, stats=stats)
+    return mix[:, start - render_start:], start
+
+
+def submit_render(name: str, render: Callable[[], object]) -> Future:
+    """Run a full-length render in the background, tracked in `render_jobs` under `name`."""
+    future = _background.submit(render)
+    with _render_jobs_lock:
+        render_jobs[name] = future
+        # Running renders stay, their status is still polled
+        finished = [old_name for old_name, job in render_jobs.items() if job.done()]
+        for old_name in finished[:max(0, len(render_jobs) - MAX_RENDER_JOBS)]:
+            del render_jobs[old_name]
+    return future
+
+
+def render_status(name: str) -> Optional[dict]:
+    """State of a background render: None if unknown, else whether it is done and any error."""
+    with _render_jobs_lock:
+        future = render_jobs.get(name)
+    if future is None:
+        return None
+    if not future.done():
+        return {"ready": False}
+    error = future.exception()
+    if error is not None:
+        return {"ready": False, "error": str(error)}
+    return {"ready": True}
@@ -1,119 +1,125 @@
-import soundfile as sf
 import numpy as np
 import uuid
 from api.helpers.session_state import session_active_task
-from audio_utils.separator import separate_audio
+from audio_utils.separator import load_stems
 from llm_backend.session_manager import get_file_from_db # session_active_task, session_last_instructions
-import librosa
-from pydub import AudioSegment
 import os
-import tempfile
-from audio_utils.helpers import numpy_array_to_audiosegment
-from api.helpers.session_state import session_last_instructions, session_active_task
-
-def handle_remix(intent: dict, session_id: str) -> dict:
+from typing import Optional
+from audio_utils.mixer import render_remix
+from audio_utils.codecs import (
+    OUTPUT_FORMAT, extension, submit_encode, submit_audition, audition_name, sources,
+)
+from audio_utils.preview import PREVIEW_SECONDS, render_preview, submit_render
+from audio_utils.activity import stem_activity, mute_inaudible
+from audio_utils.artifacts import artifacts
+from audio_utils.peaks import write_peaks
+from api.helpers.session_state import session_last_instructions
+
+def _audition_path(path: str) -> Optional[str]:
+    name = audition_name(os.path.basename(path))
+    return None if name is None else os.path.join(os.path.dirname(path), name)
+
+
+def _audition_url(name: str) -> Optional[str]:
+    audition = audition_name(name)
+    return None if audition is None else f"/downloads/{audition}"
+
+
+def _render_full(stem_arrays: dict, instructions: dict, sr: int, stem_keys: dict, output_path: str,
+                 session_id: str) -> dict:
+    render_stats = {}
+    final_mix = render_remix(stem_arrays, instructions, sr, stem_keys=stem_keys, stats=render_stats)
+    print(f"DEBUG - Stems from render cache: {render_stats['cached']}, rendered: {render_stats['rendered']}")
+    print(f"DEBUG - Render timings (s): {render_stats['timings']}")
+    print(f"DEBUG - Exporting final mix to: {output_path}")
+    # The listening encode is made next to the full quality file, on the encoder pool
+    audition = submit_audition(_audition_path(output_path), final_mix, sr)
+    render_stats["encode"] = submit_encode(output_path, final_mix, sr).result()
+    artifacts.track(output_path, session_id)
+    if audition is not None:
+        render_stats["audition_encode"] = audition.result()
+        artifacts.track(render_stats["audition_encode"]["path"], session_id)
+    # Waveform overview for the UI, under the name of the remix without its extension
+    write_peaks(os.path.splitext(os.path.basename(output_path))[0], final_mix, sr, session_id)
+    print(f"DEBUG - Export completed. Final mix duration: {final_mix.shape[1] / sr:.2f}s, "
+          f"encode: {render_stats['encode']}")
+    return render_stats
+
+
+def handle_remix(intent: dict, session_id: str, preview: bool = True) -> dict:
     """
     Per-stem remix processing with support for both per-stem and global effects.
+
+    With `preview`, tracks longer than twice PREVIEW_SECONDS are answered with a
+    render of their loudest section: the full-length render then runs in the
+    background and its progress is exposed at the returned "status_url".
     """
     audio_path = get_file_from_db(session_id)
     if not audio_path:
         return {"reply": "No audio file found for remixing."}
 
-    all_stems = ["vocals", "drums", "bass", "other"]
-    outputs = separate_audio(audio_path, all_stems)
-
-    stem_arrays = {}
+    # Stems are cached by file content, feedback turns on the same upload skip the model
+    file_key, stem_arrays = load_stems(audio_path)
+    stem_keys = {name: f"{file_key}:{name}" for name in stem_arrays}
     sr = 44100
 
-    # Convert tensors to numpy arrays and ensure stereo
-    for name in all_stems:
-        tensor = outputs[name]
-        if tensor.ndim == 3:
-            tensor = tensor[0]   # shape [1, 2, N] → [2, N]
-        array = tensor.numpy()
-        if array.shape[0] == 1:  # mono to stereo
-            array = np.repeat(array, 2, axis=0)
-        stem_arrays[name] = array
-
     instructions = intent.get("instructions", {})
-    volumes = instructions.get("volumes") or {}
-    eq_instr = instructions.get("eq", {})
-    filter_instr = instructions.get("filter", {})
-    pitch_instr = instructions.get("pitch_shift", {})
-    comp_instr = instructions.get("compression", {})
-    reverb_instr = instructions.get("reverb", {})
-    global_reverb = instructions.get("global_reverb", 0.0)
-
-    min_len = min(arr.shape[1] for arr in stem_arrays.values())
-    processed_segments = []
-
-    # Process each stem individually with its effects
-    for name, array in stem_arrays.items():
-        array = array[:, :min_len]
-        volume = volumes.get(name, 1.0)
-        print(f"DEBUG - Processing {name}: volume={volume}")
-
-        scaled = np.clip(array * volume, -1.0, 1.0)
-        audio = numpy_array_to_audiosegment(scaled, sr)
-
-        if name in reverb_instr and reverb_instr[name] > 0:
-            audio = apply_reverb_pydub(audio, reverberance=reverb_instr[name])
-
-        if name in pitch_instr:
-            audio = change_pitch_pydub(audio, n_steps=pitch_instr[name])
-
-        if name in eq_instr:
-            eq = eq_instr[name]
-            if all(k in eq for k in ("frequency", "width", "gain_db")):
-                audio = apply_eq_pydub(audio, frequency=eq["frequency"], width=eq["width"], gain_db=eq["gain_db"])
-
-        if name in filter_instr:
-            f = filter_instr[name]
-            if f["type"] == "lowpass" and "cutoff" in f:
-                audio = apply_filter(audio, "lowpass", cutoff=f["cutoff"])
-            elif f["type"] == "highpass" and "cutoff" in f:
-                audio = apply_filter(audio, "highpass", cutoff=f["cutoff"])
-            elif f["type"] == "bandpass" and "low_cutoff" in f and "high_cutoff" in f:
-                audio = apply_filter(audio, "highpass", cutoff=f["low_cutoff"])
-                audio = apply_filter(audio, "lowpass", cutoff=f["high_cutoff"])
-
-        if name in comp_instr:
-            level = comp_instr[name]
-            if level == "low":
-                audio = apply_compression_pydub(audio, threshold=-30, ratio=2)
-            elif level == "medium":
-                audio = apply_compression_pydub(audio, threshold=-20, ratio=4)
-            elif level == "high":
-                audio = apply_compression_pydub(audio, threshold=-10, ratio=8)
-
-        processed_segments.append(audio)
-        print(f"DEBUG - Added {name} to processed segments (duration: {len(audio)}ms)")
-
-    if not processed_segments:
-        return {"reply": "No stems were processed for remixing."}
-
-    print(f"DEBUG - Mixing {len(processed_segments)} processed segments")
-    final_mix = processed_segments[0]
-    for i, seg in enumerate(processed_segments[1:], 1):
-        print(f"DEBUG - Overlaying segment {i+1}")
-        final_mix = final_mix.overlay(seg)
-
-    if global_reverb > 0:
-        print(f"DEBUG - Applying global reverb: {global_reverb}")
-        final_mix = apply_reverb_pydub(final_mix, reverberance=global_reverb)
-
-    output_name = generate_remix_name(intent)
+    # Stems that are inaudible throughout are dropped by the planner, like muted ones
+    levels = {name: stem_activity(file_key, name, array, sr) for name, array in stem_arrays.items()}
+    render_instructions = mute_inaudible(instructions, levels)
+    output_name = f"{os.path.splitext(generate_remix_name(intent))[0]}.{extension(OUTPUT_FORMAT)}"
     output_path = f"separated/{output_name}"
-    print(f"DEBUG - Exporting final mix to: {output_path}")
-    final_mix.export(output_path, format="wav")
-    print(f"DEBUG - Export completed. Final mix duration: {len(final_mix)}ms")
+    length = min(arr.shape[1] for arr in stem_arrays.values())
+
+    # The whole chain runs on float32 arrays, the mix is only encoded once at the end
+    # Only stems whose effect chain changed since an earlier render are processed again
+    if preview and length > 2 * PREVIEW_SECONDS * sr:
+        render_stats = {}
+        preview_mix, start = render_preview(stem_arrays, render_instructions, sr, stem_keys=stem_keys,
+                                            stats=render_stats)
+        stem, ext = os.path.splitext(output_name)
+        preview_name = f"{stem}_preview{ext}"
+        # The preview is encoded on the encoder pool while the full render gets started
+        preview_encode = submit_encode(f"separated/{preview_name}", preview_mix, sr)
+        preview_audition = submit_audition(_audition_path(f"separated/{preview_name}"), preview_mix, sr)
+        submit_render(output_name, lambda: _render_full(stem_arrays, render_instructions, sr, stem_keys,
+                                                        output_path, session_id))
+        render_stats["encode"] = preview_encode.result()
+        artifacts.track(f"separated/{preview_name}", session_id)
+        if preview_audition is not None:
+            render_stats["audition_encode"] = preview_audition.result()
+            artifacts.track(render_stats["audition_encode"]["path"], session_id)
+        write_peaks(os.path.splitext(preview_name)[0], preview_mix, sr, session_id)
+        print(f"DEBUG - Preview of {preview_mix.shape[1] / sr:.2f}s at {start / sr:.2f}s exported to: {preview_name}")
+        remix = {
+            "audition_url": _audition_url(preview_name),
+            "file_url": f"/downloads/{preview_name}",
+            "sources": sources(_audition_url(preview_name), f"/downloads/{preview_name}"),
+            "peaks_url": f"/peaks/{os.path.splitext(preview_name)[0]}",
+            "preview": True,
+            "preview_start": start / sr,
+            "full_url": f"/downloads/{output_name}",
+            "status_url": f"/remix/status/{output_name}",
+            "stream_url": f"/remix/stream/{session_id}",
+            "render": render_stats,
+        }
+    else:
+        render_stats = _render_full(stem_arrays, render_instructions, sr, stem_keys, output_path, session_id)
+        remix = {
+            "audition_url": _audition_url(output_name),
+            "file_url": f"/downloads/{output_name}",
+            "sources": sources(_audition_url(output_name), f"/downloads/{output_name}"),
+            "stream_url": f"/remix/stream/{session_id}",
+            "peaks_url": f"/peaks/{os.path.splitext(output_name)[0]}",
+            "render": render_stats,
+        }
 
     session_active_task[session_id] = "remix"
     session_last_instructions[session_id] = instructions
 
     return {
-        "reply": f"Remix is created based on instructions.",
-        "remix": {"file_url": f"/downloads/{output_name}"}
+        "reply": "Remix is created based on instructions.",
+        "remix": remix
     }
 
 def apply_gain_scaling(stem_arrays, volumes, min_len):
@@ -123,89 +129,6 @@ def apply_gain_scaling(stem_arrays, volumes, min_len):
         adjusted_stems.append(scaled)
     return adjusted_stems
 
-def apply_reverb_pydub(audio: AudioSegment, reverberance: float = 50.0):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_input:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_output:
-            try:
-                audio.export(temp_input.name, format="wav")
-
-                reverb_level = max(0.0, min(reverberance, 1.0))  # Clamp to 0-1
-                delay_ms = int(reverb_level * 100 + 50)  # 50-150ms delay
-                decay = reverb_level * 0.6  # 0-0.6 decay
-
-                print(f"DEBUG - Applying reverb: level={reverb_level}, delay={delay_ms}ms, decay={decay}")
-
-                from pydub.utils import which
-                ffmpeg_path = which("ffmpeg")
-
-                import subprocess
-                cmd = [
-                    ffmpeg_path, "-i", temp_input.name,
-                    "-af", f"aecho=0.8:0.9:{delay_ms}:{decay}",
-                    "-y", temp_output.name
-                ]
-
-                result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-                print(f"DEBUG - Reverb ffmpeg completed successfully")
-
-                return AudioSegment.from_wav(temp_output.name)
-
-            except subprocess.CalledProcessError as e:
-                print(f"ERROR - Reverb ffmpeg failed: {e.stderr}")
-                return audio  # Return original audio if reverb fails
-            finally:
-                for temp_file in [temp_input.name, temp_output.name]:
-                    if os.path.exists(temp_file):
-                        os.unlink(temp_file)
-
-def change_pitch_pydub(audio: AudioSegment, n_steps: float):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-        try:
-            audio.export(temp_file.name, format="wav")
-
-            y, sr = librosa.load(temp_file.name, sr=None)
-            y_shifted = librosa.effects.pitch_shift(y, sr=sr, n_steps=n_steps)
-
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_output:
-                sf.write(temp_output.name, y_shifted, sr)
-                return AudioSegment.from_wav(temp_output.name)
-
-        finally:
-            if os.path.exists(temp_file.name):
-                os.unlink(temp_file.name)
-            if 'temp_output' in locals() and os.path.exists(temp_output.name):
-                os.unlink(temp_output.name)
-
-
-def apply_compression_pydub(audio: AudioSegment, threshold: float = -20, ratio: float = 3,
-                            attack: float = 20, release: float = 250):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_input:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_output:
-            try:
-                audio.export(temp_input.name, format="wav")
-
-                from pydub.utils import which
-                ffmpeg_path = which("ffmpeg")
-
-                import subprocess
-                attack_sec = attack / 1000.0  # ms to seconds
-                release_sec = release / 1000.0
-
-                cmd = [
-                    ffmpeg_path, "-i", temp_input.name,
-                    "-af",
-                    f"compand=attacks={attack_sec}:decays={release_sec}:points={threshold}/{threshold}|0/{threshold - threshold / ratio}",
-                    "-y", temp_output.name
-                ]
-
-                subprocess.run(cmd, check=True, capture_output=True)
-                return AudioSegment.from_wav(temp_output.name)
-
-            finally:
-                for temp_file in [temp_input.name, temp_output.name]:
-                    if os.path.exists(temp_file):
-                        os.unlink(temp_file)
-
 def generate_remix_name(intent: dict) -> str:
     """
     Join descriptors with underscores
@@ -231,58 +154,3 @@ def generate_remix_name(intent: dict) -> str:
     type_str = "_".join(remix_type) if remix_type else "basic"
     output_name = f"remix_{type_str}_{uuid.uuid4().hex[:6]}.wav"
     return output_name
-
-def apply_eq_pydub(audio: AudioSegment, frequency: float, width: float, gain_db: float):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_input:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_output:
-            try:
-                audio.export(temp_input.name, format="wav")
-
-                from pydub.utils import which
-                ffmpeg_path = which("ffmpeg")
-                import subprocess
-
-                cmd = [
-                    ffmpeg_path, "-i", temp_input.name,
-                    "-af", f"equalizer=f={frequency}:t=q:w={width}:g={gain_db}",
-                    "-y", temp_output.name
-                ]
-
-                subprocess.run(cmd, check=True, capture_output=True)
-                return AudioSegment.from_wav(temp_output.name)
-
-            finally:
-                for temp_file in [temp_input.name, temp_output.name]:
-                    if os.path.exists(temp_file):
-                        os.unlink(temp_file)
-
-def apply_filter(audio: AudioSegment, filter_type="lowpass", cutoff=5000):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_input:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_output:
-            try:
-                audio.export(temp_input.name, format="wav")
-                from pydub.utils import which
-                ffmpeg_path = which("ffmpeg")
-
-                import subprocess
-
-                if filter_type == "lowpass":
-                    af = f"lowpass=f={cutoff}"
-                elif filter_type == "highpass":
-                    af = f"highpass=f={cutoff}"
-                else:
-                    raise ValueError("Unsupported filter type.")
-
-                cmd = [
-                    ffmpeg_path, "-i", temp_input.name,
-                    "-af", af,
-                    "-y", temp_output.name
-                ]
-
-                subprocess.run(cmd, check=True, capture_output=True)
-                return AudioSegment.from_wav(temp_output.name)
-
-            finally:
-                for temp_file in [temp_input.name, temp_output.name]:
-                    if os.path.exists(temp_file):
-                        os.unlink(temp_file)
@@ -1,12 +1,59 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+import numpy as np
 import torchaudio
+from audio_utils.cache import ArrayCache
+from audio_utils.stem_store import (
+    StemWriter, has_stems, load_stem, stem_path, save_range, find_range, merge_ranges, stitch_ranges,
+    save_fingerprint, load_fingerprint, has_fingerprint, stem_progress, written_range,
+)
+from audio_utils.fingerprint import (
+    FINGERPRINT_HOP, MIN_ALIGNMENT_SCORE, MIN_OVERLAP_SECONDS, align, envelope, find_alignment, reuse_sections,
+)
+from audio_utils.landmarks import landmark_index
+from audio_utils.artifacts import artifacts
 from demucs.demucs.pretrained import get_model
 from demucs.demucs.apply import (apply_model)
+from demucs.demucs.audio import AudioFile
 import torchaudio.transforms as T
 from pathlib import Path
 
-def separate_audio(filepath: str, selected_stems: list[str]):
-    model = get_model(name="mdx_extra_q")
+# Chunks of the mixture quieter than this (dBFS) are not run through the separation model
+SILENCE_THRESHOLD_DB = -70
+
+# Audio (s) separated on each side of a requested section, so the model hears what leads
+# into it and its edges can be crossfaded with neighbouring sections
+RANGE_MARGIN_SECONDS = 5.0
+SAMPLE_RATE = 44100
+# Shortest stretch (s) of an earlier upload worth reusing the stems of
+MIN_REUSE_SECONDS = 15.0
+# Earlier tracks, those sharing the most landmarks, a new mix is aligned against at most
+MAX_REUSE_CANDIDATES = int(os.getenv("MAX_REUSE_CANDIDATES", 3))
+
+# Separated stems (float32, 2 x samples each), keyed by the hash of the input file bytes
+# (see `content_key`)
+STEM_CACHE_BYTES = int(os.getenv("STEM_CACHE_BYTES", 2 << 30))
+stem_cache = ArrayCache(max_bytes=STEM_CACHE_BYTES)
+
+STEM_NAMES = ["vocals", "drums", "bass", "other"]
+# Order of the stems in the model output
+MODEL_SOURCES = ["drums", "bass", "other", "vocals"]
+
+# Separations running in the background, by file content key. A job only gives the key
+# back, its stems are read from `stem_cache` or the stem store
+separation_jobs: "OrderedDict[str, Future]" = OrderedDict()
+MAX_SEPARATION_JOBS = 64
+_jobs_lock = threading.Lock()
+# One separation at a time, the model already uses every core
+_separations = ThreadPoolExecutor(max_workers=1, thread_name_prefix="separation")
+
 
+def load_mix(filepath: str):
+    """Read a file as the stereo 44.1 kHz batch the model expects, shape [1, 2, time]."""
     try:
         torchaudio.set_audio_backend("sox_io")
     except RuntimeError:
@@ -32,23 +79,307 @@ def separate_audio(filepath: str, selected_stems: list[str]):
     if sr != 44100:
         resampler = T.Resample(orig_freq=sr, new_freq=44100)
         wav = resampler(wav)
+    return wav
 
 
+def _by_name(ready_callback: Callable[[int, dict[str, np.ndarray]], None]):
+    # apply_model passes ranges as [1, sources, channels, samples] tensors
+    def ready(offset, estimates):
+        ranges = estimates[0].numpy()
+        ready_callback(offset, {name: ranges[i] for i, name in enumerate(MODEL_SOURCES)})
+    return ready
+
+
+def separate_mix(wav, selected_stems: list[str],
+                 ready_callback: Optional[Callable[[int, dict[str, np.ndarray]], None]] = None):
+    """
+    Run the separation model on a [1, 2, time] mix.
+
+    With `ready_callback`, finished ranges of the stems are passed on as soon as the model
+    has covered them, as `(offset, {name: float32 (2, samples) array})`. The models of the
+    bag then share their chunks and random shifts, so that they progress together.
+    """
+    model = get_model(name="mdx_extra_q")
+
     if not selected_stems:
         raise ValueError("No valid stems found in prompt. Please specify vocals, drums, bass, or other.")
 
-    separated = apply_model(model, wav, device="cpu")  # Shape: [1, 4, 2, T]
+    on_ready = _by_name(ready_callback) if ready_callback is not None else None
+    separated = apply_model(model, wav, device="cpu",
+                            silence_threshold=SILENCE_THRESHOLD_DB,
+                            share_spec=on_ready is not None, ready_callback=on_ready)  # Shape: [1, 4, 2, T]
     print(f"Model output shape: {separated.shape}")
 
     # Remove batch dim: shape becomes [4, 2, T]
     separated = separated[0]
 
-    all_stems = ["drums", "bass", "other", "vocals"]
-
     filtered_stems = {
         stem_name: separated[i]
-        for i, stem_name in enumerate(all_stems)
+        for i, stem_name in enumerate(MODEL_SOURCES)
         if stem_name in selected_stems
     }
 
-    return filtered_stems
\ No newline at end of file
+    return filtered_stems
+
+
+def separate_audio(filepath: str, selected_stems: list[str]):
+    return separate_mix(load_mix(filepath), selected_stems)
+
+
+def file_hash(filepath: str) -> str:
+    """Hash of the bytes of a file, read in chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_key(filepath: str) -> str:
+    """Key of the stems of a file: its own hash, or that of an earlier upload of the same recording."""
+    return landmark_index.resolve(file_hash(filepath))
+
+
+def index_upload(filepath: str) -> str:
+    """
+    Look an upload up in the landmark index, so that another encoding of a recording
+    already uploaded (MP3, AAC, WAV of the same song) maps to its stems instead of being
+    separated again.
+
+    Returns:
+        The content key serving the upload
+    """
+    key = file_hash(filepath)
+    if key in landmark_index:
+        return landmark_index.resolve(key)
+    wav = load_mix(filepath)
+    resolved = landmark_index.match(key, wav[0].numpy(), SAMPLE_RATE)
+    if resolved != key:
+        print(f"Upload {filepath} is a re-encode of {resolved}, reusing its stems")
+    return resolved
+
+
+def _reuse_earlier_stems(key: str, wav) -> Optional[dict[str, np.ndarray]]:
+    """
+    Stems of a mix that shares material with a track separated before (a trimmed or
+    extended re-upload): the matching parts come from the earlier stems, only the rest
+    goes through the model, with RANGE_MARGIN_SECONDS of context, and the parts are
+    crossfaded together.
+    """
+    mix = wav[0].numpy()
+    fingerprint = envelope(mix)
+    min_overlap = int(MIN_OVERLAP_SECONDS * SAMPLE_RATE / FINGERPRINT_HOP)
+    if len(fingerprint) < min_overlap:
+        return None
+    # Only the earlier tracks sharing the most landmarks are aligned, their envelopes pick
+    # the closest one, only its mix is then read
+    best_key, best_score = None, MIN_ALIGNMENT_SCORE
+    for old_key in landmark_index.similar(key, mix, SAMPLE_RATE, MAX_REUSE_CANDIDATES):
+        if not has_fingerprint(old_key, STEM_NAMES):
+            continue
+        old_fingerprint = load_fingerprint(old_key)
+        if len(old_fingerprint) < min_overlap:
+            continue
+        _, score = align(fingerprint, old_fingerprint, min_overlap)
+        if score >= best_score:
+            best_key, best_score = old_key, score
+    if best_key is None:
+        return None
+
+    alignment = find_alignment(mix, load_stem(best_key, "mix"), SAMPLE_RATE, load_fingerprint(best_key))
+    if alignment is None:
+        return None
+    lag, regions = alignment
+    length = mix.shape[-1]
+    margin = int(RANGE_MARGIN_SECONDS * SAMPLE_RATE)
+    reused, novel = reuse_sections(length, regions, margin, int(MIN_REUSE_SECONDS * SAMPLE_RATE))
+    if not reused:
+        return None
+
+    sections = {name: [] for name in STEM_NAMES}
+    for name in STEM_NAMES:
+        old_stem = load_stem(best_key, name)
+        for window_start, start, end, window_end in reused:
+            sections[name].append((window_start, start, end, old_stem[:, window_start - lag:window_end - lag]))
+    for start, end in novel:
+        window_start, window_end = max(0, start - margin), min(length, end + margin)
+        outputs = separate_mix(wav[..., window_start:window_end], STEM_NAMES)
+        for name in STEM_NAMES:
+            sections[name].append((window_start, start, end, outputs[name].numpy()))
+    print(f"Reusing {sum(end - start for _, start, end, _ in reused) / SAMPLE_RATE:.1f}s of the stems of "
+          f"{best_key} (score {best_score:.3f}, offset {lag / SAMPLE_RATE:.3f}s), separating "
+          f"{sum(end - start for start, end in novel) / SAMPLE_RATE:.1f}s")
+    return {name: stitch_ranges(sections[name], length) for name in STEM_NAMES}
+
+
+def _separate_into(key: str, wav, writer: StemWriter) -> tuple[np.ndarray, ...]:
+    # Finished ranges go to the store as they come, to be played before the end. Every
+    # stem is stored, silent ones too: silence is only known once a stem is complete,
+    # remixes and later re-uploads read all four stems, and requests judge silence with
+    # their own threshold
+    try:
+        arrays = _reuse_earlier_stems(key, wav)
+        if arrays is not None:
+            writer.write(0, arrays)
+        else:
+            outputs = separate_mix(wav, STEM_NAMES, ready_callback=writer.write)
+            arrays = {name: outputs[name].numpy() for name in STEM_NAMES}
+    except BaseException:
+        writer.abort()
+        raise
+    stems = stem_cache.put(key, tuple(
+        np.ascontiguousarray(arrays[name], dtype=np.float32) for name in STEM_NAMES
+    ))
+    writer.finish()
+    # Later uploads of the same song are aligned against this mix
+    mix = wav[0].numpy()
+    save_fingerprint(key, mix, envelope(mix))
+    return stems
+
+
+def _separation_job(key: str, wav, writer: StemWriter) -> str:
+    _separate_into(key, wav, writer)
+    return key
+
+
+def _stored_stems(key: str) -> Optional[tuple[np.ndarray, ...]]:
+    stems = stem_cache.get(key)
+    if stems is None and has_stems(key, STEM_NAMES):
+        stems = stem_cache.put(key, tuple(load_stem(key, name) for name in STEM_NAMES))
+    return stems
+
+
+def _settle(claim: Future, job: Future) -> None:
+    if job.exception() is not None:
+        claim.set_exception(job.exception())
+    else:
+        claim.set_result(job.result())
+
+
+def _start_separation(filepath: str, key: str) -> Future:
+    """The separation job of a file, started unless one is running or its stems are stored."""
+    with _jobs_lock:
+        job = separation_jobs.get(key)
+        if not (job is None or (job.done() and (job.exception() is not None or not has_stems(key, STEM_NAMES)))):
+            return job
+        # The key is claimed before the mix is read, other files do not wait for the decode
+        claim = Future()
+        separation_jobs[key] = claim
+        # Running jobs stay, a request for their key would separate it a second time
+        finished = [old_key for old_key, old_job in separation_jobs.items() if old_job.done()]
+        for old_key in finished[:max(0, len(separation_jobs) - MAX_SEPARATION_JOBS)]:
+            del separation_jobs[old_key]
+    try:
+        # The mix is read right away so the stems can be played as soon as this returns
+        wav = load_mix(filepath)
+        writer = StemWriter(key, STEM_NAMES, wav.shape[1], wav.shape[-1])
+        job = _separations.submit(_separation_job, key, wav, writer)
+    except BaseException as error:
+        claim.set_exception(error)
+        raise
+    job.add_done_callback(lambda job: _settle(claim, job))
+    return claim
+
+
+def load_stems(filepath: str, key: Optional[str] = None) -> tuple[str, dict[str, np.ndarray]]:
+    """
+    Separate a file into its four stems, as read-only float32 arrays with shape (2, samples).
+    Stems are cached by file content, in memory and in the stem store on disk, so
+    remixing the same upload again skips the model. A separation of the same file
+    already running in the background is waited for.
+
+    Returns:
+        The content key of the file and the stems by name
+    """
+    key = key or content_key(filepath)
+    stems = _stored_stems(key)
+    if stems is None:
+        _start_separation(filepath, key).result()
+        stems = _stored_stems(key)
+        if stems is None:
+            raise FileNotFoundError(f"Stems of {key} were removed right after their separation")
+    # The upload and its stored stems count as used for the disk budget
+    for path in [filepath] + [stem_path(key, name) for name in STEM_NAMES]:
+        artifacts.touch(path)
+    return key, dict(zip(STEM_NAMES, stems))
+
+
+def submit_separation(filepath: str) -> tuple[str, Future]:
+    """
+    Start separating a file in the background, unless its stems are already available.
+    While it runs, the stem store serves the separated part of each stem (`live_stem`).
+
+    Returns:
+        The content key of the file and a future giving it back once the stems are stored,
+        for `load_stems`
+    """
+    key = content_key(filepath)
+    if stem_cache.get(key) is not None or has_stems(key, STEM_NAMES):
+        future = Future()
+        future.set_result(key)
+        return key, future
+    return key, _start_separation(filepath, key)
+
+
+def _section_bounds(start: float, end: float, length: int) -> tuple[int, int]:
+    begin = int(min(max(0.0, start) * SAMPLE_RATE, length))
+    return begin, int(min(max(begin, end * SAMPLE_RATE), length))
+
+
+def _track_length(filepath: str) -> int:
+    return int(round(AudioFile(filepath).duration * SAMPLE_RATE))
+
+
+def _read_window(filepath: str, window_start: int, window_end: int):
+    """Samples `window_start` to `window_end` of a file, as a [2, time] tensor at SAMPLE_RATE."""
+    return AudioFile(filepath).read(seek_time=window_start / SAMPLE_RATE,
+                                    duration=(window_end - window_start) / SAMPLE_RATE,
+                                    streams=0, samplerate=SAMPLE_RATE, channels=2)
+
+
+def separate_range(filepath: str, start: float, end: float,
+                   key: Optional[str] = None) -> tuple[str, dict[str, np.ndarray]]:
+    """
+    Stems of the section of a file from `start` to `end` seconds, separating only that
+    section plus RANGE_MARGIN_SECONDS on each side when the full stems are not known.
+    The margins only give the model context: the section is cut out of the separated
+    window as is, margins are crossfaded only when stored sections are merged into the
+    full stems (`stitch_ranges`), once they cover the whole track. While the whole track
+    is being separated, the section comes from that separation instead.
+
+    Returns:
+        The content key of the file and the float32 stems of the section by name
+    """
+    key = key or content_key(filepath)
+    with _jobs_lock:
+        job = separation_jobs.get(key)
+    if job is not None and not job.done():
+        progress = stem_progress(key, STEM_NAMES[0])
+        if progress is not None:
+            begin, stop = _section_bounds(start, end, progress[1])
+            stems = written_range(key, STEM_NAMES, begin, stop)
+            if stems is not None:
+                return key, stems
+        # The model runs one separation at a time, the section would wait for this one anyway
+        job.result()
+    if stem_cache.get(key) is not None or has_stems(key, STEM_NAMES):
+        key, stems = load_stems(filepath, key)
+        begin, stop = _section_bounds(start, end, min(array.shape[-1] for array in stems.values()))
+        return key, {name: array[:, begin:stop] for name, array in stems.items()}
+
+    length = _track_length(filepath)
+    begin, stop = _section_bounds(start, end, length)
+    stems = find_range(key, STEM_NAMES, begin, stop)
+    if stems is not None:
+        return key, stems
+
+    margin = int(RANGE_MARGIN_SECONDS * SAMPLE_RATE)
+    window_start, window_end = max(0, begin - margin), min(length, stop + margin)
+    wav = _read_window(filepath, window_start, window_end)
+    print(f"Separating {begin / SAMPLE_RATE:.2f}s to {stop / SAMPLE_RATE:.2f}s of {filepath}, "
+          f"window shape: {tuple(wav.shape)}")
+    outputs = _separations.submit(separate_mix, wav[None], STEM_NAMES).result()
+    arrays = {name: np.ascontiguousarray(outputs[name].numpy(), dtype=np.float32) for name in STEM_NAMES}
+    save_range(key, window_start, begin, min(stop, window_start + wav.shape[-1]), arrays)
+    merge_ranges(key, STEM_NAMES, length)
+    return key, {name: array[:, begin - window_start:stop - window_start] for name, array in arrays.items()}
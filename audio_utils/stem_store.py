@@ -0,0 +1,386 @@
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, Optional
+import numpy as np
+import librosa
+from audio_utils.artifacts import artifacts
+from audio_utils.codecs import available_formats, extension, submit_encode
+
+# Canonical stems: one float16 .npy file per stem, under a directory per input file content
+# key. Half the size of float32 like 16-bit integers, but separated stems of loud masters
+# go above full scale and float16 keeps those peaks instead of clipping them
+STORE_DIR = os.path.join("separated", "stems")
+STORE_DTYPE = np.float16
+# Encoded downloads, produced on first request and collected with the rest of separated/
+# under DISK_BUDGET_BYTES (see `audio_utils.artifacts`)
+ARTIFACT_DIR = os.path.join("separated", "artifacts")
+
+SAMPLE_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
+MP3_BITRATES = (64, 96, 128, 160, 192, 256, 320)
+
+# Transcodes requested ahead of downloads, each one waits on the encoder pool
+_transcodes = ThreadPoolExecutor(max_workers=2, thread_name_prefix="transcode")
+
+# Stems being written by separations in progress, by content key
+writers: dict[str, "StemWriter"] = {}
+# Seconds between two checks for newly separated audio while playing a stem in progress
+LIVE_POLL_SECONDS = 0.25
+# Crossfade (samples) between the separated ranges of a track when they are merged
+RANGE_CROSSFADE = 4096
+
+
+def stem_path(key: str, name: str) -> str:
+    return os.path.join(STORE_DIR, key, f"{name}.npy")
+
+
+def has_stems(key: str, names: list[str]) -> bool:
+    return all(os.path.exists(stem_path(key, name)) for name in names)
+
+
+def _to_float(stored: np.ndarray) -> np.ndarray:
+    # Stores written before float16 hold 16-bit integers
+    if stored.dtype == np.int16:
+        return (stored * np.float32(1 / 32767)).astype(np.float32)
+    return stored.astype(np.float32)
+
+
+def _to_pcm16(stored: np.ndarray) -> np.ndarray:
+    if stored.dtype == np.int16:
+        return np.array(stored)
+    return (np.clip(stored, -1.0, 1.0) * 32767).round().astype(np.int16)
+
+
+def save_stem(key: str, name: str, array: np.ndarray) -> str:
+    """Store a float (channels, samples) stem as float16, written once per content key."""
+    path = stem_path(key, name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp.npy"
+        np.save(tmp_path, np.asarray(array).astype(STORE_DTYPE))
+        os.replace(tmp_path, path)
+    artifacts.track(path)
+    return path
+
+
+def partial_path(key: str, name: str) -> str:
+    return f"{stem_path(key, name)}.tmp"
+
+
+class StemWriter:
+    """
+    Stems of a separation in progress, written to the store as consecutive ranges are
+    finalized, so that the separated prefix can be played before the separation ends.
+    Stems are only moved to their stored path once complete.
+    """
+
+    def __init__(self, key: str, names: list[str], channels: int, length: int):
+        self.key = key
+        self.names = list(names)
+        self.length = length
+        self.ready = 0
+        self.failed = False
+        self._done = threading.Event()
+        self._pcm = {}
+        for name in self.names:
+            os.makedirs(os.path.dirname(stem_path(key, name)), exist_ok=True)
+            self._pcm[name] = np.lib.format.open_memmap(partial_path(key, name), mode="w+", dtype=STORE_DTYPE,
+                                                        shape=(channels, length))
+        writers[key] = self
+
+    def write(self, offset: int, arrays: dict[str, np.ndarray]) -> None:
+        """Store the separated range starting at sample `offset` (ranges come in order)."""
+        if offset != self.ready:
+            raise ValueError(f"Expected a range starting at {self.ready}, got {offset}")
+        end = offset
+        for name in self.names:
+            array = arrays[name]
+            end = offset + array.shape[-1]
+            self._pcm[name][:, offset:end] = array
+        # Readers only look up to `ready`, it moves once the samples are in place
+        self.ready = end
+
+    def finish(self) -> None:
+        for name in self.names:
+            self._pcm[name].flush()
+            os.replace(partial_path(self.key, name), stem_path(self.key, name))
+            artifacts.track(stem_path(self.key, name))
+        self.ready = self.length
+        self._close()
+
+    def abort(self) -> None:
+        self.failed = True
+        for name in self.names:
+            try:
+                os.remove(partial_path(self.key, name))
+            except FileNotFoundError:
+                pass
+        self._close()
+
+    def _close(self) -> None:
+        self._pcm = {}
+        writers.pop(self.key, None)
+        self._done.set()
+
+    def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the separation to end, whether it is over."""
+        return self._done.wait(timeout)
+
+
+def stem_progress(key: str, name: str) -> Optional[tuple[int, int]]:
+    """Samples of a stem available so far and its length, None if it is neither stored nor being separated."""
+    writer = writers.get(key)
+    if writer is not None and name in writer.names:
+        return writer.ready, writer.length
+    if os.path.exists(stem_path(key, name)):
+        length = np.load(stem_path(key, name), mmap_mode="r").shape[-1]
+        return length, length
+    return None
+
+
+def live_stem(key: str, name: str, poll_seconds: float = LIVE_POLL_SECONDS) -> Iterator[np.ndarray]:
+    """
+    16-bit (channels, samples) blocks of a stem from its beginning, following a separation
+    in progress: the available samples come first, the rest as it gets separated. Like
+    any 16-bit encode, the blocks are clipped to full scale.
+    """
+    sent = 0
+    while True:
+        writer = writers.get(key)
+        if writer is None:
+            if not os.path.exists(stem_path(key, name)):
+                raise FileNotFoundError(f"No stored stem {name} for {key}")
+            pcm = np.load(stem_path(key, name), mmap_mode="r")
+            if sent < pcm.shape[-1]:
+                yield _to_pcm16(pcm[:, sent:])
+            return
+        ready = writer.ready
+        if ready > sent:
+            try:
+                pcm = np.load(partial_path(key, name), mmap_mode="r")
+            except FileNotFoundError:
+                # Moved to its stored path in the meantime
+                continue
+            yield _to_pcm16(pcm[:, sent:ready])
+            sent = ready
+        elif writer.wait(poll_seconds) and writer.failed:
+            raise RuntimeError(f"Separation of {key} failed")
+
+
+def written_range(key: str, names: list[str], start: int, end: int) -> Optional[dict[str, np.ndarray]]:
+    """Float32 stems from `start` to `end` of a separation in progress, if it has got that far."""
+    writer = writers.get(key)
+    if writer is None or end > writer.ready:
+        return None
+    try:
+        return {name: _to_float(np.load(partial_path(key, name), mmap_mode="r")[:, start:end]) for name in names}
+    except FileNotFoundError:
+        # Moved to its stored path in the meantime
+        return None
+
+
+def load_stem(key: str, name: str) -> np.ndarray:
+    """Stored stem as a float32 (channels, samples) array, read through a memory map."""
+    return _to_float(np.load(stem_path(key, name), mmap_mode="r"))
+
+
+def fingerprint_path(key: str) -> str:
+    return os.path.join(STORE_DIR, key, "fingerprint.npy")
+
+
+def save_fingerprint(key: str, mix: np.ndarray, fingerprint: np.ndarray) -> None:
+    """Keep the mix of a separated track and its fingerprint, to align later uploads against it."""
+    save_stem(key, "mix", mix)
+    path = fingerprint_path(key)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp.npy"
+    np.save(tmp_path, fingerprint)
+    os.replace(tmp_path, path)
+    artifacts.track(path)
+
+
+def load_fingerprint(key: str) -> np.ndarray:
+    return np.load(fingerprint_path(key))
+
+
+def has_fingerprint(key: str, names: list[str]) -> bool:
+    """Whether the mix, fingerprint and stems `names` of a track are all stored."""
+    return os.path.exists(fingerprint_path(key)) and has_stems(key, list(names) + ["mix"])
+
+
+def fingerprinted_keys(names: list[str]) -> list[str]:
+    """Tracks whose mix, fingerprint and stems `names` are all stored."""
+    if not os.path.isdir(STORE_DIR):
+        return []
+    return [entry.name for entry in os.scandir(STORE_DIR) if entry.is_dir() and has_fingerprint(entry.name, names)]
+
+
+def range_dir(key: str) -> str:
+    return os.path.join(STORE_DIR, key, "ranges")
+
+
+def save_range(key: str, window_start: int, start: int, end: int, arrays: dict[str, np.ndarray]) -> str:
+    """
+    Store the stems of a section separated on its own: `arrays` cover the samples from
+    `window_start`, context margins included, and are valid from `start` to `end`.
+    """
+    os.makedirs(range_dir(key), exist_ok=True)
+    path = os.path.join(range_dir(key), f"{start}_{end}.npz")
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp.npz"
+    stored = {name: np.asarray(array).astype(STORE_DTYPE) for name, array in arrays.items()}
+    np.savez(tmp_path, window_start=np.int64(window_start), **stored)
+    os.replace(tmp_path, path)
+    artifacts.track(path)
+    return path
+
+
+def stored_ranges(key: str) -> list[tuple[int, int, str]]:
+    """(start, end, path) of the separated sections of a track, by start."""
+    if not os.path.isdir(range_dir(key)):
+        return []
+    ranges = []
+    for entry in os.scandir(range_dir(key)):
+        start, _, end = entry.name.removesuffix(".npz").partition("_")
+        if entry.name.endswith(".npz") and start.isdigit() and end.isdigit():
+            ranges.append((int(start), int(end), entry.path))
+    return sorted(ranges)
+
+
+def load_range(path: str, names: list[str]) -> tuple[int, dict[str, np.ndarray]]:
+    """First sample and float32 stems of a stored section, margins included."""
+    with np.load(path) as data:
+        return int(data["window_start"]), {name: _to_float(data[name]) for name in names}
+
+
+def find_range(key: str, names: list[str], start: int, end: int) -> Optional[dict[str, np.ndarray]]:
+    """Stems from `start` to `end` from a stored section covering them, if any."""
+    for range_start, range_end, path in stored_ranges(key):
+        if range_start <= start and end <= range_end:
+            window_start, arrays = load_range(path, names)
+            artifacts.touch(path)
+            return {name: array[:, start - window_start:end - window_start] for name, array in arrays.items()}
+    return None
+
+
+def stitch_ranges(sections: list[tuple[int, int, int, np.ndarray]], length: int,
+                  crossfade: int = RANGE_CROSSFADE) -> Optional[np.ndarray]:
+    """
+    Assemble a full-length stem from sections `(window_start, start, end, array)`, where
+    `array` starts at `window_start` and is valid from `start` to `end`. Consecutive
+    sections are crossfaded around the middle of their overlap, over at most `crossfade`
+    samples and as far as both arrays reach, so that the margins of each section fade away.
+
+    Returns:
+        The (channels, length) stem, or None if the sections leave a gap
+    """
+    chain, covered = [], 0
+    candidates = sorted(sections, key=lambda section: section[1])
+    while covered < length:
+        reaching = [section for section in candidates if section[1] <= covered and section[2] > covered]
+        if not reaching:
+            return None
+        best = max(reaching, key=lambda section: section[2])
+        chain.append(best)
+        covered = best[2]
+
+    channels = chain[0][3].shape[0]
+    out = np.zeros((channels, length), dtype=np.float32)
+    cut = 0
+    for i, (window_start, start, end, array) in enumerate(chain):
+        window_end = window_start + array.shape[-1]
+        if i + 1 < len(chain):
+            next_window_start, next_start, next_end, next_array = chain[i + 1]
+            boundary = (max(next_start, cut) + end) // 2
+            half = min(crossfade // 2, window_end - boundary, boundary - next_window_start, boundary - cut,
+                       next_end - boundary)
+            half = max(half, 0)
+        else:
+            boundary, half = length, 0
+        # This section alone from the previous crossfade to the next one
+        out[:, cut:boundary - half] = array[:, cut - window_start:boundary - half - window_start]
+        if half:
+            fade = (np.arange(2 * half, dtype=np.float32) + 0.5) / (2 * half)
+            span = slice(boundary - half, boundary + half)
+            current = array[:, span.start - window_start:span.stop - window_start]
+            following = next_array[:, span.start - next_window_start:span.stop - next_window_start]
+            out[:, span] = current * (1 - fade) + following * fade
+        cut = boundary + half
+    return out
+
+
+def merge_ranges(key: str, names: list[str], length: int) -> bool:
+    """
+    Once the stored sections of a track cover all of it, store its full stems from them
+    (see `stitch_ranges`) and drop the sections.
+
+    Returns:
+        Whether the full stems are stored
+    """
+    if has_stems(key, names):
+        return True
+    ranges = stored_ranges(key)
+    try:
+        loaded = [(start, end, load_range(path, names)) for start, end, path in ranges]
+    except FileNotFoundError:
+        # Another request merged and dropped the sections in the meantime
+        return has_stems(key, names)
+    stems = {}
+    for name in names:
+        sections = [(window_start, start, end, arrays[name]) for start, end, (window_start, arrays) in loaded]
+        stem = stitch_ranges(sections, length)
+        if stem is None:
+            return False
+        stems[name] = stem
+    for name, stem in stems.items():
+        save_stem(key, name, stem)
+    for _, _, path in ranges:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Merged at the same time by another request
+            pass
+    return True
+
+
+def artifact_path(key: str, name: str, fmt: str, sr: int, bitrate: Optional[int]) -> str:
+    quality = f"{bitrate}k" if bitrate else "default"
+    return os.path.join(ARTIFACT_DIR, f"{key}_{name}_{sr}_{quality}.{extension(fmt)}")
+
+
+def transcode(key: str, name: str, fmt: str, sr: int = 44100, bitrate: Optional[int] = None,
+              source_sr: int = 44100) -> str:
+    """
+    Path of a stored stem encoded as `fmt` at `sr` Hz (and `bitrate` kbps for MP3).
+    The file is encoded on first request only, and fetching it again marks it as
+    recently used for the disk budget.
+    """
+    if fmt not in available_formats():
+        raise ValueError(f"Unsupported output format: {fmt}")
+    if sr not in SAMPLE_RATES:
+        raise ValueError(f"Unsupported sample rate: {sr}")
+    if bitrate is not None and (fmt != "mp3" or bitrate not in MP3_BITRATES):
+        raise ValueError(f"Unsupported bitrate for {fmt}: {bitrate}")
+    if not os.path.exists(stem_path(key, name)):
+        raise FileNotFoundError(f"No stored stem {name} for {key}")
+
+    path = artifact_path(key, name, fmt, sr, bitrate)
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    array = load_stem(key, name)
+    if sr != source_sr:
+        array = librosa.resample(array, orig_sr=source_sr, target_sr=sr)
+    # Encoded next to its final path, so a concurrent request never serves a partial file
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    submit_encode(tmp_path, array, sr, fmt, bitrate).result()
+    os.replace(tmp_path, path)
+    artifacts.track(path)
+    return path
+
+
+def submit_transcode(key: str, name: str, fmt: str, sr: int = 44100, bitrate: Optional[int] = None,
+                     source_sr: int = 44100) -> Future:
+    """Run `transcode` in the background, ahead of the first download. The future gives the path."""
+    return _transcodes.submit(transcode, key, name, fmt, sr, bitrate, source_sr)
@@ -0,0 +1,150 @@
+import struct
+from typing import Iterable, Iterator, Optional
+import numpy as np
+from audio_utils.cache import content_hash
+from audio_utils.dynamics import compress_blocks, limit_blocks
+from audio_utils.filters import sos_blocks
+from audio_utils.mixer import HEADROOM_DB, render_cache
+from audio_utils.planner import plan_stem, run_stages, split_output_gain, stage_sos
+from audio_utils.preview import PREROLL_SECONDS
+from audio_utils.reverb import BLOCK_SIZE, reverb_blocks
+
+# Streaming block (samples): one reverb partition, a multiple of the dynamics detector block.
+# About 0.37 s at 44.1 kHz, the first block is ready well before that
+STREAM_BLOCK_SIZE = BLOCK_SIZE
+
+
+def blocks_of(array: np.ndarray, block_size: int = STREAM_BLOCK_SIZE) -> Iterator[np.ndarray]:
+    """Cut a (channels, samples) array into `block_size` views, the last one may be shorter."""
+    for start in range(0, array.shape[-1], block_size):
+        yield array[:, start:start + block_size]
+
+
+def rechunk(blocks: Iterable[np.ndarray], block_size: int = STREAM_BLOCK_SIZE) -> Iterator[np.ndarray]:
+    """Regroup a stream of chunks of any size into `block_size` chunks, the last one may be shorter."""
+    pending, size = [], 0
+    for chunk in blocks:
+        pending.append(chunk)
+        size += chunk.shape[-1]
+        if size < block_size:
+            continue
+        joined = np.concatenate(pending, axis=-1)
+        cut = size - size % block_size
+        yield from blocks_of(joined[:, :cut], block_size)
+        pending, size = [joined[:, cut:]], size - cut
+    if size:
+        yield np.concatenate(pending, axis=-1)
+
+
+def _skip(blocks: Iterable[np.ndarray], samples: int) -> Iterator[np.ndarray]:
+    for chunk in blocks:
+        if samples >= chunk.shape[-1]:
+            samples -= chunk.shape[-1]
+            continue
+        yield chunk[:, samples:]
+        samples = 0
+
+
+def stream_stages(blocks: Iterable[np.ndarray], stages: list[tuple], sr: int) -> Iterator[np.ndarray]:
+    """
+    Chain the streaming version of each stage of a plan. Pitch shifting has no streaming
+    version, plans are split before streaming so that it never reaches this point.
+    """
+    for stage in stages:
+        kind = stage[0]
+        blocks = rechunk(blocks)
+        if kind == "gain":
+            blocks = ((chunk * np.float32(stage[1])).astype(np.float32, copy=False) for chunk in blocks)
+        elif kind == "reverb":
+            blocks = reverb_blocks(blocks, sr, stage[1])
+        elif kind == "sos":
+            blocks = sos_blocks(blocks, stage_sos(stage, sr))
+        elif kind == "compress":
+            blocks = compress_blocks(blocks, sr, threshold=stage[1], ratio=stage[2])
+        else:
+            raise ValueError(f"Stage cannot be streamed: {kind}")
+    return rechunk(blocks)
+
+
+def _stem_stream(array: np.ndarray, stages: list[tuple], sr: int, stem_key: str,
+                 begin: int) -> Iterator[np.ndarray]:
+    # Everything up to the last pitch shift is rendered at once (and cached like full
+    # renders), the rest of the chain is streamed from `begin`
+    split = max((i + 1 for i, stage in enumerate(stages) if stage[0] == "pitch"), default=0)
+    head, tail = stages[:split], stages[split:]
+    if head:
+        key = (stem_key, array.shape[-1], sr, repr(head))
+        rendered = render_cache.get(key)
+        if rendered is None:
+            rendered = render_cache.put(key, run_stages(array, head, sr))
+        array = rendered
+    return stream_stages(blocks_of(array[:, begin:]), tail, sr)
+
+
+def stream_remix(stem_arrays: dict[str, np.ndarray], instructions: dict, sr: int,
+                 start: int = 0, stem_keys: Optional[dict[str, str]] = None) -> Iterator[np.ndarray]:
+    """
+    Render the remix block by block, from sample `start`, yielding limited float32
+    chunks of STREAM_BLOCK_SIZE samples with shape (channels, samples).
+
+    Stems follow their `plan_stem` plans with the streaming versions of the stages, so
+    from the beginning of the track the output is the same as `render_remix`. When
+    seeking, processing starts at least PREROLL_SECONDS earlier to settle reverb tails and
+    gains, and the output converges to that of a full render.
+    """
+    length = min(arr.shape[1] for arr in stem_arrays.values())
+    channels = max(arr.shape[0] for arr in stem_arrays.values())
+    start = min(max(0, start), length)
+    # Aligned on the block grid of a render from the beginning, so the dynamics detector
+    # blocks and reverb partitions fall at the same places
+    begin = max(0, start - int(PREROLL_SECONDS * sr)) // STREAM_BLOCK_SIZE * STREAM_BLOCK_SIZE
+    if stem_keys is None:
+        stem_keys = {name: content_hash(array) for name, array in stem_arrays.items()}
+
+    streams = []
+    for name, array in stem_arrays.items():
+        stages = plan_stem(name, instructions)
+        if stages is None:
+            continue
+        stages, gain = split_output_gain(stages)
+        stream = _stem_stream(array[:, :length], stages, sr, stem_keys[name], begin)
+        streams.append((stream, gain))
+
+    def bus() -> Iterator[np.ndarray]:
+        if not streams:
+            for chunk in blocks_of(np.zeros((channels, length - begin), dtype=np.float32)):
+                yield chunk
+            return
+        for chunks in zip(*(stream for stream, _ in streams)):
+            mix = np.zeros(chunks[0].shape, dtype=np.float32)
+            for chunk, (_, gain) in zip(chunks, streams):
+                mix += chunk if gain == 1.0 else chunk * np.float32(gain)
+            yield mix
+
+    blocks = bus()
+    global_reverb = instructions.get("global_reverb", 0.0)
+    if global_reverb > 0:
+        blocks = reverb_blocks(blocks, sr, global_reverb)
+    blocks = limit_blocks(blocks, sr, ceiling_db=HEADROOM_DB)
+    return rechunk(_skip(blocks, start - begin))
+
+
+def wav_header(channels: int, sr: int, frames: int) -> bytes:
+    """Header of a 16-bit PCM WAV file holding `frames` samples per channel."""
+    data_size = frames * channels * 2
+    return (b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sr, sr * channels * 2, channels * 2, 16)
+            + b"data" + struct.pack("<I", data_size))
+
+
+def stream_wav(stem_arrays: dict[str, np.ndarray], instructions: dict, sr: int,
+               start: int = 0, stem_keys: Optional[dict[str, str]] = None) -> Iterator[bytes]:
+    """
+    `stream_remix` encoded on the fly as a 16-bit PCM WAV file: the header (the length
+    is known up front) followed by one chunk of interleaved samples per block.
+    """
+    length = min(arr.shape[1] for arr in stem_arrays.values())
+    channels = max(arr.shape[0] for arr in stem_arrays.values())
+    yield wav_header(channels, sr, length - min(max(0, start), length))
+    for block in stream_remix(stem_arrays, instructions, sr, start, stem_keys):
+        yield (np.clip(block, -1.0, 1.0).T * 32767).round().astype("<i2").tobytes()
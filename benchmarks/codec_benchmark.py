@@ -0,0 +1,44 @@
+"""
+Size and encoding speed of the delivery formats of `audio_utils.codecs`, for a set of
+stems encoded one after another and on the encoder pool.
+
+Usage: python -m benchmarks.codec_benchmark [--duration 60]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from audio_utils.codecs import available_formats, encode_to_file, submit_encode
+from benchmarks.remix_benchmark import SR, make_stems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=60.0, help="Track length in seconds.")
+    args = parser.parse_args()
+
+    stems = make_stems(args.duration)
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in available_formats():
+            begin = time.perf_counter()
+            reports = [encode_to_file(os.path.join(tmp, f"{name}.{fmt}"), array, SR, fmt)
+                       for name, array in stems.items()]
+            serial = time.perf_counter() - begin
+
+            begin = time.perf_counter()
+            futures = [submit_encode(os.path.join(tmp, f"{name}_pool.{fmt}"), array, SR, fmt)
+                       for name, array in stems.items()]
+            for future in futures:
+                future.result()
+            pooled = time.perf_counter() - begin
+
+            size = sum(r["bytes"] for r in reports)
+            ratio = sum(r["ratio"] for r in reports) / len(reports)
+            audio_seconds = args.duration * len(stems)
+            print(f"{fmt:>5}: {size / 2 ** 20:7.2f} MB, ratio {ratio:5.1f}, "
+                  f"serial {audio_seconds / serial:7.1f}x realtime, pool {audio_seconds / pooled:7.1f}x realtime")
+
+
+if __name__ == "__main__":
+    main()
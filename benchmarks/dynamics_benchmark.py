@@ -0,0 +1,48 @@
+"""
+Per-stem compression cost: NumPy dynamics engine against the ffmpeg `compand`
+invocation it replaces (skipped when no ffmpeg binary is found).
+
+Usage: python -m benchmarks.dynamics_benchmark [--duration 300]
+"""
+import argparse
+import shutil
+import time
+
+import numpy as np
+
+from audio_utils.dynamics import compress, limit
+from audio_utils.effects import _run_ffmpeg_filter
+from audio_utils.mixer import COMPRESSION_PRESETS
+
+SR = 44100
+
+
+def timed(fn, *args, **kwargs) -> float:
+    begin = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=300.0, help="Stem length in seconds.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    envelope = np.abs(np.sin(np.arange(int(args.duration * SR)) * 2 * np.pi / SR))
+    stem = (0.5 * envelope * rng.standard_normal((2, envelope.size))).astype(np.float32)
+
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+    for level, (threshold, ratio) in COMPRESSION_PRESETS.items():
+        engine = timed(compress, stem, SR, threshold=threshold, ratio=ratio)
+        line = f"{level:>6}: engine {engine:6.2f} s"
+        if has_ffmpeg:
+            af = (f"compand=attacks=0.02:decays=0.25:"
+                  f"points={threshold}/{threshold}|0/{threshold - threshold / ratio}")
+            line += f", ffmpeg {timed(_run_ffmpeg_filter, stem, SR, af):6.2f} s"
+        print(line)
+    print(f"limiter: {timed(limit, stem * 4, SR):6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
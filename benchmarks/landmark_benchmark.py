@@ -0,0 +1,83 @@
+"""
+Size, lookup latency and match rates of the landmark index of `audio_utils.landmarks`,
+on a corpus of synthetic songs: each song is indexed, then looked up again re-encoded in
+every lossy format available (true matches), and songs never indexed are looked up
+(false matches).
+
+Usage: python -m benchmarks.landmark_benchmark [--songs 50] [--duration 60] [--unrelated 50]
+"""
+import argparse
+import io
+import time
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from audio_utils.codecs import available_formats, encode
+from audio_utils.landmarks import LandmarkIndex, landmarks
+
+SR = 44100
+
+
+def make_song(duration: float, seed: int) -> np.ndarray:
+    """Decaying harmonic notes on a quarter-second grid over a little noise."""
+    rng = np.random.default_rng(seed)
+    length = int(duration * SR)
+    out = np.zeros((2, length), dtype=np.float32)
+    for k in range(int(duration * 4)):
+        start = k * SR // 4
+        t = np.arange(min(length - start, int(rng.uniform(0.2, 0.8) * SR))) / SR
+        frequency = 110 * 2 ** (rng.integers(0, 36) / 12)
+        note = sum(np.sin(2 * np.pi * frequency * h * t) / h for h in range(1, 5)) * np.exp(-3 * t)
+        out[:, start:start + len(t)] += rng.uniform(0.1, 0.3) * rng.uniform(0.5, 1, (2, 1)) * note
+    return out + 0.01 * rng.standard_normal((2, length)).astype(np.float32)
+
+
+def reencode(array: np.ndarray, fmt: str) -> np.ndarray:
+    data, sr = sf.read(io.BytesIO(encode(array, SR, fmt, 128 if fmt == "mp3" else None)),
+                       dtype="float32", always_2d=True)
+    return librosa.resample(data.T, orig_sr=sr, target_sr=SR) if sr != SR else data.T
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--songs", type=int, default=50, help="Songs in the index.")
+    parser.add_argument("--duration", type=float, default=60.0, help="Song length in seconds.")
+    parser.add_argument("--unrelated", type=int, default=50, help="Songs looked up without being indexed.")
+    args = parser.parse_args()
+
+    index = LandmarkIndex()
+    songs, extract = [], 0.0
+    for seed in range(args.songs):
+        songs.append(make_song(args.duration, seed))
+        begin = time.perf_counter()
+        hashes, times = landmarks(songs[-1], SR)
+        extract += time.perf_counter() - begin
+        index.add(f"song{seed}", hashes, times, args.duration)
+    stats = index.stats()
+    print(f"index: {stats['tracks']} songs, {stats['entries']} landmarks, {stats['bytes'] / 2 ** 20:.2f} MB, "
+          f"extraction {args.duration * args.songs / extract:.1f}x realtime")
+
+    def lookups(queries):
+        latencies, found = [], []
+        for array in queries:
+            hashes, times = landmarks(array, SR)
+            match = index.query(hashes, times)
+            latencies.append(index.metrics["last_lookup_seconds"])
+            found.append(None if match is None else match[0])
+        return 1000 * np.median(latencies), 1000 * np.max(latencies), found
+
+    for fmt in [fmt for fmt in available_formats() if fmt in ("mp3", "opus")]:
+        median, worst, found = lookups(reencode(song, fmt) for song in songs)
+        hits = sum(key == f"song{i}" for i, key in enumerate(found))
+        print(f"{fmt:>5} re-encodes: {hits}/{len(songs)} matched, lookup {median:.2f} ms median, {worst:.2f} ms max")
+
+    median, worst, found = lookups(make_song(args.duration, args.songs + seed) for seed in range(args.unrelated))
+    false_matches = sum(key is not None for key in found)
+    print(f"unrelated: {false_matches}/{args.unrelated} false matches, lookup {median:.2f} ms median, "
+          f"{worst:.2f} ms max")
+
+
+if __name__ == "__main__":
+    main()
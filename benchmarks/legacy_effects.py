@@ -0,0 +1,95 @@
+"""
+pydub effects of the remix path before `audio_utils.mixer`: each one round-trips a stem
+through temp WAV files and an ffmpeg or librosa pass. Kept as the baseline of
+`benchmarks.remix_benchmark`.
+"""
+import os
+import subprocess
+import tempfile
+
+import librosa
+import soundfile as sf
+from pydub import AudioSegment
+
+
+def apply_reverb_pydub(audio: AudioSegment, reverberance: float = 50.0):
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_input:
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_output:
+            try:
+                audio.export(temp_input.name, format="wav")
+
+                reverb_level = max(0.0, min(reverberance, 1.0))  # Clamp to 0-1
+                delay_ms = int(reverb_level * 100 + 50)  # 50-150ms delay
+                decay = reverb_level * 0.6  # 0-0.6 decay
+
+                print(f"DEBUG - Applying reverb: level={reverb_level}, delay={delay_ms}ms, decay={decay}")
+
+                from pydub.utils import which
+                ffmpeg_path = which("ffmpeg")
+
+                cmd = [
+                    ffmpeg_path, "-i", temp_input.name,
+                    "-af", f"aecho=0.8:0.9:{delay_ms}:{decay}",
+                    "-y", temp_output.name
+                ]
+
+                subprocess.run(cmd, check=True, capture_output=True, text=True)
+                print("DEBUG - Reverb ffmpeg completed successfully")
+
+                return AudioSegment.from_wav(temp_output.name)
+
+            except subprocess.CalledProcessError as e:
+                print(f"ERROR - Reverb ffmpeg failed: {e.stderr}")
+                return audio  # Return original audio if reverb fails
+            finally:
+                for temp_file in [temp_input.name, temp_output.name]:
+                    if os.path.exists(temp_file):
+                        os.unlink(temp_file)
+
+
+def change_pitch_pydub(audio: AudioSegment, n_steps: float):
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
+        try:
+            audio.export(temp_file.name, format="wav")
+
+            y, sr = librosa.load(temp_file.name, sr=None)
+            y_shifted = librosa.effects.pitch_shift(y, sr=sr, n_steps=n_steps)
+
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_output:
+                sf.write(temp_output.name, y_shifted, sr)
+                return AudioSegment.from_wav(temp_output.name)
+
+        finally:
+            if os.path.exists(temp_file.name):
+                os.unlink(temp_file.name)
+            if 'temp_output' in locals() and os.path.exists(temp_output.name):
+                os.unlink(temp_output.name)
+
+
+def apply_compression_pydub(audio: AudioSegment, threshold: float = -20, ratio: float = 3,
+                            attack: float = 20, release: float = 250):
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_input:
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_output:
+            try:
+                audio.export(temp_input.name, format="wav")
+
+                from pydub.utils import which
+                ffmpeg_path = which("ffmpeg")
+
+                attack_sec = attack / 1000.0  # ms to seconds
+                release_sec = release / 1000.0
+
+                cmd = [
+                    ffmpeg_path, "-i", temp_input.name,
+                    "-af",
+                    f"compand=attacks={attack_sec}:decays={release_sec}:points={threshold}/{threshold}|0/{threshold - threshold / ratio}",
+                    "-y", temp_output.name
+                ]
+
+                subprocess.run(cmd, check=True, capture_output=True)
+                return AudioSegment.from_wav(temp_output.name)
+
+            finally:
+                for temp_file in [temp_input.name, temp_output.name]:
+                    if os.path.exists(temp_file):
+                        os.unlink(temp_file)
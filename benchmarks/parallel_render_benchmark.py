@@ -0,0 +1,57 @@
+"""
+Remix latency with the stem chains rendered one after another (a single worker)
+against the shared render pool of `audio_utils.mixer`, with the per-stage breakdown.
+
+Usage: python -m benchmarks.parallel_render_benchmark [--duration 120]
+
+Caches are cleared before each run. With the pool, the stem phase should take about
+as long as the slowest stem, given at least as many cores as stems.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_utils import mixer, pitch
+from benchmarks.remix_benchmark import SR, make_stems
+
+INSTRUCTIONS = {
+    "volumes": {"vocals": 1.2, "drums": 0.8},
+    "reverb": {"vocals": 0.5},
+    "pitch_shift": {"other": 2},
+    "eq": {"bass": {"frequency": 120, "width": 1, "gain_db": 4}},
+    "compression": {"drums": "medium", "bass": "low"},
+}
+
+
+def run(stems: dict, pool: ThreadPoolExecutor) -> tuple[float, dict]:
+    mixer.render_cache.clear()
+    pitch.analysis_cache.clear()
+    pitch.result_cache.clear()
+    mixer._pool = pool
+    stats = {}
+    begin = time.perf_counter()
+    mixer.render_remix(stems, INSTRUCTIONS, SR, stats=stats)
+    return time.perf_counter() - begin, stats["timings"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=120.0, help="Track length in seconds.")
+    args = parser.parse_args()
+
+    stems = make_stems(args.duration)
+    default_pool = mixer._pool
+    # Warm-up: the first pitch shift pays for librosa's lazy imports and JIT compilation
+    run(make_stems(1.0), default_pool)
+    for label, pool in [("serial", ThreadPoolExecutor(max_workers=1)), ("pool", default_pool)]:
+        elapsed, timings = run(stems, pool)
+        print(f"{label:>6} ({pool._max_workers} workers): {elapsed:6.2f} s")
+        for name in stems:
+            stages = ", ".join(f"{k} {v:.2f}" for k, v in timings.get(name, {}).items())
+            print(f"        {name:>7}: {sum(timings.get(name, {}).values()):5.2f} s  ({stages})")
+        print(f"        stems + mix-down {timings['stems']:.2f} s, limiter {timings['limiter']:.2f} s")
+    mixer._pool = default_pool
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Latency and memory of the remix mix-down: legacy pydub path (temp WAV per stem,
+AudioSegment.overlay, one export) against the float32 array path of
+`audio_utils.mixer`.
+
+Usage: python -m benchmarks.remix_benchmark [--duration 300] [--effects]
+
+Memory is the peak of Python-tracked allocations (NumPy buffers and pydub raw
+data, via tracemalloc). ffmpeg subprocesses used by effects are not included.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from audio_utils.helpers import numpy_array_to_audiosegment
+from audio_utils.mixer import render_remix, export_wav
+
+SR = 44100
+STEMS = ["vocals", "drums", "bass", "other"]
+
+
+def make_stems(duration: float) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(duration * SR)) / SR
+    stems = {}
+    for i, name in enumerate(STEMS):
+        tone = 0.2 * np.sin(2 * np.pi * (110 * (i + 1)) * t)
+        noise = 0.05 * rng.standard_normal((2, len(t)))
+        stems[name] = (tone + noise).astype(np.float32)
+    return stems
+
+
+def legacy_remix(stem_arrays: dict[str, np.ndarray], instructions: dict, path: str):
+    volumes = instructions.get("volumes") or {}
+    segments = []
+    for name, array in stem_arrays.items():
+        scaled = np.clip(array * volumes.get(name, 1.0), -1.0, 1.0)
+        audio = numpy_array_to_audiosegment(scaled, SR)
+        if instructions.get("reverb", {}).get(name):
+            from benchmarks.legacy_effects import apply_reverb_pydub
+            audio = apply_reverb_pydub(audio, reverberance=instructions["reverb"][name])
+        if instructions.get("compression", {}).get(name):
+            from benchmarks.legacy_effects import apply_compression_pydub
+            audio = apply_compression_pydub(audio, threshold=-20, ratio=4)
+        segments.append(audio)
+    final_mix = segments[0]
+    for seg in segments[1:]:
+        final_mix = final_mix.overlay(seg)
+    final_mix.export(path, format="wav")
+
+
+def array_remix(stem_arrays: dict[str, np.ndarray], instructions: dict, path: str):
+    export_wav(path, render_remix(stem_arrays, instructions, SR), SR)
+
+
+def measure(fn, *args) -> tuple[float, float]:
+    tracemalloc.start()
+    begin = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - begin
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=300.0, help="Track length in seconds.")
+    parser.add_argument("--effects", action="store_true",
+                        help="Add reverb and compression on two stems (requires ffmpeg).")
+    args = parser.parse_args()
+
+    stems = make_stems(args.duration)
+    instructions = {"volumes": {"vocals": 1.2, "drums": 0.8, "bass": 1.0, "other": 0.5}}
+    if args.effects:
+        instructions["reverb"] = {"vocals": 0.5}
+        instructions["compression"] = {"drums": "medium"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, fn in [("pydub", legacy_remix), ("array", array_remix)]:
+            path = os.path.join(tmp, f"{label}.wav")
+            elapsed, peak = measure(fn, stems, instructions, path)
+            print(f"{label:>6}: {elapsed:7.2f} s, peak memory {peak:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -110,7 +110,9 @@ class Separator:
         - `shift_idx`: The index of shifts. Starts from 0.
         - `segment_offset`: The offset of current segment. If the number is 441000, it doesn't
             mean that it is at the 441000 second of the audio, but the "frame" of the tensor.
-        - `state`: Could be `"start"` or `"end"`.
+        - `state`: Could be `"start"` or `"end"`, or `"skip"` for a silent segment that was not
+            passed through the model (see `silence_threshold` in `demucs.apply.apply_model`).
+        - `skipped_segments`: Count of silent segments skipped for the current model and shift.
         - `audio_length`: Length of the audio (in "frame" of the tensor).
         - `models`: Count of submodels in the model.
         """
@@ -177,7 +179,9 @@ class Separator:
         - `shift_idx`: The index of shifts. Starts from 0.
         - `segment_offset`: The offset of current segment. If the number is 441000, it doesn't
             mean that it is at the 441000 second of the audio, but the "frame" of the tensor.
-        - `state`: Could be `"start"` or `"end"`.
+        - `state`: Could be `"start"` or `"end"`, or `"skip"` for a silent segment that was not
+            passed through the model (see `silence_threshold` in `demucs.apply.apply_model`).
+        - `skipped_segments`: Count of silent segments skipped for the current model and shift.
         - `audio_length`: Length of the audio (in "frame" of the tensor).
         - `models`: Count of submodels in the model.
         """
@@ -78,6 +78,62 @@ class BagOfModels(nn.Module):
         raise NotImplementedError("Call `apply_model` on this.")
 
 
+class _SharedSpecGroup(nn.Module):
+    def __init__(self, models: tp.List[Model], weights: tp.List[tp.List[float]]):
+        """
+        Models from a bag that are evaluated together on each chunk, so that
+        the mixture spectrogram, its magnitude and normalization are computed
+        only once for all the models sharing the same STFT settings.
+        All models must be of the same class and use the same segment, as they
+        will be given the exact same chunks by `apply_model`.
+
+        The output is the weighted average of the estimates of each model, using
+        the bag weights, so that scaling it by the summed weights gives
+        back the same contribution as applying each model individually.
+        """
+        super().__init__()
+        first = models[0]
+        for other in models:
+            assert type(other) is type(first)
+            assert other.segment == first.segment
+        self.models = nn.ModuleList(models)
+        self.weights = weights
+        self.totals = [sum(w[k] for w in weights) for k in range(len(first.sources))]
+        self.audio_channels = first.audio_channels
+        self.samplerate = first.samplerate
+        self.sources = first.sources
+        self.segment = first.segment
+
+    def valid_length(self, length: int) -> int:
+        first = self.models[0]
+        if hasattr(first, 'valid_length'):
+            return first.valid_length(length)  # type: ignore
+        return length
+
+    def forward(self, mix):
+        spec_cache: tp.Dict[tp.Any, tp.Any] = {}
+        out = 0.
+        for model, model_weights in zip(self.models, self.weights):
+            weights = th.tensor(model_weights, device=mix.device, dtype=mix.dtype)
+            out = out + model(mix, spec_cache=spec_cache) * weights[:, None, None]
+        totals = th.tensor([total or 1. for total in self.totals],
+                           device=mix.device, dtype=mix.dtype)
+        return out / totals[:, None, None]
+
+
+def _bag_groups(bag: BagOfModels, share_spec: bool) -> tp.List[tp.List[int]]:
+    """Group the models of the bag that can share their mixture spectrogram,
+    i.e. spectrogram models that will be applied to the exact same chunks."""
+    groups: tp.Dict[tp.Any, tp.List[int]] = {}
+    for idx, sub_model in enumerate(bag.models):
+        key: tp.Any = idx
+        if share_spec and isinstance(sub_model, (HDemucs, HTDemucs)):
+            key = (type(sub_model), sub_model.segment,
+                   getattr(sub_model, 'use_train_segment', None))
+        groups.setdefault(key, []).append(idx)
+    return list(groups.values())
+
+
 class TensorChunk:
     def __init__(self, tensor, offset=0, length=None):
         total_length = tensor.shape[-1]
@@ -131,6 +187,97 @@ def tensor_chunk(tensor_or_chunk):
         return TensorChunk(tensor_or_chunk)
 
 
+def _window_rms_db(mix: tp.Union[th.Tensor, TensorChunk], window: int) -> th.Tensor:
+    """RMS of `mix` (in dB relative to full scale) over consecutive windows
+    of `window` samples, averaged over batch and channels."""
+    mix = tensor_chunk(mix)
+    assert isinstance(mix, TensorChunk)
+    data = mix.padded(mix.length)
+    power = data.pow(2).reshape(-1, mix.length).mean(dim=0)
+    power = F.avg_pool1d(power[None, None], window, window, ceil_mode=True)[0, 0]
+    return 10 * th.log10(power + 1e-20)
+
+
+def _silent_offsets(mix: tp.Union[th.Tensor, TensorChunk],
+                    segments: tp.Sequence[tp.Tuple[int, int]],
+                    threshold: float, window: int) -> tp.Set[int]:
+    """Return the set of offsets of the chunks of `mix` that are silent, i.e. for which the RMS
+    over every `window` samples stays below `threshold` (in dB relative to full scale).
+    Using the loudest window rather than the RMS of the whole chunk ensures that short
+    transients in an otherwise quiet chunk are not skipped."""
+    rms_db = _window_rms_db(mix, window)
+    silent = set()
+    for offset, chunk_length in segments:
+        if rms_db[offset // window:-(-(offset + chunk_length) // window)].max() < threshold:
+            silent.add(offset)
+    return silent
+
+
+def plan_segments(mix: tp.Union[th.Tensor, TensorChunk], segment_length: int,
+                  overlap: float, min_overlap: float, window: int,
+                  quiet_db: float = -30.) -> tp.List[tp.Tuple[int, int]]:
+    """
+    Plan the chunks on which to evaluate the model, as a list of `(offset, length)`,
+    with `length <= segment_length`.
+
+    Consecutive chunks overlap by `overlap * segment_length` samples like the fixed grid
+    used by `apply_model`, except when a quiet region is found towards the end of a chunk,
+    i.e. a region where the RMS over each `window` stays `quiet_db` below the RMS of the
+    whole mix. In that case, the cut is moved to the latest such region and the overlap
+    is reduced to `min_overlap * segment_length`, as long as this gives a larger stride than
+    the fixed grid. Fewer chunks are then needed to cover the mix.
+    """
+    assert 0 <= min_overlap <= overlap
+    length = tensor_chunk(mix).length
+    max_ov = int(overlap * segment_length)
+    min_ov = int(min_overlap * segment_length)
+    rms_db = _window_rms_db(mix, window)
+    mix_db = 10 * th.log10(th.pow(10, rms_db / 10).mean() + 1e-20)
+    quiet = (rms_db < mix_db + quiet_db).tolist()
+    span = max(min_ov, window)
+
+    segments = []
+    offset = 0
+    while True:
+        end = min(offset + segment_length, length)
+        if end >= length:
+            segments.append((offset, end - offset))
+            break
+        next_offset = end - max_ov
+        # Latest cut first, any cut at or before `end - max_ov` is not worth it.
+        for cut in range(end - min_ov, end - max_ov, -window):
+            if all(quiet[cut // window:-(-(cut + span) // window)]):
+                next_offset = cut
+                end = cut + min_ov
+                break
+        segments.append((offset, end - offset))
+        offset = next_offset
+    return segments
+
+
+def _crossfade_weights(segments: tp.Sequence[tp.Tuple[int, int]],
+                       device=None) -> tp.List[th.Tensor]:
+    """Trapezoidal weights for the chunks planned by `plan_segments`: linear ramps over
+    the overlap with each neighbouring chunk, so that the weights sum to one there,
+    and flat elsewhere."""
+    weights = []
+    for idx, (offset, chunk_length) in enumerate(segments):
+        weight = th.ones(chunk_length, device=device)
+        if idx > 0:
+            prev_offset, prev_length = segments[idx - 1]
+            left = prev_offset + prev_length - offset
+            if left > 0:
+                ramp = th.arange(1, left + 1, device=device) / (left + 1)
+                weight[:left] = th.minimum(weight[:left], ramp[:chunk_length])
+        if idx < len(segments) - 1:
+            right = offset + chunk_length - segments[idx + 1][0]
+            if right > 0:
+                ramp = th.arange(right, 0, -1, device=device) / (right + 1)
+                weight[-right:] = th.minimum(weight[-right:], ramp)
+        weights.append(weight)
+    return weights
+
+
 def _replace_dict(_dict: tp.Optional[dict], *subs: tp.Tuple[tp.Hashable, tp.Any]) -> dict:
     if _dict is None:
         _dict = {}
@@ -141,6 +288,18 @@ def _replace_dict(_dict: tp.Optional[dict], *subs: tp.Tuple[tp.Hashable, tp.Any]
     return _dict
 
 
+def _trimmed_ready(ready_callback: tp.Callable[[int, th.Tensor], None],
+                   trim: int) -> tp.Callable[[int, th.Tensor], None]:
+    """Report ranges of an output whose first `trim` samples are dropped."""
+    def ready(offset: int, estimates: th.Tensor) -> None:
+        end = offset + estimates.shape[-1]
+        if end <= trim:
+            return
+        cut = max(0, trim - offset)
+        ready_callback(offset + cut - trim, estimates[..., cut:])
+    return ready
+
+
 def apply_model(model: tp.Union[BagOfModels, Model],
                 mix: tp.Union[th.Tensor, TensorChunk],
                 shifts: int = 1, split: bool = True,
@@ -149,7 +308,12 @@ def apply_model(model: tp.Union[BagOfModels, Model],
                 num_workers: int = 0, segment: tp.Optional[float] = None,
                 pool=None, lock=None,
                 callback: tp.Optional[tp.Callable[[dict], None]] = None,
-                callback_arg: tp.Optional[dict] = None) -> th.Tensor:
+                callback_arg: tp.Optional[dict] = None,
+                share_spec: bool = False,
+                silence_threshold: tp.Optional[float] = None,
+                min_overlap: tp.Optional[float] = None,
+                ready_callback: tp.Optional[tp.Callable[[int, th.Tensor], None]] = None
+                ) -> th.Tensor:
     """
     Apply model to a given mixture.
 
@@ -169,6 +333,24 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         num_workers (int): if non zero, device is 'cpu', how many threads to
             use in parallel.
         segment (float or None): override the model segment parameter.
+        share_spec (bool): for a bag of HDemucs/HTDemucs models, evaluate compatible
+            models together on each chunk, so that the mixture STFT and its normalization
+            are computed once and shared between models with the same STFT settings.
+            Those models then use the same random shifts.
+        silence_threshold (float or None): if provided (in dB relative to full scale, e.g. -70),
+            chunks whose loudest 50ms window has an RMS below this value are not passed
+            through the model, and all stems are set to zero there (requires split=True).
+            Skipped chunks are reported to `callback` with the state `"skip"`.
+        min_overlap (float or None): if provided, chunk boundaries are moved towards
+            quiet regions of the mix, where the overlap is reduced to `min_overlap`
+            (see `plan_segments`). This saves model evaluations compared to the fixed
+            grid with `overlap` everywhere (requires split=True).
+        ready_callback (callable or None): if provided, called with `(offset, estimates)`
+            for consecutive ranges of the output, as soon as every chunk overlapping a range
+            has been added in. Ranges arrive in order, cover the whole output and hold the
+            final values. Ranges are only reported progressively for a single pass over the
+            chunks: with `split=True`, at most one shift, and a bag of models evaluated as a
+            single group (see `share_spec`). Otherwise the whole output is reported at the end.
     """
     if device is None:
         device = mix.device
@@ -182,7 +364,8 @@ def apply_model(model: tp.Union[BagOfModels, Model],
     if lock is None:
         lock = Lock()
     callback_arg = _replace_dict(
-        callback_arg, *{"model_idx_in_bag": 0, "shift_idx": 0, "segment_offset": 0}.items()
+        callback_arg, *{"model_idx_in_bag": 0, "shift_idx": 0, "segment_offset": 0,
+                        "skipped_segments": 0}.items()
     )
     kwargs: tp.Dict[str, tp.Any] = {
         'shifts': shifts,
@@ -194,6 +377,9 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         'pool': pool,
         'segment': segment,
         'lock': lock,
+        'share_spec': share_spec,
+        'silence_threshold': silence_threshold,
+        'min_overlap': min_overlap,
     }
     out: tp.Union[float, th.Tensor]
     res: tp.Union[float, th.Tensor]
@@ -204,7 +390,16 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         estimates: tp.Union[float, th.Tensor] = 0.
         totals = [0.] * len(model.sources)
         callback_arg["models"] = len(model.models)
-        for sub_model, model_weights in zip(model.models, model.weights):
+        groups = _bag_groups(model, share_spec)
+        for group in groups:
+            sub_model: tp.Union[Model, _SharedSpecGroup]
+            if len(group) == 1:
+                sub_model = model.models[group[0]]
+                model_weights = model.weights[group[0]]
+            else:
+                sub_model = _SharedSpecGroup([model.models[idx] for idx in group],
+                                             [model.weights[idx] for idx in group])
+                model_weights = sub_model.totals
             kwargs["callback"] = ((
                     lambda d, i=callback_arg["model_idx_in_bag"]: callback(
                         _replace_dict(d, ("model_idx_in_bag", i))) if callback else None)
@@ -212,7 +407,9 @@ def apply_model(model: tp.Union[BagOfModels, Model],
             original_model_device = next(iter(sub_model.parameters())).device
             sub_model.to(device)
 
-            res = apply_model(sub_model, mix, **kwargs, callback_arg=callback_arg)
+            # A single group gives the final estimates (its weighted average) in one pass
+            res = apply_model(sub_model, mix, **kwargs, callback_arg=callback_arg,
+                              ready_callback=ready_callback if len(groups) == 1 else None)
             out = res
             sub_model.to(original_model_device)
             for k, inst_weight in enumerate(model_weights):
@@ -220,11 +417,13 @@ def apply_model(model: tp.Union[BagOfModels, Model],
                 totals[k] += inst_weight
             estimates += out
             del out
-            callback_arg["model_idx_in_bag"] += 1
+            callback_arg["model_idx_in_bag"] += len(group)
 
         assert isinstance(estimates, th.Tensor)
         for k in range(estimates.shape[1]):
             estimates[:, k, :, :] /= totals[k]
+        if ready_callback is not None and len(groups) > 1:
+            ready_callback(0, estimates)
         return estimates
 
     if "models" not in callback_arg:
@@ -247,11 +446,16 @@ def apply_model(model: tp.Union[BagOfModels, Model],
                     (lambda d, i=shift_idx: callback(_replace_dict(d, ("shift_idx", i)))
                      if callback else None)
                 )
-            res = apply_model(model, shifted, **kwargs, callback_arg=callback_arg)
+            res = apply_model(model, shifted, **kwargs, callback_arg=callback_arg,
+                              ready_callback=(
+                                  _trimmed_ready(ready_callback, max_shift - offset)
+                                  if ready_callback is not None and shifts == 1 else None))
             shifted_out = res
             out += shifted_out[..., max_shift - offset:]
         out /= shifts
         assert isinstance(out, th.Tensor)
+        if ready_callback is not None and shifts > 1:
+            ready_callback(0, out)
         return out
     elif split:
         kwargs['split'] = False
@@ -262,45 +466,82 @@ def apply_model(model: tp.Union[BagOfModels, Model],
         assert segment is not None and segment > 0.
         segment_length: int = int(model.samplerate * segment)
         stride = int((1 - overlap) * segment_length)
-        offsets = range(0, length, stride)
         scale = float(format(stride / model.samplerate, ".2f"))
-        # We start from a triangle shaped weight, with maximal weight in the middle
-        # of the segment. Then we normalize and take to the power `transition_power`.
-        # Large values of transition power will lead to sharper transitions.
-        weight = th.cat([th.arange(1, segment_length // 2 + 1, device=device),
-                         th.arange(segment_length - segment_length // 2, 0, -1, device=device)])
-        assert len(weight) == segment_length
-        # If the overlap < 50%, this will translate to linear transition when
-        # transition_power is 1.
-        weight = (weight / weight.max())**transition_power
+        segments: tp.List[tp.Tuple[int, int]]
+        weights: tp.List[th.Tensor]
+        if min_overlap is None:
+            segments = [(offset, min(segment_length, length - offset))
+                        for offset in range(0, length, stride)]
+            # We start from a triangle shaped weight, with maximal weight in the middle
+            # of the segment. Then we normalize and take to the power `transition_power`.
+            # Large values of transition power will lead to sharper transitions.
+            weight = th.cat([th.arange(1, segment_length // 2 + 1, device=device),
+                             th.arange(segment_length - segment_length // 2, 0, -1,
+                                       device=device)])
+            assert len(weight) == segment_length
+            # If the overlap < 50%, this will translate to linear transition when
+            # transition_power is 1.
+            weight = (weight / weight.max())**transition_power
+            weights = [weight[:chunk_length] for _, chunk_length in segments]
+        else:
+            segments = plan_segments(mix, segment_length, overlap, min_overlap,
+                                     model.samplerate // 40)
+            weights = [weight**transition_power
+                       for weight in _crossfade_weights(segments, device)]
+        skipped: tp.Set[int] = set()
+        if silence_threshold is not None:
+            skipped = _silent_offsets(mix, segments, silence_threshold, model.samplerate // 20)
         futures = []
-        for offset in offsets:
-            chunk = TensorChunk(mix, offset, segment_length)
+        for (offset, chunk_length), weight in zip(segments, weights):
+            if offset in skipped:
+                # The stems are zero here, but the weight still counts for the overlap-add
+                # so that the neighbouring chunks fade out consistently.
+                sum_weight[offset:offset + chunk_length] += weight.to(mix.device)
+                with lock:
+                    if callback is not None:
+                        callback(_replace_dict(
+                            callback_arg, ("segment_offset", offset), ("state", "skip"),
+                            ("skipped_segments", len(skipped))))
+                continue
+            chunk = TensorChunk(mix, offset, chunk_length)
             future = pool.submit(apply_model, model, chunk, **kwargs, callback_arg=callback_arg,
                                  callback=(lambda d, i=offset:
-                                           callback(_replace_dict(d, ("segment_offset", i)))
+                                           callback(_replace_dict(
+                                               d, ("segment_offset", i),
+                                               ("skipped_segments", len(skipped))))
                                            if callback else None))
-            futures.append((future, offset))
-            offset += segment_length
+            futures.append((future, offset, weight))
+        # Once a chunk is added, everything before the start of the next evaluated chunk is
+        # final: the chunks are in order and skipped chunks already hold their weight
+        ready_ends = [offset for _, offset, _ in futures[1:]] + [length]
+        ready_offset = 0
         if progress:
             futures = tqdm.tqdm(futures, unit_scale=scale, ncols=120, unit='seconds')
-        for future, offset in futures:
+            if skipped:
+                futures.set_postfix(skipped=len(skipped))
+        for (future, offset, weight), ready_end in zip(futures, ready_ends):
             try:
                 chunk_out = future.result()  # type: th.Tensor
             except Exception:
                 pool.shutdown(wait=True, cancel_futures=True)
                 raise
             chunk_length = chunk_out.shape[-1]
-            out[..., offset:offset + segment_length] += (
-                weight[:chunk_length] * chunk_out).to(mix.device)
-            sum_weight[offset:offset + segment_length] += weight[:chunk_length].to(mix.device)
+            out[..., offset:offset + chunk_length] += (weight * chunk_out).to(mix.device)
+            sum_weight[offset:offset + chunk_length] += weight.to(mix.device)
+            if ready_callback is not None and ready_end > ready_offset:
+                finished = out[..., ready_offset:ready_end] / sum_weight[ready_offset:ready_end]
+                ready_callback(ready_offset, finished)
+                ready_offset = ready_end
         assert sum_weight.min() > 0
         out /= sum_weight
         assert isinstance(out, th.Tensor)
+        if ready_callback is not None and ready_offset < length:
+            ready_callback(ready_offset, out[..., ready_offset:])
         return out
     else:
         valid_length: int
-        if isinstance(model, HTDemucs) and segment is not None:
+        base_model = model.models[0] if isinstance(model, _SharedSpecGroup) else model
+        if isinstance(base_model, HTDemucs) and segment is not None:
             valid_length = int(segment * model.samplerate)
         elif hasattr(model, 'valid_length'):
             valid_length = model.valid_length(length)  # type: ignore
@@ -318,4 +559,7 @@ def apply_model(model: tp.Union[BagOfModels, Model],
             if callback is not None:
                 callback(_replace_dict(callback_arg, ("state", "end")))  # type: ignore
         assert isinstance(out, th.Tensor)
-        return center_trim(out, length)
+        out = center_trim(out, length)
+        if ready_callback is not None:
+            ready_callback(0, out)
+        return out
@@ -686,20 +686,35 @@ class HDemucs(nn.Module):
         assert list(out.shape) == [B, S, C, Fq, T]
         return out.to(init)
 
-    def forward(self, mix):
-        x = mix
-        length = x.shape[-1]
+    def _spec_features(self, mix, spec_cache: tp.Optional[dict] = None):
+        """Return the mixture spectrogram `z`, the normalized freq. branch input,
+        and the `mean` and `std` used for the normalization.
 
+        `spec_cache` can be shared between models evaluated on the same `mix`
+        (see `demucs.apply.apply_model`), so that models with identical STFT settings
+        only compute those once. Models with different settings use a different key.
+        """
+        key = ('spec', self.nfft, self.hop_length, self.cac, self.hybrid, self.hybrid_old,
+               tuple(mix.shape))
+        if spec_cache is not None and key in spec_cache:
+            return spec_cache[key]
         z = self._spec(mix)
         mag = self._magnitude(z).to(mix.device)
-        x = mag
+        # unlike previous Demucs, we always normalize because it is easier.
+        mean = mag.mean(dim=(1, 2, 3), keepdim=True)
+        std = mag.std(dim=(1, 2, 3), keepdim=True)
+        x = (mag - mean) / (1e-5 + std)
+        features = (z, x, mean, std)
+        if spec_cache is not None:
+            spec_cache[key] = features
+        return features
+
+    def forward(self, mix, spec_cache: tp.Optional[dict] = None):
+        x = mix
+        length = x.shape[-1]
 
+        z, x, mean, std = self._spec_features(mix, spec_cache)
         B, C, Fq, T = x.shape
-
-        # unlike previous Demucs, we always normalize because it is easier.
-        mean = x.mean(dim=(1, 2, 3), keepdim=True)
-        std = x.std(dim=(1, 2, 3), keepdim=True)
-        x = (x - mean) / (1e-5 + std)
         # x will be the freq. branch input.
 
         if self.hybrid:
@@ -8,6 +8,7 @@
 This code contains the spectrogram and Hybrid version of Demucs.
 """
 import math
+import typing as tp
 
 from openunmix.filtering import wiener
 import torch
@@ -524,7 +525,26 @@ class HTDemucs(nn.Module):
                     f"training length {training_length}")
         return training_length
 
-    def forward(self, mix):
+    def _spec_features(self, mix, spec_cache: tp.Optional[dict] = None):
+        """Return the mixture spectrogram `z`, the normalized freq. branch input,
+        and the `mean` and `std` used for the normalization.
+        See `HDemucs._spec_features` for the use of `spec_cache`.
+        """
+        key = ("spec", self.nfft, self.hop_length, self.cac, True, False, tuple(mix.shape))
+        if spec_cache is not None and key in spec_cache:
+            return spec_cache[key]
+        z = self._spec(mix)
+        mag = self._magnitude(z).to(mix.device)
+        # unlike previous Demucs, we always normalize because it is easier.
+        mean = mag.mean(dim=(1, 2, 3), keepdim=True)
+        std = mag.std(dim=(1, 2, 3), keepdim=True)
+        x = (mag - mean) / (1e-5 + std)
+        features = (z, x, mean, std)
+        if spec_cache is not None:
+            spec_cache[key] = features
+        return features
+
+    def forward(self, mix, spec_cache: tp.Optional[dict] = None):
         length = mix.shape[-1]
         length_pre_pad = None
         if self.use_train_segment:
@@ -535,16 +555,8 @@ class HTDemucs(nn.Module):
                 if mix.shape[-1] < training_length:
                     length_pre_pad = mix.shape[-1]
                     mix = F.pad(mix, (0, training_length - length_pre_pad))
-        z = self._spec(mix)
-        mag = self._magnitude(z).to(mix.device)
-        x = mag
-
+        z, x, mean, std = self._spec_features(mix, spec_cache)
         B, C, Fq, T = x.shape
-
-        # unlike previous Demucs, we always normalize because it is easier.
-        mean = x.mean(dim=(1, 2, 3), keepdim=True)
-        std = x.std(dim=(1, 2, 3), keepdim=True)
-        x = (x - mean) / (1e-5 + std)
         # x will be the freq. branch input.
 
         # Prepare the time branch input.
@@ -0,0 +1,112 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""Eval only rewrite of trained models, see `optimize_for_inference`.
+"""
+from copy import deepcopy
+import typing as tp
+
+import torch
+from torch import nn
+
+from .apply import BagOfModels
+from .transformer import LayerScale, MyTransformerEncoderLayer, CrossTransformerEncoderLayer
+
+
+def _scale_first_half(module: nn.Module, scale: torch.Tensor):
+    # `module` feeds a GLU, whose output is `a * sigmoid(b)` with `a` the first half
+    # of the channels, so scaling the output of the GLU amounts to scaling `a`.
+    channels = len(scale)
+    shape = (-1,) + (1,) * (module.weight.dim() - 1)
+    module.weight.data[:channels] *= scale.view(shape)
+    if module.bias is not None:
+        module.bias.data[:channels] *= scale
+
+
+def _fold_sequential(seq: nn.Sequential) -> nn.Sequential:
+    """Fold each `LayerScale` following a GLU into the layer producing the GLU input,
+    and remove the `nn.Identity` layers standing for disabled normalizations."""
+    mods = list(seq)
+    for idx, mod in enumerate(mods):
+        if not isinstance(mod, LayerScale) or mod.channel_last:
+            continue
+        if idx < 2 or not isinstance(mods[idx - 1], nn.GLU) or mods[idx - 1].dim != 1:
+            continue
+        prev = idx - 2
+        while prev > 0 and isinstance(mods[prev], nn.Identity):
+            prev -= 1
+        target = mods[prev]
+        if isinstance(target, nn.GroupNorm):
+            if not target.affine:
+                continue
+        elif not isinstance(target, (nn.Conv1d, nn.Conv2d)):
+            continue
+        _scale_first_half(target, mod.scale.detach())
+        mods[idx] = nn.Identity()
+    mods = [mod for mod in mods if not isinstance(mod, nn.Identity)]
+    return nn.Sequential(*mods)
+
+
+def _scale_linear(linear: nn.Linear, scale: torch.Tensor):
+    linear.weight.data *= scale[:, None]
+    if linear.bias is not None:
+        linear.bias.data *= scale
+
+
+def _fold_transformer_layer(layer: nn.Module):
+    """Fold the `gamma_1` and `gamma_2` layer scales of a transformer layer into
+    the attention output projection and the last feed forward linear."""
+    attn = layer.self_attn if isinstance(layer, MyTransformerEncoderLayer) else layer.cross_attn
+    gamma_1 = layer.gamma_1
+    if isinstance(gamma_1, LayerScale):
+        if isinstance(attn, nn.MultiheadAttention):
+            _scale_linear(attn.out_proj, gamma_1.scale.detach())
+            layer.gamma_1 = nn.Identity()
+        elif hasattr(attn, 'proj'):
+            _scale_linear(attn.proj, gamma_1.scale.detach())
+            layer.gamma_1 = nn.Identity()
+    if isinstance(layer.gamma_2, LayerScale):
+        _scale_linear(layer.linear2, layer.gamma_2.scale.detach())
+        layer.gamma_2 = nn.Identity()
+
+
+def _optimize(model: nn.Module):
+    for module in list(model.modules()):
+        if isinstance(module, (MyTransformerEncoderLayer, CrossTransformerEncoderLayer)):
+            _fold_transformer_layer(module)
+        for name, child in module.named_children():
+            if isinstance(child, nn.Sequential):
+                setattr(module, name, _fold_sequential(child))
+
+
+ModelT = tp.TypeVar('ModelT', bound=nn.Module)
+
+
+def optimize_for_inference(model: ModelT) -> ModelT:
+    """
+    Return an eval only copy of `model` (`Demucs`, `HDemucs`, `HTDemucs` or a `BagOfModels`
+    of those) computing the same output with less work per layer:
+
+    - the `LayerScale` at the end of each `DConv` branch is folded into the GroupNorm
+        affine parameters (or the 1x1 convolution when normalization is disabled) feeding
+        the GLU,
+    - the `LayerScale` of the transformer layers are folded into the attention output
+        projection and the feed forward output linear,
+    - `nn.Identity` placeholders for disabled normalizations are removed from the
+        sequential blocks.
+
+    The returned model is in eval mode, with no gradients, and must not be trained:
+    dropout is assumed to be disabled and the parameter names no longer match
+    the original state dict. The original model is left untouched.
+    """
+    model = deepcopy(model)
+    model.eval()
+    model.requires_grad_(False)
+    if isinstance(model, BagOfModels):
+        for sub_model in model.models:
+            _optimize(sub_model)
+    else:
+        _optimize(model)
+    return model
@@ -19,6 +19,8 @@ from omegaconf import OmegaConf
 from dora.log import fatal
 import torch
 
+from .svd import svd_factorize
+
 
 def _check_diffq():
     try:
@@ -74,6 +76,10 @@ def load_model(path_or_package, strict=False):
                 del kwargs[key]
         model = klass(*args, **kwargs)
 
+    if package.get("lowrank"):
+        # Model factorized with `tools/lowrank.py`, restore the structure before the state.
+        svd_factorize(model, package["lowrank"], init=False)
+
     state = package["state"]
 
     set_state(model, state)
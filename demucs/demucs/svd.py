@@ -3,9 +3,12 @@
 #
 # This source code is licensed under the license found in the
 # LICENSE file in the root directory of this source tree.
-"""Ways to make the model stronger."""
+"""Ways to make the model stronger, and cheaper."""
 import random
+import typing as tp
+
 import torch
+from torch import nn
 
 
 def power_iteration(m, niters=1, bs=1):
@@ -81,3 +84,83 @@ def svd_penalty(model, min_size=0.1, dim=1, niters=2, powm=False, convtr=True,
                 estimate = torch.svd_lowrank(p, dim, niters)[1][0].pow(2)
             total += estimate
     return total / proba
+
+
+def _lowrank_candidates(model: nn.Module, min_size: float) -> tp.Iterator[tp.Tuple[str, nn.Module]]:
+    # Transposed convs are left out, as `MultiWrap` reads their bias directly, and so are
+    # the projections of `nn.MultiheadAttention`, whose weights are used functionally.
+    skip = set()
+    for name, m in model.named_modules():
+        if isinstance(m, nn.MultiheadAttention):
+            skip.update(f'{name}.{sub}' if name else sub for sub, _ in m.named_modules())
+    for name, m in model.named_modules():
+        if name in skip:
+            continue
+        if isinstance(m, (nn.Conv1d, nn.Conv2d)):
+            if m.groups != 1 or m.padding_mode != 'zeros':
+                continue
+        elif not isinstance(m, nn.Linear):
+            continue
+        if m.weight.numel() / 2**18 < min_size:
+            continue
+        yield name, m
+
+
+def svd_ranks(model: nn.Module, energy: float = 0.99,
+              min_size: float = 0.1) -> tp.Dict[str, int]:
+    """
+    Rank to use for each conv and linear layer of `model` so that the truncated SVD of its weight
+    keeps a fraction `energy` of the squared singular values. Layers for which the
+    factorization would not reduce the number of parameters are left out.
+    Args:
+        - model: model to factorize.
+        - energy: fraction of the energy of the weight to keep, between 0 and 1.
+        - min_size: minimum size in MB of a layer to factorize.
+    """
+    ranks = {}
+    for name, m in _lowrank_candidates(model, min_size):
+        weight = m.weight.detach().float().view(len(m.weight), -1)
+        sv = torch.linalg.svdvals(weight).pow(2)
+        cumulated = sv.cumsum(0) / sv.sum()
+        rank = int((cumulated < energy).sum()) + 1
+        rank = min(rank, len(sv))
+        if rank * sum(weight.shape) < weight.numel():
+            ranks[name] = rank
+    return ranks
+
+
+def _lowrank_pair(m: nn.Module, rank: int) -> nn.Sequential:
+    if isinstance(m, nn.Linear):
+        first: nn.Module = nn.Linear(m.in_features, rank, bias=False)
+        second: nn.Module = nn.Linear(rank, m.out_features, bias=m.bias is not None)
+    else:
+        klass = m.__class__
+        first = klass(m.in_channels, rank, m.kernel_size, m.stride, m.padding,
+                      m.dilation, bias=False)
+        second = klass(rank, m.out_channels, 1, bias=m.bias is not None)
+    return nn.Sequential(first, second).to(m.weight.device)
+
+
+def svd_factorize(model: nn.Module, ranks: tp.Dict[str, int], init: bool = True):
+    """
+    Replace in place each layer named in `ranks` (see `svd_ranks`) by a pair of layers:
+    the first one projects onto `rank` channels (with the original kernel for convolutions),
+    the second one is a 1x1 conv (or linear) back to the original number of channels.
+    If `init` is True, the pair is initialized from the truncated SVD of the original weight,
+    otherwise only the structure is changed, e.g. before loading a factorized state.
+    """
+    for name, rank in ranks.items():
+        parent_name, _, child = name.rpartition('.')
+        parent = model.get_submodule(parent_name)
+        m = getattr(parent, child)
+        pair = _lowrank_pair(m, rank)
+        if init:
+            weight = m.weight.detach().float().view(len(m.weight), -1)
+            u, s, vh = torch.linalg.svd(weight, full_matrices=False)
+            root = s[:rank].sqrt()
+            first, second = pair
+            first.weight.data[:] = (root[:, None] * vh[:rank]).view_as(first.weight)
+            second.weight.data[:] = (u[:, :rank] * root).view_as(second.weight)
+            if m.bias is not None:
+                second.bias.data[:] = m.bias.data
+        setattr(parent, child, pair)
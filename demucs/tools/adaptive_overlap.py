@@ -0,0 +1,103 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Compare the fixed overlap grid of `apply_model` with the energy aware chunk
+boundaries enabled by `min_overlap`, on a reference set of tracks.
+
+Each track is a folder laid out like the MusDB wav release, i.e. with a `mixture.wav`
+file and one wav file per source (e.g. `drums.wav`, `bass.wav` etc.). For each track,
+we report the number of chunks evaluated by the model and the nSDR of both variants.
+"""
+import argparse
+from pathlib import Path
+import time
+
+import torch as th
+import torchaudio as ta
+
+from demucs.apply import BagOfModels, apply_model, plan_segments
+from demucs.audio import convert_audio
+from demucs.pretrained import get_model
+
+
+def new_sdr(references, estimates):
+    """Same as `demucs.evaluate.new_sdr`, which we cannot import without musdb."""
+    delta = 1e-7  # avoid numerical errors
+    num = th.sum(th.square(references), dim=(2, 3)) + delta
+    den = th.sum(th.square(references - estimates), dim=(2, 3)) + delta
+    return 10 * th.log10(num / den)
+
+
+def load(path, model):
+    wav, sr = ta.load(str(path))
+    return convert_audio(wav, sr, model.samplerate, model.audio_channels)
+
+
+def count_chunks(model, mix, segment_length, overlap, min_overlap):
+    if min_overlap is None:
+        return len(range(0, mix.shape[-1], int((1 - overlap) * segment_length)))
+    window = model.samplerate // 40
+    return len(plan_segments(mix, segment_length, overlap, min_overlap, window))
+
+
+def main():
+    parser = argparse.ArgumentParser("adaptive_overlap", description=__doc__)
+    parser.add_argument("tracks", type=Path, nargs="+",
+                        help="Track folders, each with a mixture.wav and one wav per source.")
+    parser.add_argument("-n", "--name", default="htdemucs", help="Pretrained model name.")
+    parser.add_argument("--overlap", type=float, default=0.25)
+    parser.add_argument("--min_overlap", type=float, default=0.05)
+    parser.add_argument("--shifts", type=int, default=0)
+    parser.add_argument("-d", "--device", default="cpu")
+    args = parser.parse_args()
+
+    model = get_model(args.name)
+    model.eval()
+    models = model.models if isinstance(model, BagOfModels) else [model]
+    fixed_sdrs, adaptive_sdrs = [], []
+    fixed_total, adaptive_total = 0, 0
+    for track in args.tracks:
+        mix = load(track / "mixture.wav", model)
+        references = th.stack([load(track / f"{source}.wav", model) for source in model.sources])
+        ref = mix.mean(0)
+        mix = (mix - ref.mean()) / ref.std()
+
+        results = {}
+        for min_overlap in [None, args.min_overlap]:
+            begin = time.time()
+            estimates = apply_model(model, mix[None], shifts=args.shifts, overlap=args.overlap,
+                                    min_overlap=min_overlap, device=args.device)[0]
+            estimates = estimates * ref.std() + ref.mean()
+            chunks = 0
+            for sub_model in models:
+                segment_length = int(sub_model.samplerate * sub_model.segment)
+                chunks += max(1, args.shifts) * count_chunks(
+                    sub_model, mix[None], segment_length, args.overlap, min_overlap)
+            sdr = new_sdr(references[None], estimates[None])[0]
+            results[min_overlap] = (chunks, sdr, time.time() - begin)
+
+        fixed_chunks, fixed_sdr, fixed_time = results[None]
+        adaptive_chunks, adaptive_sdr, adaptive_time = results[args.min_overlap]
+        fixed_total += fixed_chunks
+        adaptive_total += adaptive_chunks
+        fixed_sdrs.append(fixed_sdr)
+        adaptive_sdrs.append(adaptive_sdr)
+        print(f"{track.name}: chunks {fixed_chunks} -> {adaptive_chunks}, "
+              f"time {fixed_time:.1f}s -> {adaptive_time:.1f}s, "
+              f"nSDR {fixed_sdr.mean():.3f} -> {adaptive_sdr.mean():.3f} dB")
+
+    fixed = th.stack(fixed_sdrs).mean(0)
+    adaptive = th.stack(adaptive_sdrs).mean(0)
+    saved = 1 - adaptive_total / max(1, fixed_total)
+    print(f"Chunks: {fixed_total} -> {adaptive_total} ({100 * saved:.1f}% fewer model calls)")
+    for idx, source in enumerate(model.sources):
+        print(f"nSDR {source}: {fixed[idx]:.3f} -> {adaptive[idx]:.3f} dB")
+    print(f"nSDR mean: {fixed.mean():.3f} -> {adaptive.mean():.3f} dB")
+
+
+if __name__ == "__main__":
+    main()
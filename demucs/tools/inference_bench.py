@@ -0,0 +1,87 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Per layer timing of a pretrained model, before and after `optimize_for_inference`.
+Also checks that both versions give the same output.
+"""
+import argparse
+from collections import defaultdict
+import time
+
+import torch
+
+from demucs.apply import BagOfModels
+from demucs.inference import optimize_for_inference
+from demucs.pretrained import get_model
+
+LAYERS = ['encoder', 'decoder', 'tencoder', 'tdecoder', 'crosstransformer']
+
+
+def time_layers(model, x, repeat):
+    """Return the average time in ms spent in each encoder/decoder layer (and in the
+    cross transformer for HTDemucs), along with the total time for the forward."""
+    timings = defaultdict(float)
+    starts = {}
+    handles = []
+    for name in LAYERS:
+        layers = getattr(model, name, None)
+        if layers is None:
+            continue
+        if isinstance(layers, torch.nn.ModuleList):
+            named = [(f"{name}.{idx}", layer) for idx, layer in enumerate(layers)]
+        else:
+            named = [(name, layers)]
+        for key, layer in named:
+            def pre_hook(module, args, key=key):
+                starts[key] = time.perf_counter()
+
+            def hook(module, args, output, key=key):
+                timings[key] += time.perf_counter() - starts[key]
+            handles.append(layer.register_forward_pre_hook(pre_hook))
+            handles.append(layer.register_forward_hook(hook))
+    with torch.no_grad():
+        model(x)  # warmup
+        timings.clear()
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            out = model(x)
+        total = time.perf_counter() - begin
+    for handle in handles:
+        handle.remove()
+    report = {key: 1000 * value / repeat for key, value in timings.items()}
+    report['total'] = 1000 * total / repeat
+    return report, out
+
+
+def main():
+    parser = argparse.ArgumentParser("inference_bench", description=__doc__)
+    parser.add_argument("-n", "--name", default="htdemucs", help="Pretrained model name.")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-t", "--threads", type=int, default=1)
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+
+    model = get_model(args.name)
+    models = model.models if isinstance(model, BagOfModels) else [model]
+    optimized = optimize_for_inference(model)
+    opt_models = optimized.models if isinstance(optimized, BagOfModels) else [optimized]
+    for idx, (sub_model, opt_model) in enumerate(zip(models, opt_models)):
+        sub_model.eval()
+        length = int(sub_model.segment * sub_model.samplerate)
+        if hasattr(sub_model, 'valid_length'):
+            length = sub_model.valid_length(length)
+        x = torch.randn(1, sub_model.audio_channels, length)
+        before, ref = time_layers(sub_model, x, args.repeat)
+        after, out = time_layers(opt_model, x, args.repeat)
+        error = (out - ref).abs().max().item()
+        print(f"Model {idx} ({sub_model.__class__.__name__}), max abs. difference {error:.2e}")
+        for key in before:
+            print(f"{key:<20} {before[key]:8.2f} ms -> {after[key]:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Factorize the large conv and linear layers of a pretrained model (or bag of models)
+into low rank pairs using a truncated SVD, and save the result as a local model repo,
+to be used with `demucs --repo OUT -n NAME_lr`.
+
+Reports the number of parameters, FLOPs and CPU latency of each model before and after,
+and the nSDR of both on reference tracks if provided (see `tools/adaptive_overlap.py`
+for the expected layout).
+"""
+import argparse
+from pathlib import Path
+import time
+
+import torch
+from torch import nn
+import yaml
+
+from demucs.apply import apply_model
+from demucs.pretrained import get_model, REMOTE_ROOT
+from demucs.states import get_state
+from demucs.svd import svd_factorize, svd_ranks
+from tools.adaptive_overlap import load, new_sdr
+
+
+def count_flops(model, x):
+    """Multiply-adds (x2) of the conv and linear layers for a forward on `x`."""
+    flops = 0
+
+    def hook(module, args, output):
+        nonlocal flops
+        if isinstance(module, nn.Linear):
+            flops += 2 * output.numel() * module.in_features
+        elif isinstance(module, (nn.ConvTranspose1d, nn.ConvTranspose2d)):
+            kernel = module.weight[0, 0].numel()
+            flops += 2 * args[0].numel() * module.out_channels * kernel // module.groups
+        else:
+            kernel = module.weight[0].numel()
+            flops += 2 * output.numel() * kernel
+
+    layers = (nn.Linear, nn.Conv1d, nn.Conv2d, nn.ConvTranspose1d, nn.ConvTranspose2d)
+    handles = [m.register_forward_hook(hook) for m in model.modules() if isinstance(m, layers)]
+    with torch.no_grad():
+        model(x)
+    for handle in handles:
+        handle.remove()
+    return flops
+
+
+def latency(model, x, repeat):
+    with torch.no_grad():
+        model(x)
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            model(x)
+    return (time.perf_counter() - begin) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser("lowrank", description=__doc__)
+    parser.add_argument("-n", "--name", default="htdemucs",
+                        help="Pretrained model name or signature.")
+    parser.add_argument("--repo", type=Path, help="Local repo to load the model from.")
+    parser.add_argument("-o", "--out", type=Path, default=Path("lowrank_models"))
+    parser.add_argument("-e", "--energy", type=float, default=0.99,
+                        help="Fraction of the squared singular values to keep.")
+    parser.add_argument("--min_size", type=float, default=0.1,
+                        help="Minimum size in MB of a layer to factorize.")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("--tracks", type=Path, nargs="*", default=[],
+                        help="Reference track folders for the nSDR.")
+    args = parser.parse_args()
+    torch.set_num_threads(1)
+    args.out.mkdir(exist_ok=True, parents=True)
+
+    bag_file = (args.repo or REMOTE_ROOT) / f"{args.name}.yaml"
+    if bag_file.exists():
+        bag = yaml.safe_load(open(bag_file))
+    else:
+        bag = {'models': [args.name]}
+
+    signatures = []
+    for sig in bag['models']:
+        model = get_model(sig, args.repo)
+        model.eval()
+        length = int(model.segment * model.samplerate)
+        if hasattr(model, 'valid_length'):
+            length = model.valid_length(length)
+        x = torch.randn(1, model.audio_channels, length)
+        before = (sum(p.numel() for p in model.parameters()), count_flops(model, x),
+                  latency(model, x, args.repeat))
+
+        ranks = svd_ranks(model, args.energy, args.min_size)
+        svd_factorize(model, ranks)
+        after = (sum(p.numel() for p in model.parameters()), count_flops(model, x),
+                 latency(model, x, args.repeat))
+
+        model_args, model_kwargs = model._init_args_kwargs
+        pkg = {
+            'klass': model.__class__,
+            'args': model_args,
+            'kwargs': model_kwargs,
+            'state': get_state(model, None, half=True),
+            'lowrank': ranks,
+        }
+        lr_sig = sig + 'lr'
+        torch.save(pkg, args.out / f"{lr_sig}.th")
+        signatures.append(lr_sig)
+        print(f"{sig}: {len(ranks)} layers factorized")
+        print(f"  params  {before[0] / 1e6:8.2f} M -> {after[0] / 1e6:8.2f} M")
+        print(f"  FLOPs   {before[1] / 1e9:8.2f} G -> {after[1] / 1e9:8.2f} G")
+        print(f"  latency {before[2] * 1000:8.1f} ms -> {after[2] * 1000:8.1f} ms")
+
+    lr_name = args.name + '_lr'
+    bag['models'] = signatures
+    with open(args.out / f"{lr_name}.yaml", "w") as f:
+        yaml.safe_dump(bag, f)
+
+    if args.tracks:
+        original = get_model(args.name, args.repo)
+        factorized = get_model(lr_name, args.out)
+        sdrs: dict = {'original': [], 'lowrank': []}
+        for track in args.tracks:
+            mix = load(track / "mixture.wav", original)
+            references = torch.stack(
+                [load(track / f"{source}.wav", original) for source in original.sources])
+            ref = mix.mean(0)
+            mix = (mix - ref.mean()) / ref.std()
+            for key, model in [('original', original), ('lowrank', factorized)]:
+                estimates = apply_model(model, mix[None], shifts=0)[0]
+                estimates = estimates * ref.std() + ref.mean()
+                sdrs[key].append(new_sdr(references[None], estimates[None])[0])
+        for key, values in sdrs.items():
+            print(f"nSDR {key}: {torch.stack(values).mean():.3f} dB")
+    print(f"Saved as {lr_name} in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -86,7 +86,10 @@ def classify_prompt(prompt: str) -> dict:
         - "extract vocals and drums" → {"type": "separation", "stems": ["vocals", "drums"]}
         - "separate other", "give me other", "isolate other" → {"type": "separation", "stems": ["other"]}
         - "give me that other category" → {"type": "separation", "stems": ["other"]}
+        - "give me the vocals from the chorus at 1:00 to 1:30" → {"type": "separation", "stems": ["vocals"], "start": 60, "end": 90}
+        - "drums of the first 20 seconds" → {"type": "separation", "stems": ["drums"], "start": 0, "end": 20}
 
+        - Only include "start" and "end" (in seconds) when the user asks for a specific part of the track.
         - If user requests unsupported stems (e.g. trumpet, piano, guitar), return: {"type": "clarification", "reason": "unsupported_stem", "requested_stem": "trumpet"}
         - If none are valid, return: {"type": "separation", "stems": []}
 
@@ -52,3 +52,16 @@ def save_file_to_db(session_id: str, file_type: str, path: str, stem: str = None
         db.add(file)
         db.commit()
 
+
+def get_file_owners() -> list[tuple[str, str]]:
+    """(path, session id) of every file row, to know who a file on disk belongs to."""
+    with get_session() as db:
+        return [(f.path, f.session_id) for f in db.query(File).all()]
+
+def delete_files_by_path(paths: list[str]):
+    """Drop the file rows of files removed from disk."""
+    if not paths:
+        return
+    with get_session() as db:
+        db.query(File).filter(File.path.in_(paths)).delete(synchronize_session=False)
+        db.commit()
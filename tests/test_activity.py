@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+try:
+    from pydub import AudioSegment
+    from pydub.silence import detect_silence
+    from audio_utils.activity import frame_levels_db, window_levels_db, is_silent, mute_inaudible
+    ACTIVITY_AVAILABLE = True
+except ImportError:
+    ACTIVITY_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not ACTIVITY_AVAILABLE, reason="Activity dependencies not available")
+
+SR = 8000
+
+
+def _segment(array):
+    pcm = (np.clip(array, -1, 1).T * 32767).astype("<i2")
+    return AudioSegment(pcm.tobytes(), frame_rate=SR, sample_width=2, channels=array.shape[0])
+
+
+def _pydub_silent(array):
+    audio = _segment(array)
+    ranges = detect_silence(audio, min_silence_len=1000, silence_thresh=-40)
+    return sum(end - start for start, end in ranges) >= len(audio)
+
+
+def _signal(level_db, seconds=3.0, burst=None):
+    rng = np.random.default_rng(0)
+    noise = rng.standard_normal((2, int(seconds * SR)))
+    noise *= 10 ** (level_db / 20) / np.sqrt(np.mean(noise ** 2))
+    if burst is not None:
+        noise[:, int(burst * SR):int((burst + 0.5) * SR)] *= 100
+    return noise.astype(np.float32)
+
+
+@pytest.mark.parametrize("level_db, burst", [(-60, None), (-30, None), (-70, 1.2), (-45, None)])
+def test_matches_pydub_detect_silence(level_db, burst):
+    array = _signal(level_db, burst=burst)
+
+    assert is_silent(frame_levels_db(array, SR)) == _pydub_silent(array)
+
+
+def test_frame_levels():
+    array = np.full((2, SR), 0.5, dtype=np.float32)
+    array[:, SR // 2:] = 0.0
+
+    levels = frame_levels_db(array, SR, hop_ms=100)
+
+    assert len(levels) == 10
+    assert np.allclose(levels[:5], 20 * np.log10(0.5), atol=1e-3)
+    assert np.all(levels[5:] < -150)
+
+
+def test_window_levels_average_power():
+    levels = np.array([0.0, -200.0], dtype=np.float32)
+
+    assert np.allclose(window_levels_db(levels, 2), 10 * np.log10(0.5))
+    assert np.allclose(window_levels_db(levels, 5), 10 * np.log10(0.5))
+
+
+def test_mute_inaudible_stems():
+    levels = {"vocals": frame_levels_db(_signal(-20), SR), "bass": frame_levels_db(_signal(-90), SR)}
+    instructions = {"volumes": {"vocals": 1.2, "bass": 1.5}}
+
+    muted = mute_inaudible(instructions, levels)
+
+    assert muted["volumes"] == {"vocals": 1.2, "bass": 0.0}
+    assert instructions["volumes"]["bass"] == 1.5
+    assert mute_inaudible(instructions, {"vocals": levels["vocals"]}) is instructions
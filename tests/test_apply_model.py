@@ -0,0 +1,206 @@
+import pytest
+import torch
+
+try:
+    from demucs.demucs.apply import BagOfModels, apply_model, plan_segments
+    from demucs.demucs.hdemucs import HDemucs
+    DEMUCS_AVAILABLE = True
+except ImportError:
+    DEMUCS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not DEMUCS_AVAILABLE, reason="Demucs dependencies not available")
+
+SOURCES = ["drums", "bass", "other", "vocals"]
+
+
+def _small_hdemucs(seed, **kwargs):
+    torch.manual_seed(seed)
+    model = HDemucs(SOURCES, channels=4, depth=4, nfft=256, segment=0.05, **kwargs)
+    return model.eval()
+
+
+@pytest.fixture
+def mix():
+    torch.manual_seed(0)
+    return torch.randn(1, 2, 8000)
+
+
+@pytest.fixture
+def bag():
+    models = [_small_hdemucs(1), _small_hdemucs(2), _small_hdemucs(3, cac=False)]
+    weights = [[1., 2., 1., 0.5], [1., 1., 0., 0.5], [0.5, 1., 1., 1.]]
+    return BagOfModels(models, weights)
+
+
+def test_share_spec_matches_per_model_outputs(bag, mix):
+    reference = apply_model(bag, mix, shifts=0, split=True, overlap=0.25)
+    shared = apply_model(bag, mix, shifts=0, split=True, overlap=0.25, share_spec=True)
+
+    assert shared.shape == reference.shape
+    assert torch.allclose(shared, reference, atol=1e-5)
+
+
+def test_share_spec_computes_stft_once_per_settings(bag, mix, monkeypatch):
+    calls = []
+    original = HDemucs._spec
+
+    def counting_spec(self, x):
+        calls.append(self.cac)
+        return original(self, x)
+
+    monkeypatch.setattr(HDemucs, "_spec", counting_spec)
+
+    apply_model(bag, mix, shifts=0, split=True, overlap=0.25)
+    per_model = list(calls)
+    calls.clear()
+    apply_model(bag, mix, shifts=0, split=True, overlap=0.25, share_spec=True)
+
+    chunks = per_model.count(False)
+    assert chunks > 1
+    # The two models with identical STFT settings share a single STFT per chunk,
+    # the model without complex-as-channels falls back to its own.
+    assert calls.count(True) == chunks
+    assert calls.count(False) == chunks
+
+
+@pytest.fixture
+def mix_with_silence():
+    torch.manual_seed(0)
+    mix = torch.randn(1, 2, 30000) * 0.1
+    mix[..., 6000:24000] = 0.
+    return mix
+
+
+def test_silent_chunks_are_skipped(mix_with_silence):
+    model = _small_hdemucs(1)
+    segment_length = int(model.samplerate * model.segment)
+    stride = int(0.75 * segment_length)
+    events = []
+
+    reference = apply_model(model, mix_with_silence, shifts=0, split=True, overlap=0.25)
+    out = apply_model(model, mix_with_silence, shifts=0, split=True, overlap=0.25,
+                      silence_threshold=-70, callback=events.append)
+
+    skipped = [e["segment_offset"] for e in events if e["state"] == "skip"]
+    ended = [e["segment_offset"] for e in events if e["state"] == "end"]
+    assert skipped
+    assert all(e["skipped_segments"] == len(skipped) for e in events)
+    assert len(skipped) + len(ended) == len(range(0, mix_with_silence.shape[-1], stride))
+
+    untouched = torch.ones(mix_with_silence.shape[-1], dtype=torch.bool)
+    for offset in skipped:
+        assert 6000 <= offset and offset + segment_length <= 24000
+        untouched[offset:offset + segment_length] = False
+    processed = torch.zeros_like(untouched)
+    for offset in ended:
+        processed[offset:offset + segment_length] = True
+    assert torch.allclose(out[..., untouched], reference[..., untouched], atol=1e-6)
+    assert (out[..., ~processed] == 0).all()
+
+
+def test_silence_threshold_keeps_quiet_but_audible_chunks(mix_with_silence):
+    model = _small_hdemucs(1)
+    mix_with_silence[..., 9000:9200] = 0.01  # short -40 dBFS blip inside the silence
+    events = []
+
+    apply_model(model, mix_with_silence, shifts=0, split=True, overlap=0.25,
+                silence_threshold=-70, callback=events.append)
+
+    segment_length = int(model.samplerate * model.segment)
+    skipped = [e["segment_offset"] for e in events if e["state"] == "skip"]
+    assert skipped
+    for offset in skipped:
+        assert not offset <= 9000 < offset + segment_length
+
+
+def test_plan_segments_keeps_fixed_grid_without_quiet_regions(mix):
+    segments = plan_segments(mix, 2000, 0.25, 0.05, 100)
+
+    assert [offset for offset, _ in segments] == list(range(0, mix.shape[-1] - 500, 1500))
+    assert all(length == min(2000, mix.shape[-1] - offset) for offset, length in segments)
+
+
+def test_plan_segments_cuts_in_quiet_regions():
+    torch.manual_seed(0)
+    mix = torch.randn(1, 2, 40000)
+    for start in range(1800, 40000, 2000):
+        mix[..., start:start + 300] *= 1e-3
+    segments = plan_segments(mix, 2000, 0.25, 0.05, 100)
+
+    assert len(segments) < len(plan_segments(mix, 2000, 0.25, 0.25, 100))
+    covered = torch.zeros(mix.shape[-1], dtype=torch.bool)
+    for (offset, length), (next_offset, _) in zip(segments, segments[1:]):
+        assert length <= 2000
+        assert offset + length - next_offset >= 100
+    for offset, length in segments:
+        covered[offset:offset + length] = True
+    assert covered.all()
+
+
+def test_min_overlap_matches_fixed_grid_output():
+    model = _small_hdemucs(1)
+    torch.manual_seed(0)
+    mix = torch.randn(1, 2, 200000) * 0.1
+    for start in range(17000, mix.shape[-1], 20000):
+        mix[..., start:start + 5000] = 0.
+    events = []
+
+    reference = apply_model(model, mix, shifts=0, split=True, overlap=0.25, segment=0.5)
+    out = apply_model(model, mix, shifts=0, split=True, overlap=0.25, segment=0.5,
+                      min_overlap=0.05, callback=events.append)
+
+    chunks = len([e for e in events if e["state"] == "end"])
+    assert chunks < len(plan_segments(mix, 22050, 0.25, 0.25, model.samplerate // 40))
+    assert out.shape == reference.shape
+    assert torch.isfinite(out).all()
+    error = (out - reference).pow(2).sum() / reference.pow(2).sum()
+    assert error < 0.1
+
+
+def _collect_ranges():
+    ranges = []
+    return ranges, lambda offset, estimates: ranges.append((offset, estimates.clone()))
+
+
+def _assert_ranges_cover(ranges, out):
+    offsets = [offset for offset, _ in ranges]
+    ends = [offset + estimates.shape[-1] for offset, estimates in ranges]
+    assert offsets[0] == 0 and ends[-1] == out.shape[-1]
+    assert offsets[1:] == ends[:-1]
+    assert torch.allclose(torch.cat([estimates for _, estimates in ranges], dim=-1), out, atol=1e-6)
+
+
+@pytest.mark.parametrize("shifts", [0, 1])
+def test_ready_ranges_arrive_progressively(mix_with_silence, shifts):
+    model = _small_hdemucs(1)
+    ranges, ready = _collect_ranges()
+    events = []
+
+    def on_chunk(event):
+        if event["state"] == "end":
+            events.append(("chunk", event["segment_offset"]))
+
+    def on_ready(offset, estimates):
+        events.append(("ready", offset))
+        ready(offset, estimates)
+
+    out = apply_model(model, mix_with_silence, shifts=shifts, split=True, overlap=0.25,
+                      silence_threshold=-70, callback=on_chunk, ready_callback=on_ready)
+
+    _assert_ranges_cover(ranges, out)
+    assert len(ranges) > 2
+    # The first range is available before the last chunk is evaluated
+    assert events.index(("ready", 0)) < max(i for i, event in enumerate(events) if event[0] == "chunk")
+
+
+def test_ready_ranges_for_bags(bag, mix):
+    ranges, ready = _collect_ranges()
+    shared = apply_model(bag, mix, shifts=0, split=True, overlap=0.25, share_spec=True, ready_callback=ready)
+    _assert_ranges_cover(ranges, shared)
+    assert len(ranges) > 1
+
+    # Models evaluated one after the other only have final values at the end
+    ranges, ready = _collect_ranges()
+    separate = apply_model(bag, mix, shifts=0, split=True, overlap=0.25, ready_callback=ready)
+    _assert_ranges_cover(ranges, separate)
+    assert len(ranges) == 1
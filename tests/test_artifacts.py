@@ -0,0 +1,81 @@
+import os
+import pytest
+
+try:
+    from audio_utils.artifacts import ArtifactManager, MIN_AGE_SECONDS
+    ARTIFACTS_AVAILABLE = True
+except ImportError:
+    ARTIFACTS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not ARTIFACTS_AVAILABLE, reason="Artifact manager not available")
+
+NOW = 1_000_000.0
+
+
+@pytest.fixture
+def root(tmp_path):
+    return tmp_path / "separated"
+
+
+def write(root, name, size, age, manager=None, session_id=None):
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\0" * size)
+    if manager is not None:
+        manager.track(str(path), session_id)
+    os.utime(path, (NOW - age, NOW - age))
+    return os.path.normpath(str(path))
+
+
+def test_collect_evicts_least_recently_used_first(root):
+    evicted = []
+    manager = ArtifactManager(str(root), budget=250, on_evict=evicted.extend)
+    old = write(root, "old.flac", 100, age=3000)
+    middle = write(root, "stems/key/vocals.npy", 100, age=2000)
+    new = write(root, "new.flac", 100, age=1000)
+
+    removed = manager.collect(now=NOW)
+
+    assert removed == [old] and evicted == [old]
+    assert os.path.exists(middle) and os.path.exists(new)
+    assert manager.stats()["bytes"] == 200 and manager.stats()["evicted_bytes"] == 100
+
+    assert manager.collect(budget=100, now=NOW) == [middle]
+    assert not os.path.exists(root / "stems")
+
+
+def test_collect_keeps_recent_and_partial_files(root):
+    manager = ArtifactManager(str(root), budget=0)
+    write(root, "fresh.flac", 100, age=MIN_AGE_SECONDS / 2)
+    write(root, "remix.flac.1a2b3c4d.tmp", 100, age=3000)
+
+    assert manager.collect(now=NOW) == []
+    assert manager.stats()["files"] == 1
+
+
+def test_release_session_keeps_shared_files(root):
+    evicted = []
+    manager = ArtifactManager(str(root), budget=1 << 30, on_evict=evicted.extend)
+    shared = write(root, "song_converted.wav", 10, age=10, manager=manager, session_id="a")
+    manager.track(shared, "b")
+    own = write(root, "remix_vol_abc123.flac", 10, age=10, manager=manager, session_id="a")
+    store = write(root, "stems/key/bass.npy", 10, age=10, manager=manager)
+
+    assert manager.release_session("a") == [own] and evicted == [own]
+    assert os.path.exists(shared) and os.path.exists(store)
+    assert manager.owners(shared) == {"b"}
+    assert manager.release_session("b") == [shared]
+
+
+def test_touch_marks_use_and_stays_inside_root(root, tmp_path):
+    manager = ArtifactManager(str(root), budget=0)
+    path = write(root, "a.flac", 10, age=3000)
+    outside = tmp_path / "outside.txt"
+    outside.write_bytes(b"x")
+    os.utime(outside, (1, 1))
+
+    manager.touch(path)
+    manager.touch(str(root / ".." / "outside.txt"))
+
+    assert os.path.getmtime(path) > NOW
+    assert os.path.getmtime(outside) == 1
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+try:
+    from audio_utils.cache import ArrayCache, content_hash
+    CACHE_AVAILABLE = True
+except ImportError:
+    CACHE_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not CACHE_AVAILABLE, reason="Cache dependencies not available")
+
+
+def test_content_hash_depends_on_samples_and_shape():
+    a = np.zeros((2, 100), dtype=np.float32)
+    b = a.copy()
+    b[1, 50] = 1e-6
+
+    assert content_hash(a) == content_hash(a.copy())
+    assert content_hash(a) != content_hash(b)
+    assert content_hash(a) != content_hash(a.reshape(4, 50))
+
+
+def test_array_cache_evicts_least_recently_used():
+    cache = ArrayCache(max_bytes=3 * 400)
+    for key in "abc":
+        cache.put(key, np.zeros(100, dtype=np.float32))
+    cache.get("a")
+    cache.put("d", np.zeros(100, dtype=np.float32))
+
+    assert "a" in cache and "b" not in cache
+    assert cache.size == 3 * 400
+
+
+def test_array_cache_entries_are_read_only():
+    cache = ArrayCache(max_bytes=1 << 20)
+    value = cache.put("x", (np.ones(4), np.ones(2)))
+
+    assert not value[0].flags.writeable
+    assert cache.get("x") is value
+    assert cache.get("y") is None
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+try:
+    from audio_utils import codecs
+    from audio_utils.codecs import (
+        available_formats, encode, encode_to_file, submit_encode, audition_name, sources, output_format,
+        submit_audition,
+        OPUS_SAMPLE_RATE, AUDITION_FORMAT, AUDITION_BITRATE,
+    )
+    CODECS_AVAILABLE = True
+except ImportError:
+    CODECS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not CODECS_AVAILABLE, reason="Codec dependencies not available")
+
+SR = 44100
+
+
+@pytest.fixture
+def audio():
+    t = np.arange(2 * SR) / SR
+    tones = np.stack([np.sin(2 * np.pi * 440 * t), np.sin(2 * np.pi * 550 * t)])
+    return (0.3 * tones).astype(np.float32)
+
+
+@pytest.mark.parametrize("fmt", ["wav", "flac"])
+def test_lossless_formats_round_trip_16_bit(audio, fmt, tmp_path):
+    report = encode_to_file(str(tmp_path / f"out.{fmt}"), audio, SR, fmt)
+    data, sr = sf.read(report["path"], dtype="int16")
+
+    assert sr == SR
+    assert np.array_equal(data.T, (audio * 32767).round().astype(np.int16))
+
+
+def test_flac_is_smaller_than_wav(audio, tmp_path):
+    wav = encode_to_file(str(tmp_path / "out.wav"), audio, SR, "wav")
+    flac = encode_to_file(str(tmp_path / "out.flac"), audio, SR, "flac")
+
+    assert flac["bytes"] < wav["bytes"]
+    assert flac["ratio"] > 1.0 and wav["ratio"] == pytest.approx(1.0, rel=1e-3)
+
+
+@pytest.mark.parametrize("fmt", ["mp3", "opus"])
+def test_lossy_formats(audio, fmt, tmp_path):
+    if fmt not in available_formats():
+        pytest.skip(f"{fmt} encoder not available")
+    report = encode_to_file(str(tmp_path / f"out.{fmt}"), audio, SR, fmt)
+
+    assert report["ratio"] > 4
+    if fmt == "opus":
+        data, sr = sf.read(report["path"], dtype="float32")
+        assert sr == OPUS_SAMPLE_RATE
+        assert abs(len(data) - 2 * OPUS_SAMPLE_RATE) < OPUS_SAMPLE_RATE // 100
+
+
+def test_unknown_format_is_rejected(audio):
+    with pytest.raises(ValueError):
+        encode(audio, SR, "aiff")
+
+
+def test_configured_output_format_is_checked():
+    assert output_format("flac") == "flac"
+    with pytest.raises(ValueError, match="Unsupported output format: aac"):
+        output_format("aac")
+
+
+def test_submit_encode_reports(audio, tmp_path):
+    futures = [submit_encode(str(tmp_path / f"{i}.flac"), audio, SR, "flac") for i in range(3)]
+    reports = [future.result() for future in futures]
+
+    assert [r["path"] for r in reports] == [str(tmp_path / f"{i}.flac") for i in range(3)]
+    assert all(r["seconds"] > 0 and r["realtime"] > 0 for r in reports)
+
+
+def test_audition_encode_is_low_bitrate(audio, tmp_path):
+    if AUDITION_FORMAT is None:
+        pytest.skip("No lossy encoder available")
+    report = encode_to_file(str(tmp_path / audition_name("out.flac")), audio, SR, AUDITION_FORMAT, AUDITION_BITRATE)
+
+    assert report["path"].endswith(f"out_audition.{AUDITION_FORMAT}")
+    # 16-bit stereo PCM is about 1411 kbps
+    assert report["ratio"] > 12
+
+
+def test_sources_list_audition_first():
+    urls = [source["url"] for source in sources("/downloads/a_audition.mp3", "/downloads/a.flac", "flac")]
+
+    assert urls == ["/downloads/a_audition.mp3", "/downloads/a.flac"]
+
+
+def test_outputs_play_from_the_file_without_a_lossy_encoder(audio, tmp_path, monkeypatch):
+    monkeypatch.setattr(codecs, "AUDITION_FORMAT", None)
+
+    assert audition_name("out.flac") is None
+    assert submit_audition(str(tmp_path / "out_audition.mp3"), audio, SR) is None
+    assert sources(None, "/downloads/a.flac", "flac") == [{"url": "/downloads/a.flac", "type": "audio/flac"}]
@@ -8,8 +8,7 @@ from llm_backend.interpreter import classify_prompt, apply_feedback_to_instructi
 
 try:
     from audio_utils.remix import (
-        handle_remix, apply_gain_scaling, apply_reverb_pydub,
-        change_pitch_pydub, apply_compression_pydub, generate_remix_name
+        handle_remix, apply_gain_scaling, generate_remix_name
     )
     REMIX_AVAILABLE = True
 except ImportError:
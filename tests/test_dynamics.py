@@ -0,0 +1,106 @@
+import shutil
+import numpy as np
+import pytest
+
+try:
+    from audio_utils.dynamics import static_gain_db, compress, limit, compress_blocks, limit_blocks
+    from audio_utils.effects import _run_ffmpeg_filter
+    DYNAMICS_AVAILABLE = True
+except ImportError:
+    DYNAMICS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not DYNAMICS_AVAILABLE, reason="Dynamics dependencies not available")
+
+SR = 44100
+
+
+def _sine(level_db, duration=1.0, frequency=440.0):
+    t = np.arange(int(duration * SR)) / SR
+    tone = 10 ** (level_db / 20) * np.sin(2 * np.pi * frequency * t)
+    return np.stack([tone, tone]).astype(np.float32)
+
+
+def _peak_db(array):
+    return 20 * np.log10(np.max(np.abs(array)))
+
+
+def test_static_curve():
+    levels = np.array([-40.0, -20.0, -10.0, 0.0])
+    gain = static_gain_db(levels, threshold=-20, ratio=4)
+
+    assert np.allclose(levels + gain, [-40.0, -20.0, -17.5, -15.0])
+
+
+def test_soft_knee_is_continuous():
+    levels = np.linspace(-30, -10, 2001)
+    gain = static_gain_db(levels, threshold=-20, ratio=4, knee=6)
+
+    assert np.max(np.abs(np.diff(gain))) < 0.01
+    # The knee joins the hard knee curve at its edges
+    edges = [-23.0, -17.0]
+    assert np.allclose(static_gain_db(edges, -20, 4, 6), static_gain_db(edges, -20, 4))
+
+
+@pytest.mark.parametrize("threshold,ratio", [(-30, 2), (-20, 4), (-10, 8)])
+def test_steady_state_gain_reduction(threshold, ratio):
+    out = compress(_sine(-6.0, duration=3.0), SR, threshold=threshold, ratio=ratio, knee=0)
+    expected = threshold + (-6.0 - threshold) / ratio
+
+    assert abs(_peak_db(out[:, -SR // 2:]) - expected) < 0.3
+
+
+def test_attack_time_constant():
+    quiet, loud = _sine(-40.0, 0.5), _sine(-6.0, 1.0)
+    out = compress(np.concatenate([quiet, loud], axis=1), SR, threshold=-20, ratio=4,
+                   attack=20, release=250, knee=0)
+
+    start = quiet.shape[1]
+    final_reduction = -6.0 - (-20 + 14 / 4)
+    after_attack = out[:, start + int(0.02 * SR) - 200:start + int(0.02 * SR) + 200]
+    reduction = -6.0 - _peak_db(after_attack)
+    # One time constant: about 63% of the final gain reduction
+    assert 0.5 * final_reduction < reduction < 0.75 * final_reduction
+
+
+def test_makeup_gain():
+    out = compress(_sine(-40.0), SR, threshold=-20, ratio=4, makeup_db=6)
+
+    assert abs(_peak_db(out) - -34.0) < 0.1
+
+
+def test_limiter_never_exceeds_ceiling():
+    rng = np.random.default_rng(0)
+    mix = (rng.standard_normal((2, SR)) * 0.5).astype(np.float32)
+
+    out = limit(mix, SR, ceiling_db=-1.0)
+
+    assert np.max(np.abs(out)) <= 10 ** (-1.0 / 20) + 1e-7
+    assert np.corrcoef(out[0], mix[0])[0, 1] > 0.9
+
+
+def test_limiter_leaves_quiet_signal_untouched():
+    quiet = _sine(-12.0)
+
+    assert np.array_equal(limit(quiet, SR, ceiling_db=-0.3), quiet)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not available")
+def test_steady_state_matches_ffmpeg_compand():
+    signal = _sine(-6.0, duration=3.0)
+    reference = _run_ffmpeg_filter(signal, SR, "compand=attacks=0.02:decays=0.25:points=-20/-20|0/-15")
+    out = compress(signal, SR, threshold=-20, ratio=4, knee=0)
+
+    assert abs(_peak_db(out[:, -SR // 2:]) - _peak_db(reference[:, -SR // 2:])) < 1.0
+
+
+def test_block_processing_matches_whole_signal():
+    rng = np.random.default_rng(0)
+    signal = (0.3 * rng.standard_normal((2, SR))).astype(np.float32)
+    signal[:, SR // 3:SR // 2] *= 5
+    chunks = [signal[:, i:i + 4096] for i in range(0, SR, 4096)]
+
+    compressed = np.concatenate(list(compress_blocks(chunks, SR, threshold=-20, ratio=4)), axis=-1)
+    limited = np.concatenate(list(limit_blocks(chunks, SR)), axis=-1)
+
+    assert np.allclose(compressed, compress(signal, SR, threshold=-20, ratio=4), atol=1e-6)
+    assert np.allclose(limited, limit(signal, SR), atol=1e-6)
@@ -0,0 +1,105 @@
+import shutil
+import numpy as np
+import pytest
+
+try:
+    from scipy.signal import sosfreqz
+    from audio_utils.filters import biquad_coefficients, apply_sos, sos_blocks
+    from audio_utils.effects import _run_ffmpeg_filter, apply_eq, apply_filter, apply_bandpass
+    FILTERS_AVAILABLE = True
+except ImportError:
+    FILTERS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not FILTERS_AVAILABLE, reason="Filter dependencies not available")
+
+SR = 44100
+
+
+def _response_db(sos, frequencies):
+    _, h = sosfreqz(sos, worN=np.asarray(frequencies, dtype=float), fs=SR)
+    return 20 * np.log10(np.abs(h))
+
+
+def test_peaking_gain_at_center():
+    sos = biquad_coefficients("peaking", 1000.0, 1.0, 6.0, SR)
+    center, far_low, far_high = _response_db(sos, [1000, 20, 15000])
+
+    assert np.isclose(center, 6.0, atol=1e-6)
+    assert abs(far_low) < 0.1 and abs(far_high) < 0.1
+
+
+@pytest.mark.parametrize("filter_type,passband", [("lowpass", 20), ("highpass", 20000)])
+def test_lowpass_highpass_cutoff(filter_type, passband):
+    sos = biquad_coefficients(filter_type, 2000.0, sr=SR)
+    at_cutoff, in_band = _response_db(sos, [2000, passband])
+
+    assert np.isclose(at_cutoff, -3.01, atol=0.05)
+    assert abs(in_band) < 0.05
+
+
+def test_shelves():
+    low = biquad_coefficients("lowshelf", 200.0, gain_db=-6.0, sr=SR)
+    high = biquad_coefficients("highshelf", 5000.0, gain_db=4.0, sr=SR)
+
+    assert np.allclose(_response_db(low, [1, 20000]), [-6.0, 0.0], atol=0.05)
+    assert np.allclose(_response_db(high, [10, 21000]), [0.0, 4.0], atol=0.05)
+
+
+def test_coefficients_are_cached():
+    first = biquad_coefficients("peaking", 500.0, 2.0, -3.0, SR)
+    second = biquad_coefficients("peaking", 500.0, 2.0, -3.0, SR)
+
+    assert first is second
+    assert not first.flags.writeable
+
+
+def test_channels_are_filtered_independently():
+    rng = np.random.default_rng(0)
+    array = np.zeros((2, 4096), dtype=np.float32)
+    array[0] = rng.standard_normal(4096)
+
+    out = apply_filter(array, SR, "lowpass", cutoff=1000)
+    mono = apply_sos(array[:1], biquad_coefficients("lowpass", 1000, sr=SR))
+
+    assert out.dtype == np.float32
+    assert np.all(out[1] == 0)
+    assert np.allclose(out[:1], mono)
+
+
+def test_bandpass_is_highpass_then_lowpass():
+    rng = np.random.default_rng(0)
+    array = rng.standard_normal((2, 4096)).astype(np.float32)
+
+    out = apply_bandpass(array, SR, 200, 4000)
+    chained = apply_filter(apply_filter(array, SR, "highpass", cutoff=200), SR, "lowpass", cutoff=4000)
+
+    assert np.allclose(out, chained, atol=1e-5)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not available")
+@pytest.mark.parametrize("af,engine", [
+    ("equalizer=f=1000:t=q:w=1.0:g=6", lambda x: apply_eq(x, SR, 1000, 1.0, 6)),
+    ("lowpass=f=3000", lambda x: apply_filter(x, SR, "lowpass", cutoff=3000)),
+    ("highpass=f=150", lambda x: apply_filter(x, SR, "highpass", cutoff=150)),
+])
+def test_impulse_response_matches_ffmpeg(af, engine):
+    impulse = np.zeros((2, 8192), dtype=np.float32)
+    impulse[:, 0] = 1.0
+
+    reference = _run_ffmpeg_filter(impulse, SR, af)
+    out = engine(impulse)
+
+    spectrum_ref = 20 * np.log10(np.abs(np.fft.rfft(reference[0])) + 1e-9)
+    spectrum_out = 20 * np.log10(np.abs(np.fft.rfft(out[0])) + 1e-9)
+    audible = slice(1, len(spectrum_ref) * 20000 // (SR // 2))
+    assert np.max(np.abs(spectrum_ref[audible] - spectrum_out[audible])) < 0.1
+
+
+def test_sos_blocks_carry_the_filter_state():
+    signal = np.random.default_rng(0).standard_normal((2, SR)).astype(np.float32)
+    sos = biquad_coefficients("lowpass", 500, 0.707, 0.0, SR)
+    chunks = [signal[:, i:i + 1000] for i in range(0, SR, 1000)]
+
+    out = np.concatenate(list(sos_blocks(chunks, sos)), axis=-1)
+
+    assert np.allclose(out, apply_sos(signal, sos), atol=1e-6)
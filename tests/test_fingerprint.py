@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+try:
+    from audio_utils.fingerprint import find_alignment, matching_blocks, reuse_sections, MATCH_BLOCK
+    FINGERPRINT_AVAILABLE = True
+except ImportError:
+    FINGERPRINT_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not FINGERPRINT_AVAILABLE, reason="Fingerprint dependencies not available")
+
+SR = 44100
+
+
+def song(seconds: float, seed: int) -> np.ndarray:
+    """Noise under a loudness contour changing every quarter second, loosely like music."""
+    rng = np.random.default_rng(seed)
+    length = int(seconds * SR)
+    contour = np.repeat(rng.uniform(0.05, 0.8, length // (SR // 4) + 1), SR // 4)[:length]
+    return (rng.uniform(-1, 1, (2, length)) * contour).astype(np.float32)
+
+
+def test_aligns_trimmed_and_extended_uploads():
+    old = song(40, seed=0)
+    intro = song(3, seed=1)
+    # A re-upload with 2.5 s cut off the start and a new intro
+    new = np.concatenate([intro, old[:, int(2.5 * SR) + 17:]], axis=1)
+
+    lag, regions = find_alignment(new, old, SR)
+
+    assert lag == intro.shape[1] - (int(2.5 * SR) + 17)
+    assert len(regions) == 1
+    start, end = regions[0]
+    assert intro.shape[1] <= start < intro.shape[1] + MATCH_BLOCK
+    assert end == new.shape[1]
+
+
+def test_edited_region_does_not_match():
+    old = song(30, seed=0)
+    new = old.copy()
+    new[:, 10 * SR:12 * SR] = song(2, seed=2)
+
+    lag, regions = find_alignment(new, old, SR)
+
+    assert lag == 0
+    assert len(regions) == 2
+    assert regions[0][0] == 0 and 10 * SR - MATCH_BLOCK < regions[0][1] <= 10 * SR
+    assert 12 * SR <= regions[1][0] < 12 * SR + MATCH_BLOCK and regions[1][1] == new.shape[1]
+
+
+def test_lossy_copy_still_matches():
+    old = song(20, seed=0)
+    rng = np.random.default_rng(3)
+    new = old + rng.normal(0, 1e-4, old.shape).astype(np.float32)
+
+    assert matching_blocks(new, old, 0) == [(0, new.shape[1])]
+
+
+def test_unrelated_songs_do_not_align():
+    assert find_alignment(song(30, seed=0), song(30, seed=4), SR) is None
+
+
+def test_short_uploads_are_not_aligned():
+    old = song(30, seed=0)
+    assert find_alignment(old[:, :5 * SR], old, SR) is None
+
+
+def test_reuse_sections_shrink_regions_next_to_new_material():
+    length = 1000
+    reused, novel = reuse_sections(length, [(0, 300), (400, 1000)], margin=50, min_length=100)
+
+    assert reused == [(0, 0, 250, 300), (400, 450, 1000, 1000)]
+    assert novel == [(250, 450)]
+
+
+def test_reuse_sections_skip_short_regions():
+    reused, novel = reuse_sections(1000, [(100, 220), (300, 900)], margin=50, min_length=100)
+
+    assert reused == [(300, 350, 850, 900)]
+    assert novel == [(0, 350), (850, 1000)]
@@ -0,0 +1,68 @@
+import pytest
+import torch
+
+try:
+    from demucs.demucs.apply import BagOfModels
+    from demucs.demucs.demucs import Demucs
+    from demucs.demucs.hdemucs import HDemucs
+    from demucs.demucs.htdemucs import HTDemucs
+    from demucs.demucs.inference import optimize_for_inference
+    from demucs.demucs.transformer import LayerScale
+    DEMUCS_AVAILABLE = True
+except ImportError:
+    DEMUCS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not DEMUCS_AVAILABLE, reason="Demucs dependencies not available")
+
+SOURCES = ["drums", "bass", "other", "vocals"]
+
+
+def _perturbed(model):
+    # Freshly initialized layer scales are tiny, move away from that so that
+    # a wrong folding would show up in the output.
+    for param in model.parameters():
+        param.data.add_(torch.randn_like(param) * 0.05)
+    return model.eval()
+
+
+def _models():
+    torch.manual_seed(0)
+    return [
+        _perturbed(Demucs(SOURCES, channels=4, depth=3)),
+        _perturbed(Demucs(SOURCES, channels=4, depth=3, norm_starts=1)),
+        _perturbed(HDemucs(SOURCES, channels=4, depth=4, nfft=256, segment=0.05, norm_starts=2)),
+        _perturbed(HTDemucs(SOURCES, channels=8, depth=2, nfft=256, segment=0.2, t_layers=1,
+                            bottom_channels=0, t_heads=2)),
+    ]
+
+
+@pytest.mark.parametrize("index", range(4))
+def test_optimize_for_inference_parity(index):
+    model = _models()[index]
+    torch.manual_seed(1)
+    x = torch.randn(1, 2, int(model.segment * model.samplerate))
+    if isinstance(model, Demucs):
+        x = torch.randn(1, 2, model.valid_length(4000))
+
+    optimized = optimize_for_inference(model)
+    with torch.no_grad():
+        reference = model(x)
+        out = optimized(x)
+
+    assert not any(isinstance(m, LayerScale) for m in optimized.modules())
+    assert not any(isinstance(child, torch.nn.Identity) for m in optimized.modules()
+                   if isinstance(m, torch.nn.Sequential) for child in m)
+    assert any(isinstance(m, LayerScale) for m in model.modules())
+    assert torch.allclose(out, reference, atol=1e-5)
+
+
+def test_optimize_for_inference_bag():
+    models = _models()[2:3] * 2
+    bag = BagOfModels(models)
+    optimized = optimize_for_inference(bag)
+
+    assert isinstance(optimized, BagOfModels)
+    assert not optimized.models[0].training
+    assert not any(p.requires_grad for p in optimized.parameters())
+    assert any(isinstance(m, LayerScale) for m in bag.modules())
+    assert not any(isinstance(m, LayerScale) for m in optimized.modules())
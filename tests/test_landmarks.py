@@ -0,0 +1,125 @@
+import io
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+
+try:
+    import librosa
+    from audio_utils.codecs import encode, available_formats
+    from audio_utils.landmarks import LandmarkIndex, landmarks, INDEX_PATH, _merges
+    from audio_utils.artifacts import ARTIFACTS_ROOT
+    LANDMARKS_AVAILABLE = True
+except ImportError:
+    LANDMARKS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not LANDMARKS_AVAILABLE, reason="Landmark dependencies not available")
+
+SR = 44100
+
+
+def song(seconds: float, seed: int) -> np.ndarray:
+    """Decaying harmonic notes on a quarter-second grid over a little noise."""
+    rng = np.random.default_rng(seed)
+    length = int(seconds * SR)
+    out = np.zeros((2, length), dtype=np.float32)
+    for k in range(int(seconds * 4)):
+        start = k * SR // 4
+        t = np.arange(min(length - start, int(rng.uniform(0.2, 0.8) * SR))) / SR
+        frequency = 110 * 2 ** (rng.integers(0, 36) / 12)
+        note = sum(np.sin(2 * np.pi * frequency * h * t) / h for h in range(1, 5)) * np.exp(-3 * t)
+        out[:, start:start + len(t)] += rng.uniform(0.1, 0.3) * rng.uniform(0.5, 1, (2, 1)) * note
+    return out + 0.01 * rng.standard_normal((2, length)).astype(np.float32)
+
+
+def reencode(array: np.ndarray, fmt: str) -> np.ndarray:
+    data, sr = sf.read(io.BytesIO(encode(array, SR, fmt, 128 if fmt == "mp3" else None)),
+                       dtype="float32", always_2d=True)
+    return librosa.resample(data.T, orig_sr=sr, target_sr=SR) if sr != SR else data.T
+
+
+@pytest.fixture(scope="module")
+def songs():
+    return [song(30, seed) for seed in range(3)]
+
+
+@pytest.fixture
+def index(songs, tmp_path):
+    index = LandmarkIndex(str(tmp_path / "index.npz"))
+    for i, array in enumerate(songs):
+        assert index.match(f"song{i}", array, SR) == f"song{i}"
+    return index
+
+
+@pytest.mark.parametrize("fmt", ["mp3", "opus"])
+def test_reencoded_upload_maps_to_the_first_upload(index, songs, fmt):
+    if fmt not in available_formats():
+        pytest.skip(f"{fmt} encoder not available")
+    assert index.match("reencoded", reencode(songs[1], fmt), SR) == "song1"
+    assert index.resolve("reencoded") == "song1"
+    assert index.stats()["aliases"] == 1
+
+
+def test_unrelated_upload_is_indexed_on_its_own(index):
+    hashes, times = landmarks(song(30, seed=10), SR)
+
+    assert index.query(hashes, times) is None
+    assert index.match("other", song(30, seed=10), SR) == "other"
+    assert index.stats()["tracks"] == 4
+
+
+def test_edited_duration_is_not_a_match(index, songs):
+    trimmed = songs[0][:, 5 * SR:]
+
+    # Same recording, but its stems would not line up with the upload
+    assert index.query(*landmarks(trimmed, SR))[0] == "song0"
+    assert index.match("trimmed", trimmed, SR) == "trimmed"
+
+
+def test_similar_tracks_include_edited_durations(index, songs):
+    trimmed = songs[0][:, 5 * SR:]
+    index.match("trimmed", trimmed, SR)
+
+    assert index.similar("trimmed", trimmed, SR, limit=3) == ["song0"]
+    assert index.similar("new", song(30, seed=10), SR, limit=3) == []
+    assert index.similar("song1", songs[1], SR, limit=3) == []
+
+
+def test_index_is_persisted(index, songs, tmp_path):
+    index.match("copy", songs[2] * 0.5, SR)
+    reloaded = LandmarkIndex(str(tmp_path / "index.npz"))
+
+    assert reloaded.keys == index.keys and reloaded.resolve("copy") == "song2"
+    assert reloaded.query(*landmarks(songs[2], SR))[0] == "song2"
+
+
+def test_uploads_are_saved_as_shards_until_merged(songs, tmp_path):
+    path = str(tmp_path / "index.npz")
+    index = LandmarkIndex(path, merge_tracks=3)
+    index.match("song0", songs[0], SR)
+    index.match("copy", songs[0] * 0.5, SR)
+    index.match("song1", songs[1], SR)
+
+    # One small file per upload, the index file is not rewritten
+    assert not os.path.exists(path) and len(os.listdir(index.shard_dir)) == 3
+    assert index.resolve("copy") == "song0" and index.query(*landmarks(songs[1], SR))[0] == "song1"
+    reloaded = LandmarkIndex(path, merge_tracks=3)
+    assert reloaded.keys == ["song0", "song1"] and reloaded.resolve("copy") == "song0"
+
+    index.match("song2", songs[2], SR)
+    _merges.submit(lambda: None).result()
+    assert os.path.exists(path) and not os.listdir(index.shard_dir)
+    assert index.stats()["recent"] == 0 and index.stats()["merges"] == 1
+    reloaded = LandmarkIndex(path)
+    assert reloaded.keys == index.keys and reloaded.resolve("copy") == "song0"
+    assert reloaded.query(*landmarks(songs[2], SR))[0] == "song2"
+
+
+def test_index_is_not_garbage_collected():
+    root = os.path.abspath(ARTIFACTS_ROOT)
+    assert os.path.commonpath([os.path.abspath(INDEX_PATH), root]) != root
+
+
+def test_silence_has_no_landmarks():
+    hashes, times = landmarks(np.zeros((2, SR)), SR)
+    assert len(hashes) == len(times) == 0
@@ -0,0 +1,170 @@
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+import soundfile as sf
+
+try:
+    from audio_utils import mixer
+    from audio_utils.mixer import (
+        render_stem, mix_stems, render_remix, export_wav, chain_key, render_cache, HEADROOM_DB
+    )
+    from audio_utils.effects import apply_filter
+    MIXER_AVAILABLE = True
+except ImportError:
+    MIXER_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not MIXER_AVAILABLE, reason="Mixer dependencies not available")
+
+SR = 44100
+
+
+@pytest.fixture
+def stem_arrays():
+    rng = np.random.default_rng(0)
+    return {
+        name: (0.2 * rng.uniform(-1, 1, size=(2, SR))).astype(np.float32)
+        for name in ["vocals", "drums", "bass", "other"]
+    }
+
+
+def test_render_stem_applies_volume(stem_arrays):
+    out = render_stem(stem_arrays["vocals"], "vocals", {"volumes": {"vocals": 0.5}}, SR)
+
+    assert out.dtype == np.float32
+    assert np.allclose(out, stem_arrays["vocals"] * 0.5)
+
+
+def test_render_stem_does_not_modify_input(stem_arrays):
+    original = stem_arrays["drums"].copy()
+    render_stem(stem_arrays["drums"], "drums", {"volumes": {"drums": 10.0}}, SR)
+
+    assert np.array_equal(stem_arrays["drums"], original)
+
+
+def test_mix_stems_sums_and_trims():
+    a = np.full((2, 100), 0.1, dtype=np.float32)
+    b = np.full((2, 80), 0.2, dtype=np.float32)
+
+    mix = mix_stems(iter([a, b]))
+
+    assert mix.shape == (2, 80)
+    assert np.allclose(mix, 0.3)
+
+
+def test_render_remix_limits_the_bus_instead_of_clipping_stems(stem_arrays):
+    instructions = {"volumes": {"vocals": 8.0}}
+
+    mix = render_remix(stem_arrays, instructions, SR)
+    loud = render_stem(stem_arrays["vocals"], "vocals", instructions, SR)
+
+    assert np.max(np.abs(loud)) > 1.0
+    assert np.max(np.abs(mix)) <= 10 ** (HEADROOM_DB / 20) + 1e-6
+
+
+def test_render_remix_exports_once(stem_arrays, tmp_path):
+    instructions = {"volumes": {"vocals": 1.2, "drums": 0.0, "bass": 1.0, "other": 1.0}}
+    mix = render_remix(stem_arrays, instructions, SR)
+    expected = stem_arrays["vocals"] * 1.2 + stem_arrays["bass"] + stem_arrays["other"]
+
+    path = export_wav(str(tmp_path / "remix.wav"), mix, SR)
+    data, sr = sf.read(path, dtype="float32")
+
+    assert sr == SR
+    assert np.allclose(mix, expected, atol=1e-6)
+    assert np.allclose(data.T, expected, atol=1e-4)
+
+
+def test_rerender_only_recomputes_changed_stems(stem_arrays, monkeypatch):
+    render_cache.clear()
+    instructions = {
+        "eq": {"vocals": {"frequency": 1000, "width": 1, "gain_db": 6}},
+        "filter": {"drums": {"type": "lowpass", "cutoff": 2000}},
+    }
+    first = {}
+    render_remix(stem_arrays, instructions, SR, stats=first)
+
+    calls = []
+    original = mixer.run_stages
+
+    def counting(audio, stages, sr, **kwargs):
+        calls.append([stage[0] for stage in stages])
+        return original(audio, stages, sr, **kwargs)
+
+    monkeypatch.setattr(mixer, "run_stages", counting)
+    changed = {**instructions, "filter": {"drums": {"type": "lowpass", "cutoff": 4000}}}
+    second = {}
+    mix = render_remix(stem_arrays, changed, SR, stats=second)
+
+    assert calls == [["sos"]]
+    assert sorted(first["rendered"]) == sorted(stem_arrays)
+    assert second["rendered"] == ["drums"]
+    assert sorted(second["cached"]) == ["bass", "other", "vocals"]
+
+    expected = sum(render_stem(stem_arrays[name], name, changed, SR) for name in stem_arrays)
+    assert np.allclose(mix, expected, atol=1e-5)
+
+
+def test_volume_change_is_a_mixdown(stem_arrays):
+    render_cache.clear()
+    instructions = {"pitch_shift": {"vocals": 2}}
+    render_remix(stem_arrays, instructions, SR)
+
+    changed = {**instructions, "volumes": {"vocals": 0.3}}
+    stats = {}
+    mix = render_remix(stem_arrays, changed, SR, stats=stats)
+    expected = sum(render_stem(stem_arrays[name], name, changed, SR) for name in stem_arrays)
+
+    assert stats["rendered"] == []
+    assert np.allclose(mix, expected, atol=1e-5)
+
+
+def test_volume_is_part_of_the_chain_before_compression():
+    plain = chain_key("vocals", {"volumes": {"vocals": 0.5}})
+    compressed = {"compression": {"vocals": "high"}}
+
+    assert plain == chain_key("vocals", {"volumes": {"vocals": 2.0}})
+    assert chain_key("vocals", {**compressed, "volumes": {"vocals": 0.5}}) != chain_key("vocals", compressed)
+    assert chain_key("vocals", compressed) == chain_key("vocals", {**compressed, "volumes": {"vocals": 1.0}})
+
+
+def test_render_remix_reports_stage_timings(stem_arrays):
+    render_cache.clear()
+    instructions = {"reverb": {"vocals": 0.4, "drums": 0.4}, "pitch_shift": {"bass": 1},
+                    "compression": {"other": "low"}}
+    stats = {}
+    mix = render_remix(stem_arrays, instructions, SR, stats=stats)
+    expected = sum(render_stem(stem_arrays[name], name, instructions, SR) for name in stem_arrays)
+    timings = stats["timings"]
+
+    assert np.allclose(mix, expected, atol=1e-5)
+    assert set(timings["vocals"]) == {"reverb"} and timings["vocals"] == timings["drums"]
+    assert set(timings["bass"]) == {"pitch"}
+    assert set(timings["other"]) == {"compress"}
+    assert timings["stems"] > 0 and "limiter" in timings
+
+
+def test_parallel_render_is_deterministic(stem_arrays, monkeypatch):
+    instructions = {
+        "volumes": {"vocals": 0.8},
+        "eq": {"drums": {"frequency": 200, "width": 1, "gain_db": 4}},
+        "reverb": {"bass": 0.3},
+        "compression": {"other": "medium"},
+    }
+    render_cache.clear()
+    parallel = render_remix(stem_arrays, instructions, SR)
+
+    render_cache.clear()
+    monkeypatch.setattr(mixer, "_pool", ThreadPoolExecutor(max_workers=1))
+    serial = render_remix(stem_arrays, instructions, SR)
+
+    assert np.array_equal(parallel, serial)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not available")
+def test_ffmpeg_filter_runs_on_arrays(stem_arrays):
+    out = apply_filter(stem_arrays["other"], SR, "lowpass", cutoff=1000)
+
+    assert out.shape == stem_arrays["other"].shape
+    assert out.dtype == np.float32
+    assert np.std(out) < np.std(stem_arrays["other"])
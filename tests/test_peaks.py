@@ -0,0 +1,69 @@
+import json
+import numpy as np
+import pytest
+
+try:
+    from audio_utils import peaks
+    from audio_utils.peaks import peak_pyramid, write_peaks, peaks_file, pick_level, has_peaks, PEAK_LEVELS
+    PEAKS_AVAILABLE = True
+except ImportError:
+    PEAKS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not PEAKS_AVAILABLE, reason="Peak dependencies not available")
+
+SR = 44100
+
+
+@pytest.fixture(autouse=True)
+def peaks_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(peaks, "PEAKS_DIR", str(tmp_path / "peaks"))
+
+
+@pytest.fixture
+def audio():
+    rng = np.random.default_rng(0)
+    return rng.uniform(-0.8, 0.8, (2, 100_000)).astype(np.float32)
+
+
+def test_pyramid_levels_match_direct_min_max(audio):
+    pyramid = peak_pyramid(audio)
+
+    for level in PEAK_LEVELS:
+        lows, highs = pyramid[level]
+        count = -(-audio.shape[1] // level)
+        assert len(lows) == len(highs) == count
+        for i in (0, count // 2, count - 1):
+            span = audio[:, i * level:(i + 1) * level]
+            assert lows[i] == span.min() and highs[i] == span.max()
+
+
+def test_pyramid_of_empty_and_mono_audio():
+    assert all(len(lows) == 0 for lows, _ in peak_pyramid(np.zeros((2, 0))).values())
+    lows, highs = peak_pyramid(np.array([0.5, -0.25, 0.1]))[256]
+    assert lows.tolist() == [-0.25] and highs.tolist() == [0.5]
+
+
+def test_written_levels_are_8_bit_interleaved(audio):
+    write_peaks("remix_vol_abc123", audio, SR)
+    assert has_peaks("remix_vol_abc123")
+
+    with open(peaks_file("remix_vol_abc123", width=1)) as f:
+        coarse = json.load(f)
+    lows, highs = peak_pyramid(audio)[coarse["samples_per_peak"]]
+    assert coarse["length"] == audio.shape[1] and coarse["bits"] == 8
+    assert coarse["data"][0::2] == np.round(lows * 127).astype(int).tolist()
+    assert coarse["data"][1::2] == np.round(highs * 127).astype(int).tolist()
+
+
+def test_level_choice_follows_width():
+    assert pick_level(1_000_000, 50) == 16384
+    assert pick_level(1_000_000, 1000) == 256
+    assert pick_level(1_000_000, 10_000) == 256
+    assert pick_level(1_000_000, 200) == 4096
+
+
+def test_missing_and_invalid_waveforms():
+    with pytest.raises(FileNotFoundError):
+        peaks_file("unknown", 100)
+    with pytest.raises(ValueError):
+        peaks_file("../etc", 100)
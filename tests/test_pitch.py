@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+try:
+    from audio_utils import pitch
+    from audio_utils.pitch import pitch_shift
+    PITCH_AVAILABLE = True
+except ImportError:
+    PITCH_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not PITCH_AVAILABLE, reason="Pitch dependencies not available")
+
+SR = 44100
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    pitch.analysis_cache.clear()
+    pitch.result_cache.clear()
+
+
+@pytest.fixture
+def stereo_tone():
+    t = np.arange(2 * SR) / SR
+    return np.stack([
+        0.3 * np.sin(2 * np.pi * 440 * t),
+        0.2 * np.sin(2 * np.pi * 440 * t + 0.5),
+    ]).astype(np.float32)
+
+
+def _spectrum(channel):
+    return np.fft.rfft(channel[SR // 2:SR // 2 + SR])
+
+
+@pytest.mark.parametrize("n_steps,frequency", [(12, 880), (-12, 220), (7, 659)])
+def test_pitch_shift_moves_the_frequency(stereo_tone, n_steps, frequency):
+    out = pitch_shift(stereo_tone, SR, n_steps)
+
+    assert out.shape == stereo_tone.shape
+    assert out.dtype == np.float32
+    assert abs(np.argmax(np.abs(_spectrum(out[0]))) - frequency) <= 1
+
+
+def test_pitch_shift_preserves_stereo_image(stereo_tone):
+    out = pitch_shift(stereo_tone, SR, 5)
+
+    left, right = _spectrum(out[0]), _spectrum(out[1])
+    k = np.argmax(np.abs(left))
+    assert np.isclose(np.abs(right[k]) / np.abs(left[k]), 0.2 / 0.3, atol=1e-3)
+    assert np.isclose(np.angle(right[k] / left[k]), 0.5, atol=1e-3)
+
+
+def test_analysis_is_reused_across_steps(stereo_tone, monkeypatch):
+    calls = []
+    original = pitch.librosa.stft
+
+    def counting_stft(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(pitch.librosa, "stft", counting_stft)
+
+    first = pitch_shift(stereo_tone, SR, 2)
+    pitch_shift(stereo_tone, SR, 4)
+    again = pitch_shift(stereo_tone, SR, 2)
+
+    assert len(calls) == 1
+    assert again is first
+    assert pitch.result_cache.hits == 1
+
+
+def test_zero_steps_is_identity(stereo_tone):
+    assert pitch_shift(stereo_tone, SR, 0) is stereo_tone
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+try:
+    from audio_utils.planner import plan_stem, run_stages, split_output_gain
+    from audio_utils.mixer import render_stem, render_remix, render_cache
+    PLANNER_AVAILABLE = True
+except ImportError:
+    PLANNER_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not PLANNER_AVAILABLE, reason="Planner dependencies not available")
+
+SR = 44100
+
+INSTRUCTIONS = [
+    {"volumes": {"vocals": 0.7}},
+    {"volumes": {"vocals": 1.5}, "reverb": {"vocals": 0.4},
+     "eq": {"vocals": {"frequency": 3000, "width": 2, "gain_db": -4}}},
+    {"pitch_shift": {"vocals": -2},
+     "filter": {"vocals": {"type": "bandpass", "low_cutoff": 200, "high_cutoff": 5000}}},
+    {"volumes": {"vocals": 2.0}, "eq": {"vocals": {"frequency": 500, "width": 1, "gain_db": 3}},
+     "filter": {"vocals": {"type": "highpass", "cutoff": 100}}, "compression": {"vocals": "high"}},
+    {"volumes": {"vocals": 0.5}, "reverb": {"vocals": 0.3}, "pitch_shift": {"vocals": 3},
+     "compression": {"vocals": "medium"}},
+    {"reverb": {"vocals": 0}, "pitch_shift": {"vocals": 0},
+     "eq": {"vocals": {"frequency": 800, "width": 1, "gain_db": 0}}, "compression": {"vocals": "unknown"}},
+]
+
+
+@pytest.fixture
+def stem():
+    rng = np.random.default_rng(0)
+    return (0.3 * rng.standard_normal((2, SR))).astype(np.float32)
+
+
+@pytest.mark.parametrize("instructions", INSTRUCTIONS)
+def test_plan_matches_the_naive_chain(stem, instructions):
+    stages, gain = split_output_gain(plan_stem("vocals", instructions))
+    planned = run_stages(stem, stages, SR) * gain
+    naive = render_stem(stem, "vocals", instructions, SR)
+
+    assert np.allclose(planned, naive, atol=1e-4)
+
+
+def test_identity_effects_are_dropped():
+    assert plan_stem("vocals", INSTRUCTIONS[-1]) == []
+    assert plan_stem("vocals", {}) == []
+
+
+def test_muted_stem_has_no_plan():
+    assert plan_stem("vocals", {"volumes": {"vocals": 0.0}, "reverb": {"vocals": 0.8},
+                                "compression": {"vocals": "high"}}) is None
+
+
+def test_eq_and_filter_are_fused_with_the_gain():
+    stages = plan_stem("vocals", INSTRUCTIONS[3])
+
+    assert [stage[0] for stage in stages] == ["sos", "compress"]
+    assert len(stages[0][1]) == 2
+    assert stages[0][2] == 2.0
+
+
+def test_gain_is_left_for_the_mixdown_without_compression():
+    stages = plan_stem("vocals", INSTRUCTIONS[1])
+
+    assert [stage[0] for stage in stages] == ["reverb", "sos", "gain"]
+    assert split_output_gain(stages)[1] == 1.5
+
+
+def test_commuting_stages_are_ordered_by_cost():
+    instructions = {"reverb": {"vocals": 0.5}, "filter": {"vocals": {"type": "lowpass", "cutoff": 1000}},
+                    "volumes": {"vocals": 0.5}, "compression": {"vocals": "low"}}
+
+    assert [stage[0] for stage in plan_stem("vocals", instructions)] == ["reverb", "sos", "compress"]
+
+
+def test_remix_skips_muted_stems(stem):
+    render_cache.clear()
+    stem_arrays = {"vocals": 0.2 * stem, "drums": 0.2 * stem[:, ::-1]}
+    instructions = {"volumes": {"drums": 0.0}, "reverb": {"drums": 0.5}}
+    stats = {}
+
+    mix = render_remix(stem_arrays, instructions, SR, stats=stats)
+    expected = sum(render_stem(stem_arrays[name], name, instructions, SR) for name in stem_arrays)
+
+    assert stats["muted"] == ["drums"]
+    assert stats["rendered"] == ["vocals"]
+    assert np.allclose(mix, expected, atol=1e-5)
+    assert np.allclose(render_remix(stem_arrays, {"volumes": {"vocals": 0, "drums": 0}}, SR), 0)
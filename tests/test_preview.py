@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+try:
+    from audio_utils.preview import loudest_window, render_preview, submit_render, render_status
+    from audio_utils.mixer import render_remix, render_cache
+    PREVIEW_AVAILABLE = True
+except ImportError:
+    PREVIEW_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not PREVIEW_AVAILABLE, reason="Preview dependencies not available")
+
+SR = 8000
+
+
+@pytest.fixture
+def stem_arrays():
+    rng = np.random.default_rng(0)
+    stems = {name: (0.05 * rng.standard_normal((2, 60 * SR))).astype(np.float32)
+             for name in ["vocals", "drums", "bass", "other"]}
+    stems["drums"][:, 30 * SR:38 * SR] *= 8
+    return stems
+
+
+def test_loudest_window_covers_the_loud_section(stem_arrays):
+    start, end = loudest_window(stem_arrays, SR, duration=10)
+
+    assert end - start == 10 * SR
+    assert start <= 30 * SR and end >= 38 * SR
+
+
+def test_short_tracks_are_previewed_whole(stem_arrays):
+    short = {name: array[:, :5 * SR] for name, array in stem_arrays.items()}
+
+    assert loudest_window(short, SR, duration=10) == (0, 5 * SR)
+
+
+def test_preview_matches_the_full_render(stem_arrays):
+    render_cache.clear()
+    instructions = {"volumes": {"vocals": 1.5}, "compression": {"drums": "high"},
+                    "eq": {"bass": {"frequency": 200, "width": 1, "gain_db": 6}}}
+
+    preview, start = render_preview(stem_arrays, instructions, SR, duration=10)
+    full = render_remix(stem_arrays, instructions, SR)
+
+    assert preview.shape == (2, 10 * SR)
+    assert np.allclose(preview, full[:, start:start + 10 * SR], atol=1e-3)
+
+
+def test_preview_feedback_reuses_rendered_excerpts(stem_arrays):
+    render_cache.clear()
+    render_preview(stem_arrays, {"compression": {"drums": "high"}}, SR, duration=10)
+    stats = {}
+    render_preview(stem_arrays, {"compression": {"drums": "low"}}, SR, duration=10, stats=stats)
+
+    assert stats["rendered"] == ["drums"]
+
+
+def test_background_render_status():
+    future = submit_render("remix_test.wav", lambda: "done")
+    future.result()
+
+    assert render_status("remix_test.wav") == {"ready": True}
+    assert render_status("missing.wav") is None
+
+    def failing():
+        raise RuntimeError("boom")
+
+    submit_render("remix_failed.wav", failing).exception()
+    assert render_status("remix_failed.wav") == {"ready": False, "error": "boom"}
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+try:
+    from scipy.signal import oaconvolve
+    from audio_utils import reverb
+    from audio_utils.reverb import (
+        impulse_response, impulse_response_spectra, convolve_partitioned, apply_reverb_batch,
+        reverb_blocks,
+    )
+    from audio_utils.mixer import render_remix, render_stem
+    REVERB_AVAILABLE = True
+except ImportError:
+    REVERB_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not REVERB_AVAILABLE, reason="Reverb dependencies not available")
+
+SR = 44100
+
+
+@pytest.fixture
+def stems():
+    rng = np.random.default_rng(0)
+    return [(0.1 * rng.standard_normal((2, SR))).astype(np.float32) for _ in range(3)]
+
+
+def test_partitioned_convolution_matches_direct(stems):
+    ir = impulse_response(0.4, SR)
+    block_size = 4096
+    spectra = impulse_response_spectra(0.4, SR, 2, block_size)
+
+    out = convolve_partitioned(stems[0][None], spectra, block_size)[0]
+    expected = np.stack([oaconvolve(stems[0][c], ir[c])[:SR] for c in range(2)])
+
+    assert spectra.shape[1] > 1
+    assert np.allclose(out, expected, atol=1e-5)
+
+
+def test_convolution_in_batches_matches_one_pass(stems):
+    block_size = 4096
+    spectra = impulse_response_spectra(0.8, SR, 2, block_size)
+    batch = np.stack(stems)[..., :SR - 1000]
+
+    expected = convolve_partitioned(batch, spectra, block_size, batch_blocks=len(stems[0]))
+    out = convolve_partitioned(batch, spectra, block_size, batch_blocks=2)
+
+    assert spectra.shape[1] > 2
+    assert np.allclose(out, expected, atol=1e-6)
+
+
+def test_impulse_response_spectra_are_cached():
+    assert impulse_response_spectra(0.3, SR) is impulse_response_spectra(0.3, SR)
+    assert impulse_response_spectra(0.3, SR) is not impulse_response_spectra(0.3, 48000)
+
+
+def test_batch_matches_individual_stems(stems):
+    batched = apply_reverb_batch(stems, SR, 0.6)
+    for stem, out in zip(stems, batched):
+        assert np.allclose(out, apply_reverb_batch([stem], SR, 0.6)[0], atol=1e-6)
+        assert out.shape == stem.shape
+
+
+def test_zero_reverberance_is_dry(stems):
+    assert apply_reverb_batch(stems[:1], SR, 0.0)[0] is stems[0]
+
+
+def test_stems_sharing_a_setting_are_processed_together(stems, monkeypatch):
+    calls = []
+    original = reverb.convolve_partitioned
+
+    def counting(batch, spectra, *args, **kwargs):
+        calls.append(batch.shape[0])
+        return original(batch, spectra, *args, **kwargs)
+
+    monkeypatch.setattr(reverb, "convolve_partitioned", counting)
+    stem_arrays = dict(zip(["vocals", "drums", "other"], stems))
+    instructions = {"reverb": {"vocals": 0.5, "drums": 0.5, "other": 0.2}}
+
+    mix = render_remix(stem_arrays, instructions, SR)
+    batch_sizes = sorted(calls)
+    expected = sum(render_stem(stem_arrays[name], name, instructions, SR) for name in stem_arrays)
+
+    assert batch_sizes == [1, 2]
+    assert np.allclose(mix, expected, atol=1e-5)
+
+
+def test_streaming_reverb_matches_batch(stems):
+    block_size = 4096
+    chunks = [stems[0][:, i:i + block_size] for i in range(0, SR, block_size)]
+
+    out = np.concatenate(list(reverb_blocks(chunks, SR, 0.5, block_size=block_size)), axis=-1)
+    expected = apply_reverb_batch([stems[0]], SR, 0.5)[0]
+
+    assert np.allclose(out, expected, atol=1e-5)
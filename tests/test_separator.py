@@ -0,0 +1,201 @@
+from concurrent.futures import Future
+import numpy as np
+import pytest
+
+try:
+    import torch
+    from audio_utils import separator, stem_store
+    from audio_utils.landmarks import LandmarkIndex
+    from audio_utils.separator import index_upload, load_stems, separate_range, submit_separation, STEM_NAMES
+    SEPARATOR_AVAILABLE = True
+except ImportError:
+    SEPARATOR_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not SEPARATOR_AVAILABLE, reason="Separator dependencies not available")
+
+SR = 44100
+
+
+def fake_separation(mix: np.ndarray) -> dict[str, np.ndarray]:
+    """Stems computed sample by sample, so separating any window gives the same samples."""
+    return {"vocals": 0.5 * mix, "drums": mix ** 2, "bass": -mix, "other": 0.25 * np.abs(mix)}
+
+
+@pytest.fixture
+def model_calls(tmp_path, monkeypatch):
+    """Stand-in for the model, recording the length of every mix it is run on."""
+    monkeypatch.setattr(stem_store, "STORE_DIR", str(tmp_path / "stems"))
+    monkeypatch.setattr(separator, "landmark_index", LandmarkIndex())
+    separator.stem_cache.clear()
+    separator.separation_jobs.clear()
+    calls = []
+
+    def separate_mix(wav, selected_stems, ready_callback=None):
+        mix = wav[0].numpy()
+        calls.append(mix.shape[-1])
+        stems = fake_separation(mix)
+        if ready_callback is not None:
+            half = mix.shape[-1] // 2
+            ready_callback(0, {name: array[:, :half] for name, array in stems.items()})
+            ready_callback(half, {name: array[:, half:] for name, array in stems.items()})
+        return {name: torch.from_numpy(stems[name]) for name in selected_stems}
+
+    monkeypatch.setattr(separator, "separate_mix", separate_mix)
+    return calls
+
+
+@pytest.fixture
+def upload(tmp_path, monkeypatch):
+    """Write an upload whose decoded mix is `mix` and index it as the upload route does, returns its path."""
+    mixes = {}
+    monkeypatch.setattr(separator, "load_mix", lambda filepath: torch.from_numpy(mixes[filepath])[None])
+
+    def write(name: str, mix: np.ndarray) -> str:
+        path = str(tmp_path / name)
+        with open(path, "wb") as f:
+            f.write(mix.tobytes())
+        mixes[path] = mix
+        index_upload(path)
+        return path
+    return write
+
+
+@pytest.fixture
+def sections(upload, monkeypatch):
+    """Upload read window by window, as `separate_range` reads it from disk."""
+    monkeypatch.setattr(separator, "_track_length", lambda filepath: separator.load_mix(filepath).shape[-1])
+    monkeypatch.setattr(separator, "_read_window",
+                        lambda filepath, start, end: separator.load_mix(filepath)[0, :, start:end])
+    return upload
+
+
+def song(seconds: float, seed: int) -> np.ndarray:
+    """Noise under a loudness contour changing every quarter second, loosely like music."""
+    rng = np.random.default_rng(seed)
+    length = int(seconds * SR)
+    contour = np.repeat(rng.uniform(0.05, 0.8, length // (SR // 4) + 1), SR // 4)[:length]
+    return (rng.uniform(-1, 1, (2, length)) * contour).astype(np.float32)
+
+
+def assert_stems(stems: dict[str, np.ndarray], mix: np.ndarray):
+    for name, expected in fake_separation(mix).items():
+        assert stems[name].shape == expected.shape
+        assert np.allclose(stems[name], expected, rtol=2 ** -10, atol=1e-6), name
+
+
+def test_background_separation_gives_the_key_back(model_calls, upload):
+    mix = song(2, seed=0)
+    path = upload("song.wav", mix)
+
+    key, job = submit_separation(path)
+    assert job.result() == key
+    assert submit_separation(path)[1].result() == key
+
+    assert load_stems(path)[0] == key
+    assert_stems(load_stems(path)[1], mix)
+    assert model_calls == [mix.shape[1]]
+
+
+def test_stems_are_read_back_from_the_store(model_calls, upload):
+    mix = song(2, seed=0)
+    path = upload("song.wav", mix)
+    key, stems = load_stems(path)
+    separator.stem_cache.clear()
+
+    assert_stems(load_stems(path, key)[1], mix)
+    assert model_calls == [mix.shape[1]]
+
+
+def test_trimmed_upload_reuses_the_earlier_stems(model_calls, upload):
+    old = song(40, seed=0)
+    load_stems(upload("song.wav", old))
+    new = old[:, int(2.5 * SR) + 17:]
+
+    assert_stems(load_stems(upload("trimmed.wav", new))[1], new)
+    assert sum(model_calls[1:]) < new.shape[1] // 2
+
+
+def test_extended_upload_separates_only_the_new_part(model_calls, upload):
+    old = song(40, seed=0)
+    load_stems(upload("song.wav", old))
+    intro = song(3, seed=1)
+    new = np.concatenate([intro, old[:, int(2.5 * SR) + 17:]], axis=1)
+
+    assert_stems(load_stems(upload("extended.wav", new))[1], new)
+    assert 0 < sum(model_calls[1:]) < new.shape[1] // 2
+
+
+def test_only_tracks_sharing_landmarks_are_aligned(model_calls, upload, monkeypatch):
+    for seed in range(1, 4):
+        load_stems(upload(f"other{seed}.wav", song(30, seed=seed)))
+    old = song(40, seed=0)
+    old_key = load_stems(upload("song.wav", old))[0]
+    aligned = []
+    align = separator.align
+
+    def counting(new_fingerprint, old_fingerprint, *args):
+        aligned.append(len(old_fingerprint))
+        return align(new_fingerprint, old_fingerprint, *args)
+
+    monkeypatch.setattr(separator, "align", counting)
+    new = old[:, int(2.5 * SR) + 17:]
+
+    assert_stems(load_stems(upload("trimmed.wav", new))[1], new)
+    assert aligned == [len(separator.load_fingerprint(old_key))]
+
+
+def test_sections_are_merged_into_the_full_stems(model_calls, sections):
+    mix = song(20, seed=0)
+    path = sections("song.wav", mix)
+
+    key, stems = separate_range(path, 4, 9)
+    assert_stems(stems, mix[:, 4 * SR:9 * SR])
+    assert not stem_store.has_stems(key, STEM_NAMES)
+    # Already stored, the model is not run again
+    assert_stems(separate_range(path, 5, 8)[1], mix[:, 5 * SR:8 * SR])
+    assert len(model_calls) == 1
+
+    separate_range(path, 0, 4)
+    separate_range(path, 9, 20)
+    assert stem_store.has_stems(key, STEM_NAMES)
+    assert not stem_store.stored_ranges(key)
+    assert_stems(load_stems(path)[1], mix)
+    assert len(model_calls) == 3
+
+
+def test_section_of_a_running_separation_is_not_separated_again(model_calls, sections):
+    mix = song(4, seed=0)
+    path = sections("song.wav", mix)
+
+    key, job = submit_separation(path)
+    assert_stems(separate_range(path, 1, 3, key)[1], mix[:, SR:3 * SR])
+    job.result()
+    assert model_calls == [mix.shape[1]]
+
+
+def test_copy_of_an_upload_shares_its_stems(model_calls, upload):
+    mix = song(30, seed=0)
+    first = upload("song.wav", mix)
+    copy = upload("copy.wav", mix * 0.5)
+
+    key = index_upload(first)
+    assert index_upload(copy) == key and separator.content_key(copy) == key
+    load_stems(first)
+    assert submit_separation(copy)[0] == key
+    assert_stems(load_stems(copy)[1], mix)
+    assert model_calls == [mix.shape[1]]
+
+
+def test_running_jobs_are_not_evicted(model_calls, upload, monkeypatch):
+    monkeypatch.setattr(separator, "MAX_SEPARATION_JOBS", 1)
+    running = Future()
+    separator.separation_jobs["running"] = running
+
+    key, job = submit_separation(upload("song.wav", song(2, seed=0)))
+    job.result()
+
+    assert separator.separation_jobs["running"] is running and key in separator.separation_jobs
+    # Once done, it makes room for the next job
+    running.set_result("running")
+    submit_separation(upload("other.wav", song(2, seed=1)))[1].result()
+    assert "running" not in separator.separation_jobs
@@ -0,0 +1,228 @@
+import os
+import threading
+import numpy as np
+import pytest
+import soundfile as sf
+
+try:
+    from audio_utils import stem_store
+    from audio_utils.stem_store import (
+        save_stem, load_stem, transcode, submit_transcode, has_stems,
+        StemWriter, live_stem, stem_progress, save_range, find_range, merge_ranges, stitch_ranges,
+        save_fingerprint, load_fingerprint, fingerprinted_keys,
+    )
+    from audio_utils.artifacts import ArtifactManager, MIN_AGE_SECONDS
+    STORE_AVAILABLE = True
+except ImportError:
+    STORE_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not STORE_AVAILABLE, reason="Stem store dependencies not available")
+
+SR = 44100
+KEY = "0123456789abcdef0123456789abcdef"
+# Relative precision of float16
+TOLERANCE = 2 ** -11
+
+
+@pytest.fixture(autouse=True)
+def store_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(stem_store, "STORE_DIR", str(tmp_path / "stems"))
+    monkeypatch.setattr(stem_store, "ARTIFACT_DIR", str(tmp_path / "artifacts"))
+
+
+@pytest.fixture
+def stem():
+    t = np.arange(SR) / SR
+    return (0.5 * np.stack([np.sin(2 * np.pi * 220 * t), np.cos(2 * np.pi * 330 * t)])).astype(np.float32)
+
+
+def test_stems_round_trip_within_float16_precision(stem):
+    path = save_stem(KEY, "vocals", stem)
+    loaded = load_stem(KEY, "vocals")
+
+    assert np.load(path).dtype == np.float16
+    assert loaded.dtype == np.float32 and loaded.shape == stem.shape
+    assert np.allclose(loaded, stem, rtol=TOLERANCE, atol=1e-7)
+    assert has_stems(KEY, ["vocals"]) and not has_stems(KEY, ["vocals", "drums"])
+
+
+def test_peaks_above_full_scale_are_kept(stem):
+    save_stem(KEY, "drums", 3 * stem)
+    save_range(KEY, 0, 0, SR, {"bass": 3 * stem})
+
+    assert np.allclose(load_stem(KEY, "drums"), 3 * stem, rtol=TOLERANCE, atol=1e-7)
+    assert np.allclose(find_range(KEY, ["bass"], 0, SR)["bass"], 3 * stem, rtol=TOLERANCE, atol=1e-7)
+
+
+def test_stores_of_16_bit_stems_are_still_read(stem):
+    os.makedirs(os.path.dirname(stem_store.stem_path(KEY, "other")))
+    np.save(stem_store.stem_path(KEY, "other"), (stem * 32767).round().astype(np.int16))
+
+    assert np.max(np.abs(load_stem(KEY, "other") - stem)) <= 1 / 32767
+    assert np.array_equal(next(live_stem(KEY, "other")), (stem * 32767).round().astype(np.int16))
+
+
+def test_transcode_encodes_once_and_refreshes_on_reuse(stem):
+    save_stem(KEY, "drums", stem)
+    path = transcode(KEY, "drums", "flac")
+    os.utime(path, (1, 1))
+
+    assert transcode(KEY, "drums", "flac") == path
+    assert os.path.getmtime(path) > 1
+    data, sr = sf.read(path, dtype="float32")
+    assert sr == SR and np.allclose(data.T, stem, rtol=TOLERANCE, atol=2 / 32767)
+
+
+def test_background_transcode_is_reused(stem):
+    save_stem(KEY, "vocals", stem)
+    path = submit_transcode(KEY, "vocals", "wav", sr=16000).result()
+
+    assert transcode(KEY, "vocals", "wav", sr=16000) == path
+
+
+def test_transcode_resamples(stem):
+    save_stem(KEY, "bass", stem)
+    path = transcode(KEY, "bass", "wav", sr=22050)
+
+    info = sf.info(path)
+    assert info.samplerate == 22050 and info.frames == SR // 2
+
+
+def test_disk_budget_drops_least_recently_fetched(stem, tmp_path):
+    save_stem(KEY, "other", stem)
+    old = transcode(KEY, "other", "wav", sr=16000)
+    new = transcode(KEY, "other", "wav", sr=22050)
+    os.utime(old, (1, 1))
+    manager = ArtifactManager(str(tmp_path / "artifacts"), budget=os.path.getsize(new))
+
+    removed = manager.collect(now=os.path.getmtime(new) + MIN_AGE_SECONDS)
+
+    assert removed == [os.path.normpath(old)]
+    assert os.path.exists(new) and not os.path.exists(old)
+
+
+@pytest.mark.parametrize("fmt, sr, bitrate", [("aiff", SR, None), ("wav", 12345, None), ("flac", SR, 128)])
+def test_transcode_rejects_bad_parameters(stem, fmt, sr, bitrate):
+    save_stem(KEY, "vocals", stem)
+
+    with pytest.raises(ValueError):
+        transcode(KEY, "vocals", fmt, sr=sr, bitrate=bitrate)
+
+
+def test_transcode_of_missing_stem():
+    with pytest.raises(FileNotFoundError):
+        transcode(KEY, "vocals", "wav")
+
+
+def test_stem_writer_serves_the_separated_prefix(stem):
+    writer = StemWriter(KEY, ["vocals", "drums"], 2, stem.shape[1])
+    writer.write(0, {"vocals": stem[:, :1000], "drums": -stem[:, :1000]})
+
+    assert stem_progress(KEY, "vocals") == (1000, stem.shape[1])
+    assert not has_stems(KEY, ["vocals"])
+    with pytest.raises(ValueError):
+        writer.write(5000, {"vocals": stem[:, 5000:], "drums": -stem[:, 5000:]})
+
+    blocks = live_stem(KEY, "vocals", poll_seconds=0.01)
+    first = next(blocks)
+    assert first.shape == (2, 1000)
+
+    def separate_rest():
+        writer.write(1000, {"vocals": stem[:, 1000:30000], "drums": -stem[:, 1000:30000]})
+        writer.write(30000, {"vocals": stem[:, 30000:], "drums": -stem[:, 30000:]})
+        writer.finish()
+
+    thread = threading.Thread(target=separate_rest)
+    thread.start()
+    played = np.concatenate([first] + list(blocks), axis=1)
+    thread.join()
+
+    assert played.shape == stem.shape and played.dtype == np.int16
+    assert np.max(np.abs(played / 32767 - load_stem(KEY, "vocals"))) <= 1 / 32767
+    assert np.allclose(load_stem(KEY, "drums"), -stem, rtol=TOLERANCE, atol=1e-7)
+    assert stem_progress(KEY, "drums") == (stem.shape[1], stem.shape[1])
+
+
+def test_aborted_separation_leaves_no_stems(stem):
+    writer = StemWriter(KEY, ["bass"], 2, stem.shape[1])
+    writer.write(0, {"bass": stem[:, :100]})
+    blocks = live_stem(KEY, "bass", poll_seconds=0.01)
+    next(blocks)
+    writer.abort()
+
+    with pytest.raises((RuntimeError, FileNotFoundError)):
+        next(blocks)
+    assert stem_progress(KEY, "bass") is None
+    assert not os.listdir(os.path.join(stem_store.STORE_DIR, KEY))
+
+
+def _section(signal, start, end, margin, garbage=0.0):
+    window_start, window_end = max(0, start - margin), min(signal.shape[1], end + margin)
+    array = signal[:, window_start:window_end].copy()
+    array[:, :start - window_start] += garbage
+    array[:, end - window_start:] += garbage
+    return window_start, start, end, array
+
+
+def test_stitched_sections_crossfade_their_margins_away(stem):
+    sections = [_section(stem, 0, 20000, 3000, 0.5), _section(stem, 18000, 30000, 3000, 0.5),
+                _section(stem, 30000, SR, 3000, 0.5)]
+
+    exact = stitch_ranges([_section(stem, s, e, 3000) for _, s, e, _ in sections], SR, crossfade=1000)
+    assert np.allclose(exact, stem)
+
+    stitched = stitch_ranges(sections, SR, crossfade=1000)
+    error = np.abs(stitched - stem).max(axis=0)
+    assert stitched.shape == stem.shape
+    # Margin samples only leak in through the crossfades, and only partly
+    assert error.max() < 0.5
+    assert not error[:18000].any() and not error[19500:29500].any() and not error[30500:].any()
+
+
+def test_stitching_needs_full_coverage(stem):
+    assert stitch_ranges([_section(stem, 0, 20000, 3000), _section(stem, 25000, SR, 3000)], SR) is None
+
+
+def test_sections_are_reused_then_merged(stem):
+    names = ["vocals", "bass"]
+    for start, end in [(0, 25000), (25000, SR)]:
+        window_start, _, _, array = _section(stem, start, end, 2000)
+        save_range(KEY, window_start, start, end, {"vocals": array, "bass": -array})
+
+        section = find_range(KEY, names, start + 10, end - 10)
+        assert np.allclose(section["vocals"], stem[:, start + 10:end - 10], rtol=TOLERANCE, atol=1e-7)
+        if end < SR:
+            assert find_range(KEY, names, start, end + 1) is None
+            assert not merge_ranges(KEY, names, SR)
+
+    assert merge_ranges(KEY, names, SR)
+    assert np.allclose(load_stem(KEY, "bass"), -stem, rtol=2 * TOLERANCE, atol=1e-7)
+    assert find_range(KEY, names, 0, 100) is None
+
+
+def test_concurrent_merges_store_one_complete_stem(stem):
+    names = ["vocals", "bass"]
+    for start, end in [(0, 25000), (25000, SR)]:
+        window_start, _, _, array = _section(stem, start, end, 2000)
+        save_range(KEY, window_start, start, end, {"vocals": array, "bass": -array})
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(merge_ranges(KEY, names, SR))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [True] * 4
+    assert np.allclose(load_stem(KEY, "vocals"), stem, rtol=2 * TOLERANCE, atol=1e-7)
+    assert not [entry for entry in os.listdir(os.path.join(stem_store.STORE_DIR, KEY)) if "tmp" in entry]
+
+
+def test_fingerprinted_tracks_need_their_mix_and_stems(stem):
+    other = "f" * 32
+    save_stem(KEY, "vocals", stem)
+    save_fingerprint(KEY, stem, np.arange(4, dtype=np.float32))
+    save_fingerprint(other, stem, np.arange(4, dtype=np.float32))
+
+    assert fingerprinted_keys(["vocals"]) == [KEY]
+    assert np.array_equal(load_fingerprint(KEY), np.arange(4))
+    assert np.allclose(load_stem(KEY, "mix"), stem, rtol=TOLERANCE, atol=1e-7)
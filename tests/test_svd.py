@@ -0,0 +1,56 @@
+import pytest
+import torch
+
+try:
+    from demucs.demucs.hdemucs import HDemucs
+    from demucs.demucs.states import get_state, load_model
+    from demucs.demucs.svd import svd_factorize, svd_ranks
+    DEMUCS_AVAILABLE = True
+except ImportError:
+    DEMUCS_AVAILABLE = False
+
+pytestmark = pytest.mark.skipif(not DEMUCS_AVAILABLE, reason="Demucs dependencies not available")
+
+SOURCES = ["drums", "bass", "other", "vocals"]
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    model = HDemucs(SOURCES, channels=16, depth=3, nfft=256, segment=0.05).eval()
+    # Make the conv and linear weights exactly rank 2, so that the factorization is lossless.
+    for m in model.modules():
+        if isinstance(m, (torch.nn.Conv1d, torch.nn.Conv2d, torch.nn.Linear)):
+            weight = m.weight.data.view(len(m.weight), -1)
+            u, s, vh = torch.linalg.svd(weight, full_matrices=False)
+            m.weight.data[:] = ((u[:, :2] * s[:2]) @ vh[:2]).view_as(m.weight)
+    return model
+
+
+def test_svd_factorize_keeps_output(model):
+    x = torch.randn(1, 2, 4000)
+    with torch.no_grad():
+        reference = model(x)
+    params = sum(p.numel() for p in model.parameters())
+
+    ranks = svd_ranks(model, energy=0.999, min_size=0)
+    svd_factorize(model, ranks)
+    with torch.no_grad():
+        out = model(x)
+
+    assert ranks and all(rank <= 2 for rank in ranks.values())
+    assert sum(p.numel() for p in model.parameters()) < params
+    assert torch.allclose(out, reference, atol=1e-4)
+
+
+def test_svd_factorized_package_loads(model):
+    ranks = svd_ranks(model, energy=0.999, min_size=0)
+    svd_factorize(model, ranks)
+    args, kwargs = model._init_args_kwargs
+    pkg = {'klass': HDemucs, 'args': args, 'kwargs': kwargs,
+           'state': get_state(model, None), 'lowrank': ranks}
+
+    loaded = load_model(pkg).eval()
+    x = torch.randn(1, 2, 4000)
+    with torch.no_grad():
+        assert torch.allclose(loaded(x), model(x))
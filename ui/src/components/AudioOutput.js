@@ -1,7 +1,69 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
+import Waveform from './Waveform';
 import './AudioOutput.css';
 
+const STATUS_POLL_MS = 2000;
+
+// Stems and remixes are delivered in the backend's configured format
+const fileExtension = (url) => (url && url.includes('.') ? url.split('.').pop() : 'wav');
+
+// Players try the small listening encode first and fall back to the full quality file
+function AudioPlayer({ item, fileUrl, apiBaseUrl }) {
+    const sources = (item && item.sources) || [{ url: fileUrl }];
+    return (
+        <audio controls preload="none" key={sources[0].url} className="audio-player">
+            {sources.map((source) => (
+                <source key={source.url} src={`${apiBaseUrl}${source.url}`} type={source.type} />
+            ))}
+        </audio>
+    );
+}
+
+// A preview remix is replaced by the full-length render once the backend reports it ready
+function useRemixUrl(remix, apiBaseUrl) {
+    const [fileUrl, setFileUrl] = useState(remix ? remix.file_url : null);
+    const [playback, setPlayback] = useState(remix);
+    const [peaksUrl, setPeaksUrl] = useState(remix ? remix.peaks_url : null);
+    const [isPreview, setIsPreview] = useState(Boolean(remix && remix.preview));
+
+    useEffect(() => {
+        setFileUrl(remix ? remix.file_url : null);
+        setPlayback(remix);
+        setPeaksUrl(remix ? remix.peaks_url : null);
+        setIsPreview(Boolean(remix && remix.preview));
+        if (!remix || !remix.preview || !remix.status_url) {
+            return undefined;
+        }
+        let cancelled = false;
+        const timer = setInterval(async () => {
+            try {
+                const response = await fetch(`${apiBaseUrl}${remix.status_url}`);
+                const status = await response.json();
+                if (cancelled) return;
+                if (status.ready) {
+                    setFileUrl(status.file_url);
+                    setPlayback(status);
+                    setPeaksUrl(status.peaks_url);
+                    setIsPreview(false);
+                    clearInterval(timer);
+                } else if (status.error || !response.ok) {
+                    clearInterval(timer);
+                }
+            } catch (error) {
+                console.error("Error polling remix status:", error);
+            }
+        }, STATUS_POLL_MS);
+        return () => {
+            cancelled = true;
+            clearInterval(timer);
+        };
+    }, [remix, apiBaseUrl]);
+
+    return [fileUrl, playback, peaksUrl, isPreview];
+}
+
 function AudioOutput({ stems, remix, apiBaseUrl }) {
+    const [remixUrl, remixPlayback, remixPeaksUrl, isPreview] = useRemixUrl(remix, apiBaseUrl);
     const hasGeneratedAudio = stems.length > 0 || remix;
 
     if (!hasGeneratedAudio) {
@@ -17,14 +79,18 @@ function AudioOutput({ stems, remix, apiBaseUrl }) {
                         {stems.map((stem, index) => (
                             <div key={index} className="audio-item">
                                 <strong>{stem.name.charAt(0).toUpperCase() + stem.name.slice(1)}</strong>
-                                <audio controls src={`${apiBaseUrl}${stem.file_url}`} className="audio-player"></audio>
-                                <a
-                                    href={`${apiBaseUrl}${stem.file_url}`}
-                                    download={`${stem.name}.wav`}
-                                    className="download-btn"
-                                >
-                                    Download {stem.name}.wav
-                                </a>
+                                {stem.live && <span className="preview-note"> (separating, plays what is ready…)</span>}
+                                <Waveform peaksUrl={stem.peaks_url} apiBaseUrl={apiBaseUrl} />
+                                <AudioPlayer item={stem} fileUrl={stem.file_url} apiBaseUrl={apiBaseUrl} />
+                                {!stem.live && (
+                                    <a
+                                        href={`${apiBaseUrl}${stem.file_url}`}
+                                        download={`${stem.name}.${stem.format || fileExtension(stem.file_url)}`}
+                                        className="download-btn"
+                                    >
+                                        Download {stem.name}.{stem.format || fileExtension(stem.file_url)}
+                                    </a>
+                                )}
                             </div>
                         ))}
                     </div>
@@ -37,13 +103,15 @@ function AudioOutput({ stems, remix, apiBaseUrl }) {
                     <div className="output-container">
                         <div className="audio-item">
                             <strong>{remix.name ? remix.name.charAt(0).toUpperCase() + remix.name.slice(1) : "Remix"}</strong>
-                            <audio controls src={`${apiBaseUrl}${remix.file_url}`} className="audio-player"></audio>
+                            {isPreview && <span className="preview-note"> (preview, full track rendering…)</span>}
+                            <Waveform peaksUrl={remixPeaksUrl} apiBaseUrl={apiBaseUrl} />
+                            <AudioPlayer item={remixPlayback} fileUrl={remixUrl} apiBaseUrl={apiBaseUrl} />
                             <a
-                                href={`${apiBaseUrl}${remix.file_url}`}
-                                download={`${remix.name || "remix"}.wav`}
+                                href={`${apiBaseUrl}${remixUrl}`}
+                                download={`${remix.name || "remix"}.${fileExtension(remixUrl)}`}
                                 className="download-btn"
                             >
-                                Download {remix.name || "Remix"}.wav
+                                Download {remix.name || "Remix"}.{fileExtension(remixUrl)}
                             </a>
                         </div>
                     </div>
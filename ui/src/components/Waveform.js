@@ -0,0 +1,54 @@
+import React, { useEffect, useRef } from 'react';
+
+const WAVEFORM_HEIGHT = 64;
+
+// Draws the min/max peaks computed by the backend, so no audio is downloaded to show a waveform
+function Waveform({ peaksUrl, apiBaseUrl, height = WAVEFORM_HEIGHT }) {
+    const canvasRef = useRef(null);
+
+    useEffect(() => {
+        const canvas = canvasRef.current;
+        if (!canvas || !peaksUrl) {
+            return undefined;
+        }
+        const controller = new AbortController();
+        const width = Math.max(1, Math.round(canvas.clientWidth * (window.devicePixelRatio || 1)));
+
+        fetch(`${apiBaseUrl}${peaksUrl}?width=${width}`, { signal: controller.signal })
+            .then((response) => (response.ok ? response.json() : null))
+            .then((peaks) => {
+                if (!peaks) return;
+                canvas.width = width;
+                canvas.height = height;
+                const context = canvas.getContext('2d');
+                const scale = 2 ** (peaks.bits - 1);
+                const count = peaks.data.length / 2;
+                const middle = height / 2;
+                context.clearRect(0, 0, width, height);
+                context.fillStyle = getComputedStyle(canvas).color;
+                for (let x = 0; x < width; x++) {
+                    // Every pixel covers one or more peaks, or repeats one when zoomed past the finest level
+                    const first = Math.floor((x * count) / width);
+                    const last = Math.max(first + 1, Math.floor(((x + 1) * count) / width));
+                    let low = 0;
+                    let high = 0;
+                    for (let i = first; i < last && i < count; i++) {
+                        low = Math.min(low, peaks.data[2 * i]);
+                        high = Math.max(high, peaks.data[2 * i + 1]);
+                    }
+                    const top = middle - (high / scale) * middle;
+                    const bottom = middle - (low / scale) * middle;
+                    context.fillRect(x, top, 1, Math.max(1, bottom - top));
+                }
+            })
+            .catch((error) => {
+                if (error.name !== 'AbortError') console.error("Error loading waveform:", error);
+            });
+
+        return () => controller.abort();
+    }, [peaksUrl, apiBaseUrl, height]);
+
+    return <canvas ref={canvasRef} className="waveform" style={{ width: '100%', height }} />;
+}
+
+export default Waveform;